@@ -0,0 +1,51 @@
+"""
+Compares the memory used to hold a catalog as a list of EarthSatellite objects, which is how satellites used to be
+kept in memory, against the columnar SatelliteCatalog. Memory is measured with tracemalloc and reported per 10k
+satellites.
+
+usage: python -m Benchmarks.Catalog_memory_benchmark <tle file>
+"""
+import sys
+import gc
+import tracemalloc
+from skyfield.api import EarthSatellite, load
+from Models.Database import parse_tle_file_modified
+from Models.Catalog import SatelliteCatalog
+
+
+def measure(build):
+    """
+    :param build: a function that builds and returns the structure being measured
+    :return: the structure, and the number of bytes still allocated for it once it has been built
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return result, after - before
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+    with open(sys.argv[1], "rb") as f:
+        names, lines1, lines2 = zip(*parse_tle_file_modified(f))
+    ts = load.timescale()
+    count = len(names)
+
+    results = [
+        ("EarthSatellite list", lambda: [EarthSatellite(l1, l2, name, ts) for name, l1, l2 in zip(names, lines1, lines2)]),
+        ("SatelliteCatalog", lambda: SatelliteCatalog.from_tles(names, lines1, lines2)),
+    ]
+    for name, build in results:
+        structure, size = measure(build)
+        print(f"{name:>20}: {size / 1e6:.1f} MB for {count} satellites, {size / count * 1e4 / 1e6:.2f} MB per 10k")
+        del structure
+
+
+if __name__ == "__main__":
+    main()
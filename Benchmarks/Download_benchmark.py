@@ -0,0 +1,129 @@
+"""
+Compares downloading a set of groups one at a time, with a new connection per request like the single download used to,
+against the batch download, which fetches them concurrently over the pooled session and saves each as it arrives.
+
+The groups are served by a local stand-in for the Celestrak GP endpoint, which splits a TLE file into groups and waits
+before answering each request to imitate the network. Each method downloads into a fresh database.
+
+usage: python -m Benchmarks.Download_benchmark <tle file> [groups] [latency seconds]
+"""
+import os
+import sys
+import time
+import tempfile
+import threading
+import requests
+from io import BytesIO
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+from urllib.parse import urlparse, parse_qs
+from Models import Database
+from UI.Download_modal import Download_modal_callbacks as Download
+
+
+class StandInServer(ThreadingHTTPServer):
+    """
+    Serves GROUP=g0, g1... queries from TLE records held in memory, counting the connections it accepts
+    """
+    daemon_threads = True
+
+    def __init__(self, groups, latency):
+        """
+        :param groups: a dictionary of group name to TLE data
+        :param latency: the seconds to wait before answering each request
+        """
+        super().__init__(("127.0.0.1", 0), StandInHandler)
+        self.groups = groups
+        self.latency = latency
+        self.connections = 0
+        self.lock = threading.Lock()
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # lets clients keep the connection open between requests
+
+    def setup(self):
+        super().setup()
+        with self.server.lock:
+            self.server.connections += 1
+
+    def do_GET(self):
+        query = parse_qs(urlparse(self.path).query)
+        data = self.server.groups.get(query.get("GROUP", [""])[0])
+        time.sleep(self.server.latency)
+        if data is None:
+            self.send_response(404)
+            data = b"No GP data found"
+        else:
+            self.send_response(200)
+        self.send_header("Content-Type", "text/plain")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def split_groups(data, count):
+    """
+    :param data: TLE data from a file
+    :param count: the number of groups to make
+    :return: a dictionary of group name to the TLE data of every count-th satellite
+    """
+    groups = {f"g{i}": [] for i in range(count)}
+    for i, (name, line1, line2) in enumerate(Database.parse_tle_file_modified(BytesIO(data))):
+        groups[f"g{i % count}"].append(f"{name}\n{line1.rstrip()}\n{line2.rstrip()}\n")
+    return {group: "".join(records).encode("ascii") for group, records in groups.items()}
+
+
+def sequential(queries):
+    """
+    downloads and saves each query in turn, opening a new connection for each
+    :return: the number of satellites saved
+    """
+    count = 0
+    for field, term in queries:
+        response = requests.get(f"{Download.celestrak_url}?{field}={term}&FORMAT=TLE", timeout=30)
+        count += Database.save(response.content).total
+    return count
+
+
+def batch(queries):
+    """
+    downloads the queries with the batch download, printing each query as it finishes
+    :return: the number of satellites saved
+    """
+    results = Download.download_groups(queries, set_progress=lambda p: print(f"    {p[0]}/{p[1]} queries saved"))
+    return sum(summary.total for _, _, summary, _ in results if summary)
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+    with open(sys.argv[1], "rb") as f:
+        data = f.read()
+    group_count = int(sys.argv[2]) if len(sys.argv) > 2 else 15
+    latency = float(sys.argv[3]) if len(sys.argv) > 3 else 0.3
+
+    server = StandInServer(split_groups(data, group_count), latency)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    Download.celestrak_url = f"http://127.0.0.1:{server.server_address[1]}/gp.php"
+    queries = [("GROUP", f"g{i}") for i in range(group_count)]
+
+    with tempfile.TemporaryDirectory() as directory:
+        for name, method in (("sequential", sequential), ("batch", batch)):
+            Database.db_filename = os.path.join(directory, name)
+            Database.create_database()
+            server.connections = 0
+            start = time.perf_counter()
+            count = method(queries)
+            elapsed = time.perf_counter() - start
+            print(f"{name:>10}: {count} satellites from {group_count} groups in {elapsed:.2f}s "
+                  f"over {server.connections} connections")
+            Database.get_engine().dispose()
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,114 @@
+"""
+Compares the speed of importing the same satellites as TLE, OMM JSON and OMM CSV. The OMM files are written from the
+decoded TLE file, in the layout CelesTrak serves, and each format is imported into a fresh database. The TLE lines
+saved from each OMM import are then checked against the original file, to show that exporting them as TLE gives back
+the same element sets.
+
+usage: python -m Benchmarks.Format_benchmark <tle file> [chunk size]
+"""
+import os
+import sys
+import csv
+import json
+import time
+import tempfile
+import numpy as np
+from io import BytesIO, StringIO
+from sqlalchemy import select
+from Models import Database, Ingest
+from Models.Database_models import Satellite
+
+OMM_COLUMNS = ("OBJECT_NAME", "OBJECT_ID", "EPOCH", "MEAN_MOTION", "ECCENTRICITY", "INCLINATION", "RA_OF_ASC_NODE",
+               "ARG_OF_PERICENTER", "MEAN_ANOMALY", "EPHEMERIS_TYPE", "CLASSIFICATION_TYPE", "NORAD_CAT_ID",
+               "ELEMENT_SET_NO", "REV_AT_EPOCH", "BSTAR", "MEAN_MOTION_DOT", "MEAN_MOTION_DDOT")
+
+
+def omm_records(data):
+    """
+    converts TLE data into OMM records
+    :param data: TLE data from a file
+    :return: a list of dictionaries keyed by OMM_COLUMNS
+    """
+    names, lines1, lines2 = zip(*Database.parse_tle_file_modified(BytesIO(data)))
+    fields = Database.decode_tle_batch(lines1, lines2)
+    epochs = np.datetime_as_string(fields["epoch"], unit="us")
+    records = []
+    for i, (name, line1, line2) in enumerate(zip(names, lines1, lines2)):
+        designator = line1[9:17].strip()
+        year = int(designator[:2]) if designator[:2].isdigit() else None
+        records.append({
+            "OBJECT_NAME": name or "",
+            "OBJECT_ID": f"{year + (2000 if year < 57 else 1900)}-{designator[2:]}" if year is not None else designator,
+            "EPOCH": str(epochs[i]),
+            "MEAN_MOTION": float(fields["mean_motion"][i]),
+            "ECCENTRICITY": float(fields["eccentricity"][i]),
+            "INCLINATION": float(fields["inclination"][i]),
+            "RA_OF_ASC_NODE": float(fields["raan"][i]),
+            "ARG_OF_PERICENTER": float(fields["arg_perigee"][i]),
+            "MEAN_ANOMALY": float(fields["mean_anomaly"][i]),
+            "EPHEMERIS_TYPE": int(line1[62]),
+            "CLASSIFICATION_TYPE": line1[7],
+            "NORAD_CAT_ID": int(fields["satnum"][i]),
+            "ELEMENT_SET_NO": int(line1[64:68]),
+            "REV_AT_EPOCH": int(line2[63:68]),
+            "BSTAR": float(fields["bstar"][i]),
+            "MEAN_MOTION_DOT": float(fields["ndot"][i]),
+            "MEAN_MOTION_DDOT": float(fields["nddot"][i]),
+        })
+    return records
+
+
+def omm_csv(records):
+    """
+    :param records: a list of OMM records
+    :return: the records as CSV bytes
+    """
+    text = StringIO()
+    writer = csv.DictWriter(text, fieldnames=OMM_COLUMNS)
+    writer.writeheader()
+    writer.writerows(records)
+    return text.getvalue().encode("utf-8")
+
+
+def time_format(name, data, directory, chunk_size):
+    """
+    imports data into a new database file, printing the rows per second
+    :param name: the name printed with the results
+    :param data: the bytes of the file
+    :param directory: a directory to create the database file in
+    :param chunk_size: the number of rows written per statement
+    :return: a dictionary of satnum to the saved (line1, line2)
+    """
+    Database.db_filename = os.path.join(directory, name)
+    Database.create_database()
+    start = time.perf_counter()
+    count = Ingest.import_tle_data(data, chunk_size=chunk_size).total
+    elapsed = time.perf_counter() - start
+    print(f"{name:>5}: {count} rows, {len(data) / 1e6:.1f} MB in {elapsed:.2f}s, {count / elapsed:,.0f} rows/s")
+    with Database.get_engine().connect() as connection:
+        lines = {row[0]: (row[1], row[2]) for row in
+                 connection.execute(select(Satellite.OBJECT_ID, Satellite.line1, Satellite.line2))}
+    Database.get_engine().dispose()
+    return lines
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+    with open(sys.argv[1], "rb") as f:
+        data = f.read()
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else None
+    records = omm_records(data)
+    files = {"tle": data, "json": json.dumps(records).encode("utf-8"), "csv": omm_csv(records)}
+
+    with tempfile.TemporaryDirectory() as directory:
+        saved = {name: time_format(name, content, directory, chunk_size) for name, content in files.items()}
+
+    for name in ("json", "csv"):
+        matching = sum(saved[name].get(satnum) == lines for satnum, lines in saved["tle"].items())
+        print(f"{name:>5}: {matching} of {len(saved['tle'])} exported TLEs match the original file")
+
+
+if __name__ == "__main__":
+    main()
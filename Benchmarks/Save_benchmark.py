@@ -0,0 +1,75 @@
+"""
+Compares the speed of saving a TLE file with one session.merge per row, which is how Database.save used to work, against
+the chunked upsert used now. Each method saves the file twice into a fresh database, once to insert every satellite and
+once to update them all.
+
+usage: python -m Benchmarks.Save_benchmark <tle file> [chunk size]
+"""
+import os
+import sys
+import time
+import tempfile
+from io import BytesIO
+from datetime import datetime
+from skyfield.api import EarthSatellite
+from sqlalchemy.orm import sessionmaker
+from Models import Database
+from Models.Database_models import Satellite
+
+
+def merge_save(data):
+    """
+    saves TLE data with a session.merge per satellite
+    :param data: TLE data from a file
+    :return: the number of satellites saved
+    """
+    session = sessionmaker(bind=Database.get_engine())
+    count = 0
+    with session.begin() as session:
+        for name, line1, line2 in Database.parse_tle_file_modified(BytesIO(data)):
+            sat_obj = EarthSatellite(line1, line2, name, Database.ts)
+            session.merge(Satellite(
+                OBJECT_ID=sat_obj.model.satnum,
+                OBJECT_NAME=sat_obj.name,
+                EPOCH=sat_obj.epoch.utc_strftime("%Y-%m-%dT%H:%M:%SZ"),
+                line1=line1.rstrip(),
+                line2=line2.rstrip(),
+                updated=datetime.now(),
+            ))
+            count += 1
+    return count
+
+
+def time_method(name, method, data, directory):
+    """
+    runs a save method against a new database file, printing the rows per second of an insert and an update
+    :param name: the name printed with the results
+    :param method: a function taking the TLE data
+    :param data: TLE data from a file
+    :param directory: a directory to create the database file in
+    """
+    Database.db_filename = os.path.join(directory, name)
+    Database.create_database()
+    for action in ("insert", "update"):
+        start = time.perf_counter()
+        count = method(data)
+        elapsed = time.perf_counter() - start
+        print(f"{name:>8} {action}: {count} rows in {elapsed:.2f}s, {count / elapsed:,.0f} rows/s")
+    Database.get_engine().dispose()
+
+
+def main():
+    if len(sys.argv) < 2:
+        print(__doc__)
+        return
+    with open(sys.argv[1], "rb") as f:
+        data = f.read()
+    chunk_size = int(sys.argv[2]) if len(sys.argv) > 2 else None
+
+    with tempfile.TemporaryDirectory() as directory:
+        time_method("merge", merge_save, data, directory)
+        time_method("upsert", lambda d: Database.save(d, chunk_size=chunk_size).total, data, directory)
+
+
+if __name__ == "__main__":
+    main()
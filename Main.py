@@ -1,7 +1,7 @@
 import sys, threading, webview, logging
 from dash import Dash, DiskcacheManager
 import diskcache
-from Models.Database import get_satellite_list, create_database
+from Models.Database import create_database
 from UI.Satellite_list_layout import create_home_screen
 from UI.Satellite_list_callbacks import register_home_screen_callbacks
 from UI.Download_modal.Download_modal_callbacks import register_download_modal_callbacks
@@ -9,38 +9,39 @@ from UI.Details_modal.Details_modal_callbacks import register_details_modal_call
 from UI.Import_modal.Import_modal_callbacks import register_import_modal_callbacks
 from UI.Export_modal.Export_modal_callbacks import register_export_modal_callbacks
 from UI.Delete_modal.Delete_modal_callbacks import register_delete_modal_callbacks
+from Propagation.Trajectory_store import start_trajectory_store_job
+from Propagation.Catalog_cache import load_catalog
 
 
 testing = False #True: use an in memory database for testing.   False: use a file based DB
+precompute_trajectories = False #True: propagate the whole catalog into the memory mapped trajectory store on startup
 logger = logging.getLogger(__name__)
 logging.basicConfig(filename="log.txt", format='%(asctime)s - %(levelname)s:%(message)s', level=logging.ERROR)
 
 
 class API:
-    def save_file(self, content, filename):
+    def choose_save_path(self, filename):
         """
         This function is used to access the save file dialog for exporting files. PyWebView doesn't expose the apis
-        used for downloading files, so to transfer files from the dash app to the local storage I use the clientside_callback
-        in the export_modal_callbacks file to pass a string the contains the data to be saved in a file to this api, which opens
-        the file dialog and writes the data to a file.
+        used for downloading files, so the clientside_callback in the export_modal_callbacks file calls this api to ask
+        the user where to save the file. Only the chosen path is passed back to the dash app, which then writes the file
+        itself, so the exported data never has to cross into the browser.
 
         :return: filepath or ""
         """
         window = webview.windows[0]
+        extension = filename.rsplit(".", 1)[-1]
+        file_types = ("Text Files (*.txt)",) if extension == "txt" else (f"{extension.upper()} Files (*.{extension})",)
 
         logger.info("opening file dialog")
         result = window.create_file_dialog(
             webview.FileDialog.SAVE,
             save_filename=filename,
-            file_types=("Text Files (*.txt)", "All Files (*.*)")
+            file_types=file_types + ("All Files (*.*)",)
         )
 
         if result and len(result) > 0:
-            filepath = result[0]
-            with open(filepath, "w", encoding="utf-8") as f:
-                logger.info("writing to file")
-                f.write(content)
-            return filepath
+            return result if isinstance(result, str) else result[0]
 
         return ""
 
@@ -48,20 +49,24 @@ def run_dash():
     """
     Initiates the dash app
 
-    Loads satellites from the database into memory, creates the home screen of the program and registers all the
-    callback functions so they can be accessed from their respective screens or modals.
+    Loads satellites into memory, from the warm start cache when it's usable or the database otherwise, creates the
+    home screen of the program and registers all the callback functions so they can be accessed from their respective
+    screens or modals.
 
     Also creates a background callback manager to pass into the app constructor for use in certain callbacks
 
     """
     logging.info("getting satellite list")
-    satellites = get_satellite_list()
+    load_catalog()
+    if precompute_trajectories and not testing:
+        logger.info("starting trajectory store job")
+        start_trajectory_store_job()
     logger.info("Configuring background callback manager")
     cache = diskcache.Cache("./cache")
     background_callback_manager = DiskcacheManager(cache)
     logger.info("Initializing Dash")
     app = Dash(__name__, background_callback_manager=background_callback_manager)
-    app.layout = create_home_screen(satellites)
+    app.layout = create_home_screen()
 
     logger.info("Registering callbacks")
     register_home_screen_callbacks(app)
@@ -0,0 +1,222 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from sgp4.api import Satrec, WGS72
+from skyfield.api import EarthSatellite, load
+import logging
+
+ts = load.timescale()
+# the Satrec attributes needed to rebuild an identical model with sgp4init, in the order sgp4init takes them
+SATREC_FIELDS = ("satnum", "epoch", "bstar", "ndot", "nddot", "ecco", "argpo", "inclo", "mo", "no_kozai", "nodeo")
+# TLE fields that aren't needed to propagate, but are shown in the details modal, with the dtype each is stored as
+METADATA_FIELDS = {"classification": "U1", "intldesg": "U8", "epochyr": np.int16, "epochdays": np.float64,
+                   "ephtype": np.int8, "elnum": np.int32, "revnum": np.int32}
+XPDOTP = 1440 / (2 * np.pi)  # converts revolutions per day to radians per minute, as sgp4's twoline2rv does
+satellite_cache_size = 256  # EarthSatellite objects kept by each catalog, most recently used first
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(filename="log.txt", format='%(asctime)s - %(levelname)s:%(message)s', level=logging.INFO)
+
+
+class SatelliteCatalog:
+    """
+    The satellites loaded from the database, stored as columns rather than as a list of EarthSatellite objects. Each
+    satellite is one row of a set of NumPy arrays: the satnums, the satrec parameters needed to rebuild its SGP4 model,
+    the TLE metadata shown in the details modal, and a fixed width table of names. The index dict maps a satnum to its
+    row.
+
+    A full EarthSatellite is only built when something asks for a single satellite, and the most recently used ones are
+    kept in a small LRU. Indexing the catalog by satnum returns one of these, so it can be used like a dict of
+    EarthSatellite objects.
+
+    Catalogs are never changed once built. A sync with the database makes a new catalog with the changes applied, so
+    other threads can keep reading the old one.
+    """
+    def __init__(self, satnums, names, elements, metadata):
+        """
+        :param satnums: an array of satnums
+        :param names: an array of utf-8 encoded names, with empty names for satellites that don't have one
+        :param elements: an array of satrec parameters in the order of SATREC_FIELDS, one row per satellite
+        :param metadata: a dictionary holding an array for each of METADATA_FIELDS
+        """
+        self.satnums = np.asarray(satnums, dtype=np.int64)
+        self.names = np.asarray(names, dtype=bytes)
+        self.elements = np.asarray(elements, dtype=np.float64).reshape(-1, len(SATREC_FIELDS))
+        self.metadata = {field: np.asarray(metadata[field], dtype=dtype) for field, dtype in METADATA_FIELDS.items()}
+        self.index = {satnum: row for row, satnum in enumerate(self.satnums.tolist())}
+        self.satellites = OrderedDict()
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_tles(cls, names, lines1, lines2):
+        """
+        Parses TLEs into a catalog. The fixed columns of every TLE are read at once with Database.decode_tle_batch and
+        converted to the units sgp4init takes, so no SGP4 model is built here. The propagator initialises them.
+
+        :param names: a sequence of names, which can be None
+        :param lines1: a sequence of TLE line 1 strings
+        :param lines2: a sequence of TLE line 2 strings
+        :return: a SatelliteCatalog
+        """
+        from Models.Database import decode_tle_batch  # imported here, since Database imports this module
+        fields = decode_tle_batch(lines1, lines2, metadata=True)
+        year_start = (fields["epoch_year"] - 1970).astype("datetime64[Y]").astype("datetime64[D]")
+        epoch = (year_start - np.datetime64("1949-12-31")).astype(np.int64) + (fields["epoch_day"] - 1)
+        radians = {key: np.radians(fields[key]) for key in ("arg_perigee", "inclination", "mean_anomaly", "raan")}
+        elements = np.column_stack([fields["satnum"], epoch, fields["bstar"], fields["ndot"] / (XPDOTP * 1440),
+                                    fields["nddot"] / (XPDOTP * 1440 * 1440), fields["eccentricity"],
+                                    radians["arg_perigee"], radians["inclination"], radians["mean_anomaly"],
+                                    fields["mean_motion"] / XPDOTP, radians["raan"]])
+        return cls(fields["satnum"],
+                   [(name or "").encode("utf-8") for name in names],
+                   elements,
+                   {"classification": fields["classification"], "intldesg": fields["intldesg"],
+                    "epochyr": fields["epoch_year"] % 100, "epochdays": fields["epoch_day"],
+                    "ephtype": fields["ephtype"], "elnum": fields["elnum"], "revnum": fields["revnum"]})
+
+    @classmethod
+    def empty(cls):
+        """
+        :return: a SatelliteCatalog with no satellites
+        """
+        return cls([], [], [], {field: [] for field in METADATA_FIELDS})
+
+    def __len__(self):
+        return len(self.satnums)
+
+    def __contains__(self, satnum):
+        return satnum in self.index
+
+    def __iter__(self):
+        return iter(self.satnums.tolist())
+
+    def __getitem__(self, satnum):
+        satellite = self.get(satnum)
+        if satellite is None:
+            raise KeyError(satnum)
+        return satellite
+
+    def get(self, satnum, default=None):
+        """
+        :param satnum: a satellite's satnum
+        :param default: returned when the satnum isn't in the catalog
+        :return: an EarthSatellite built from the satellite's row
+        """
+        row = self.index.get(satnum)
+        if row is None:
+            return default
+        with self.lock:
+            satellite = self.satellites.get(satnum)
+            if satellite is not None:
+                self.satellites.move_to_end(satnum)
+                return satellite
+
+        satellite = self.build_satellite(row)
+        with self.lock:
+            self.satellites[satnum] = satellite
+            while len(self.satellites) > satellite_cache_size:
+                self.satellites.popitem(last=False)
+        return satellite
+
+    def build_satellite(self, row):
+        """
+        :param row: a row of the catalog
+        :return: an EarthSatellite with the same model as one parsed from the satellite's TLE
+        """
+        satrec = build_satrec(self.elements[row])
+        for field, values in self.metadata.items():
+            setattr(satrec, field, values[row].item())
+        satellite = EarthSatellite.from_satrec(satrec, ts)
+        satellite.name = self.name(row)
+        return satellite
+
+    def name(self, row):
+        """
+        :param row: a row of the catalog
+        :return: the satellite's name, or None if it doesn't have one
+        """
+        return self.names[row].decode("utf-8") or None
+
+    @property
+    def epoch_jd(self):
+        """
+        The UTC julian date of each satellite's epoch
+        """
+        return self.elements[:, 1] + 2433281.5
+
+    def rows_for(self, satnums):
+        """
+        Converts a list of satnums into row numbers, skipping any satnum that isn't in the catalog
+
+        :param satnums: an iterable of satellite satnums
+        :return: a numpy array of row numbers
+        """
+        return np.array([self.index[s] for s in satnums if s in self.index], dtype=np.intp)
+
+    def patched(self, deleted, changed):
+        """
+        Makes a new catalog with some satellites removed and others added or replaced. Satellites that weren't changed
+        keep their rows in the same order and their cached EarthSatellite objects.
+
+        :param deleted: an iterable of satnums to remove
+        :param changed: a SatelliteCatalog of the satellites to add or replace
+        :return: a SatelliteCatalog
+        """
+        removed = set(deleted) | set(changed.satnums.tolist())
+        keep = np.array([satnum not in removed for satnum in self.satnums.tolist()], dtype=bool)
+        catalog = SatelliteCatalog(
+            np.concatenate([self.satnums[keep], changed.satnums]),
+            np.concatenate([self.names[keep].astype(bytes), changed.names.astype(bytes)]),
+            np.concatenate([self.elements[keep], changed.elements]),
+            {field: np.concatenate([self.metadata[field][keep], changed.metadata[field]])
+             for field in METADATA_FIELDS})
+        with self.lock:
+            catalog.satellites.update((satnum, satellite) for satnum, satellite in self.satellites.items()
+                                      if satnum not in removed)
+        return catalog
+
+
+def satrec_parameters(satrec):
+    """
+    Extracts the values needed to rebuild a Satrec, since Satrec objects can't be pickled and sent to other processes
+
+    :param satrec: an sgp4 Satrec object
+    :return: a tuple of floats in the order of SATREC_FIELDS
+    """
+    epoch = (satrec.jdsatepoch - 2433281.5) + satrec.jdsatepochF
+    return (satrec.satnum, epoch, satrec.bstar, satrec.ndot, satrec.nddot, satrec.ecco, satrec.argpo, satrec.inclo,
+            satrec.mo, satrec.no_kozai, satrec.nodeo)
+
+
+def build_satrec(parameters):
+    """
+    Rebuilds a Satrec from the values returned by satrec_parameters. The rebuilt model propagates identically to the one
+    parsed from the original TLE.
+
+    :param parameters: a sequence of values in the order of SATREC_FIELDS
+    :return: an sgp4 Satrec object
+    """
+    satnum, *elements = parameters
+    satrec = Satrec()
+    satrec.sgp4init(WGS72, "i", int(satnum), *(float(value) for value in elements))
+    return satrec
+
+
+def build_satrecs(elements, previous=None):
+    """
+    Builds the Satrec of every row of satrec parameters. When the rows of an earlier build are given, a satellite whose
+    parameters haven't changed reuses its earlier Satrec, so a catalog sync only runs sgp4init for the satellites it
+    added or changed.
+
+    :param elements: an array of satrec parameters in the order of SATREC_FIELDS, one row per satellite
+    :param previous: an optional (elements, satrecs) pair from an earlier build
+    :return: a list of sgp4 Satrec objects, one per row
+    """
+    if previous is None or len(previous[0]) == 0 or len(elements) == 0:
+        return [build_satrec(e) for e in elements]
+    previous_elements, previous_satrecs = previous
+    previous_rows = {satnum: row for row, satnum in enumerate(previous_elements[:, 0].astype(np.int64).tolist())}
+    matches = np.array([previous_rows.get(satnum, -1) for satnum in elements[:, 0].astype(np.int64).tolist()])
+    unchanged = (matches >= 0) & np.all(previous_elements[np.maximum(matches, 0)] == elements, axis=1)
+    return [previous_satrecs[match] if same else build_satrec(e)
+            for e, match, same in zip(elements, matches.tolist(), unchanged.tolist())]
@@ -1,15 +1,55 @@
-from skyfield.api import EarthSatellite, load
-from Models.Database_models import Base, Satellite
-from datetime import datetime
-from sqlalchemy import create_engine
+import os
+import threading
+import numpy as np
+from skyfield.api import load, EarthSatellite
+from Models.Database_models import Base, Satellite, DeletedSatellite, CatalogState, ElementHistory
+from Models.Catalog import SatelliteCatalog
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import create_engine, event, inspect, select, update, delete, bindparam, text, func
+from sqlalchemy.dialects.sqlite import insert
 from sqlalchemy.orm import sessionmaker
 from sqlalchemy.pool import StaticPool
 from io import BytesIO
+from itertools import islice
 import logging
 
 engine = None
+engine_pid = None  # the process that created the engine, connections can't be shared with background worker processes
 db_filename = "Satellite_data"
-satellite_lookup = {}
+in_memory = False
+# applied to every new connection. WAL lets the table be read while a background import is writing, NORMAL
+# synchronous is safe with WAL and avoids a sync on every commit, and the page cache and memory map are sized for
+# catalogs of tens of thousands of satellites
+sqlite_pragmas = {
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "mmap_size": 268435456,
+    "cache_size": -65536,
+    "temp_store": "MEMORY",
+}
+statement_cache_size = 256  # prepared statements kept by each sqlite3 connection
+busy_timeout = 30.0  # seconds a connection waits for another process's write to finish before giving up
+catalog = SatelliteCatalog.empty()
+catalog_version = 0
+synced_change = None  # the database change counter when the catalog was last synced, None before the first load
+save_listeners = []
+# held while writing, so threads saving at the same time take turns instead of failing on sqlite's single writer or
+# sharing the in memory database's one connection
+write_lock = threading.RLock()
+save_chunk_size = 1000  # rows written by each upsert statement when saving, progress is reported after every chunk
+keep_history = True  # also append every saved element set to the Element_history table
+TLE_LINE_LENGTH = 69
+ALPHA5_LETTERS = "ABCDEFGHJKLMNPQRSTUVWXYZ"  # the leading letters of alpha-5 catalog numbers, from 10 up. I and O are skipped
+MU_EARTH = 398600.8  # km^3/s^2, the WGS72 value used by SGP4
+EARTH_RADIUS_KM = 6378.135  # WGS72, matching the apogee and perigee altitudes published by CelesTrak
+ORBIT_COLUMNS = ("EPOCH_DATETIME", "INCLINATION", "ECCENTRICITY", "MEAN_MOTION", "PERIOD", "APOGEE", "PERIGEE", "BSTAR")
+# SQL conditions for the orbit classes that the table and export can be filtered by
+ORBIT_CLASSES = {
+    "LEO": lambda: Satellite.APOGEE < 2000,
+    "MEO": lambda: (Satellite.PERIGEE >= 2000) & (Satellite.APOGEE < 35000),
+    "GEO": lambda: Satellite.PERIOD.between(1400, 1480) & (Satellite.ECCENTRICITY < 0.01),
+    "HEO": lambda: Satellite.ECCENTRICITY >= 0.25,
+}
 ts = load.timescale()
 
 logger = logging.getLogger(__name__)
@@ -22,106 +62,408 @@ def create_database(testing: bool = False):
     database. the default value of testing is False.
     """
     logger.info("building database")
-    global engine, db_filename
-    if testing:
+    global engine, in_memory
+    in_memory = testing
+    if engine is not None:
+        engine.dispose()
+        engine = None
+
+    Base.metadata.create_all(bind=get_engine())
+    migrate_database()
+
+
+def get_engine():
+    """
+    Returns the engine for this process, creating it the first time it's needed. Every function in this module reads
+    and writes through it, so the UI and imports share one connection pool and one set of connection settings.
+    Background callbacks run in their own processes, which notice that the engine was made by a different process and
+    open a new one configured the same way.
+    :return: a sqlalchemy Engine
+    """
+    global engine, engine_pid
+    if engine is None or engine_pid != os.getpid():
+        if engine is not None:
+            # the connections belong to the parent process, so they are dropped without being closed
+            engine.dispose(close=False)
+        engine = open_engine()
+        engine_pid = os.getpid()
+    return engine
+
+
+def open_engine():
+    """
+    creates an engine for the database file, or for an in-memory database in testing mode, with sqlite_pragmas applied
+    to each connection it opens
+    :return: a sqlalchemy Engine
+    """
+    if in_memory:
         logger.info("Using in-memory SQLite database (testing mode)")
-        engine = create_engine("sqlite:///:memory:",
-                               echo=False,
-                               connect_args={"check_same_thread": False},
-                               poolclass=StaticPool)
+        new_engine = create_engine("sqlite:///:memory:",
+                                   echo=False,
+                                   connect_args={"check_same_thread": False},
+                                   poolclass=StaticPool)
     else:
         logger.info(f"Using file-based SQLite database: {db_filename}")
-        engine = create_engine(f"sqlite:///{db_filename}", echo=False)
+        new_engine = create_engine(f"sqlite:///{db_filename}",
+                                   echo=False,
+                                   connect_args={"timeout": busy_timeout,
+                                                 "cached_statements": statement_cache_size})
+    event.listen(new_engine, "connect", apply_pragmas)
+    return new_engine
 
-    Base.metadata.create_all(bind=engine)
+
+def apply_pragmas(dbapi_connection, connection_record):
+    """
+    sets the sqlite_pragmas on a new connection
+    :param dbapi_connection: a sqlite3 connection
+    :param connection_record: unused, passed by the sqlalchemy connect event
+    """
+    cursor = dbapi_connection.cursor()
+    for name, value in sqlite_pragmas.items():
+        cursor.execute(f"PRAGMA {name}={value}")
+    cursor.close()
 
 
-def save(data, set_progress=None):
+def migrate_database():
     """
-    Takes TLE data from a file or web request and coverts it to EarthSatellite objects so that the name, satnum and
-    epoch can be extracted. Then these values, the raw TLE data, and a timestamp are saved to the database.
+    Brings a database made by an older version of the app up to date. Any orbital element columns missing from the
+    Satellite table are added along with their indexes, then every row without them is filled in by decoding its TLE.
+    """
+    existing = {column["name"] for column in inspect(get_engine()).get_columns(Satellite.__tablename__)}
+    missing = [column for column in Satellite.__table__.columns if column.name not in existing]
+    with write_lock, get_engine().begin() as connection:
+        for column in missing:
+            logger.info(f"adding column {column.name} to the Satellite table")
+            connection.execute(text(f'ALTER TABLE "{Satellite.__tablename__}" ADD COLUMN "{column.name}" '
+                                    f'{column.type.compile(get_engine().dialect)}'))
+    for index in Satellite.__table__.indexes:
+        index.create(bind=get_engine(), checkfirst=True)
+
+    with write_lock, get_engine().begin() as connection:
+        rows = connection.execute(select(Satellite.OBJECT_ID, Satellite.line1, Satellite.line2)
+                                  .where(Satellite.EPOCH_DATETIME.is_(None))).all()
+        if rows:
+            logger.info(f"filling in orbital elements for {len(rows)} satellites")
+            statement = (update(Satellite).where(Satellite.OBJECT_ID == bindparam("satnum"))
+                         .values({column: bindparam(column) for column in ORBIT_COLUMNS}))
+            for start in range(0, len(rows), save_chunk_size):
+                chunk = rows[start:start + save_chunk_size]
+                satnums, lines1, lines2 = zip(*chunk)
+                columns = orbit_columns(decode_tle_batch(lines1, lines2))
+                connection.execute(statement, [dict(satnum=satnum, **values)
+                                               for satnum, values in zip(satnums, columns)])
+
+        # the element history starts with the sets already saved when it's first created
+        if keep_history and connection.execute(select(ElementHistory.OBJECT_ID).limit(1)).first() is None:
+            connection.execute(insert(ElementHistory).from_select(
+                ["OBJECT_ID", "EPOCH_DATETIME", "line1", "line2"],
+                select(Satellite.OBJECT_ID, Satellite.EPOCH_DATETIME, Satellite.line1, Satellite.line2)
+                .where(Satellite.EPOCH_DATETIME.is_not(None))).on_conflict_do_nothing())
+
+
+class SaveSummary:
+    """
+    Counts what happened to each element set given to save_batches, and which satellites were changed by it
+    """
+    def __init__(self):
+        self.inserted = 0  # satellites that weren't saved before
+        self.updated = 0  # element sets with a newer epoch, or the same epoch with different lines or name
+        self.unchanged = 0  # element sets identical to the saved one, which weren't written
+        self.rejected = 0  # element sets older than the saved one, which were only added to the history
+        self.changed = set()  # the satnums of every inserted or updated satellite
+
+    @property
+    def total(self):
+        """
+        The number of element sets processed
+        """
+        return self.inserted + self.updated + self.unchanged + self.rejected
+
+    def __add__(self, other):
+        summary = SaveSummary()
+        for name in ("inserted", "updated", "unchanged", "rejected"):
+            setattr(summary, name, getattr(self, name) + getattr(other, name))
+        summary.changed = self.changed | other.changed
+        return summary
+
+    def __str__(self):
+        return (f"{self.inserted} new, {self.updated} updated, {self.unchanged} unchanged, "
+                f"{self.rejected} older than the saved element set")
+
+
+def save(data, set_progress=None, chunk_size=None):
+    """
+    Takes TLE data from a file or web request and saves every satellite in it to the database with save_records.
     :param data: TLE data from a file or web request
-    :param set_progress: Tracks the progress made saving the satellite list
-    :return: count: an int enumerating the number of records saved
+    :param set_progress: Tracks the progress made saving the satellite list, updated after each chunk with the number of
+    bytes of data processed
+    :param chunk_size: the number of rows written per statement. defaults to save_chunk_size
+    :return: summary: a SaveSummary of the records saved
     """
     logger.info("saving data")
-    # if this function is running as a background task it won't be able to access the engine created in the
-    # create_database function, so a new one will need created
-    global engine, db_filename
-    if engine is None:
-        engine = create_engine(f"sqlite:///{db_filename}", echo=False)
+    f = BytesIO(data)
+    on_chunk = (lambda saved: set_progress((f.tell(), len(data)))) if set_progress else None
+    summary = save_records(parse_tle_file_modified(f), on_chunk, chunk_size)
+    if summary.total == 0 and set_progress:
+        set_progress((0, 1))
+    return summary
 
-    session = sessionmaker(bind=engine)
-    count = 0
-    with session.begin() as session:
-        # print("data: ",data)
-        f = BytesIO(data)
 
-        satellites = list(parse_tle_file_modified(f))
-        count = len(satellites)
-        # print("satellites: ", satellites)
+def save_records(records, on_chunk=None, chunk_size=None):
+    """
+    Saves TLE records to the database with save_batches, a chunk at a time
+    :param records: an iterable of (name, line1, line2) tuples, such as the generator from parse_tle_file_modified
+    :param on_chunk: an optional function called after each chunk is committed, with the number of records processed so
+    far
+    :param chunk_size: the number of rows written per statement. defaults to save_chunk_size
+    :return: summary: a SaveSummary of the records saved
+    """
+    return save_batches(tle_batches(records, chunk_size), on_chunk)
 
-        if count == 0:
-            if set_progress:
-                set_progress((0, 1))
-            return 0
 
-        for i, (name, line1, line2) in enumerate(satellites):
-        # for name, line1, line2 in satellites:
-            # print("name: ", name)
-            # print("line1: ", line1)
-            # print("line2: ", line2)
-            sat_obj = EarthSatellite(line1, line2, name, ts)
+def tle_batches(records, chunk_size=None):
+    """
+    Groups TLE records into chunks and decodes each chunk with decode_tle_batch
+    :param records: an iterable of (name, line1, line2) tuples
+    :param chunk_size: the number of records in each chunk. defaults to save_chunk_size
+    :return: a generator of (names, lines1, lines2, fields) tuples, as taken by save_batches
+    """
+    chunk_size = chunk_size or save_chunk_size
+    records = iter(records)
+    while True:
+        chunk = list(islice(records, chunk_size))
+        if not chunk:
+            return
+        names, lines1, lines2 = zip(*chunk)
+        yield names, lines1, lines2, decode_tle_batch(lines1, lines2)
 
-            # print("sat_obj: ", sat_obj)
 
+def save_batches(batches, on_chunk=None):
+    """
+    Saves decoded element sets to the database. The name, satnum, epoch and orbital element columns come from the
+    decoded fields, and are saved with the TLE lines and a timestamp for each satellite. No SGP4 models are built here,
+    they are only made when the satellites are loaded for propagation.
 
-            satellite = Satellite(
-                OBJECT_ID=sat_obj.model.satnum,
-                OBJECT_NAME=sat_obj.name,
-                EPOCH=sat_obj.epoch.utc_strftime("%Y-%m-%dT%H:%M:%SZ"),
-                line1=line1.rstrip(),
-                line2=line2.rstrip(),
-                updated=datetime.now(),
-                )
-            session.merge(satellite)
+    The saved epoch, lines and name of every satellite in a batch are read first, and only element sets that are new,
+    newer, or differ from the saved one at the same epoch are written. Re-downloading a group that hasn't changed then
+    writes nothing, leaves the change counter alone and doesn't invalidate any caches. Older element sets never replace
+    newer ones, the upsert checks the epochs again in case another process saved in between.
 
+    Each batch is written with one INSERT ... ON CONFLICT (OBJECT_ID) DO UPDATE statement and committed on its own, so
+    readers see the import progress and the transaction never grows with the input. Older and changed element sets are
+    also appended to the Element_history table, where sets that are already stored are skipped. Every input format is
+    decoded into these batches, so they all share this path into the database.
+    :param batches: an iterable of (names, lines1, lines2, fields) tuples, where fields is a dictionary of arrays like
+    the one returned by decode_tle_batch
+    :param on_chunk: an optional function called after each batch is committed, with the number of records processed so
+    far
+    :return: summary: a SaveSummary of the records saved. Save listeners are given the satnums in its changed set
+    """
+    statement = upsert_statement()
+    history_statement = insert(ElementHistory).on_conflict_do_nothing()
+    summary = SaveSummary()
+    invalid = 0
+    for names, lines1, lines2, fields in batches:
+        if len(fields["satnum"]) == 0:
+            continue
+        invalid += int(np.count_nonzero(~fields["checksum_valid"]))
+        epochs = epoch_strings(fields["epoch"])
+        updated = datetime.now()
+        rows = [{
+            "OBJECT_ID": int(satnum),
+            "OBJECT_NAME": name,
+            "EPOCH": epoch,
+            "line1": line1.rstrip(),
+            "line2": line2.rstrip(),
+            "updated": updated,
+            **orbit,
+        } for satnum, name, epoch, line1, line2, orbit in zip(fields["satnum"], names, epochs, lines1, lines2,
+                                                              orbit_columns(fields))]
 
-        if set_progress:
-            set_progress((i + 1, count))
-        logger.info(f"{count} satellites saved to database")
-        session.commit()
+        with write_lock, get_engine().begin() as connection:
+            saved = saved_element_sets(connection, {row["OBJECT_ID"] for row in rows})
+            written = []
+            history = []
+            for row in rows:
+                satnum = row["OBJECT_ID"]
+                element_set = (row["EPOCH_DATETIME"], row["line1"], row["line2"], row["OBJECT_NAME"])
+                current = saved.get(satnum)
+                if current is None:
+                    summary.inserted += 1
+                elif current[0] is not None and element_set[0] < current[0]:
+                    summary.rejected += 1
+                    history.append(row)
+                    continue
+                elif current == element_set:
+                    summary.unchanged += 1
+                    continue
+                else:
+                    summary.updated += 1
+                saved[satnum] = element_set
+                summary.changed.add(satnum)
+                written.append(row)
+                history.append(row)
 
-    return count
+            if written:
+                change_id = next_change_id(connection)
+                connection.execute(statement, [dict(row, CHANGE_ID=change_id) for row in written])
+            if keep_history and history:
+                connection.execute(history_statement, [{
+                    "OBJECT_ID": row["OBJECT_ID"],
+                    "EPOCH_DATETIME": row["EPOCH_DATETIME"],
+                    "line1": row["line1"],
+                    "line2": row["line2"],
+                } for row in history])
+        if on_chunk:
+            on_chunk(summary.total)
+
+    if invalid:
+        logger.warning(f"{invalid} satellites were saved with TLE checksums that don't match")
+    logger.info(f"saved {summary.total} satellites to database: {summary}")
+    if summary.changed:
+        notify_save_listeners(sorted(summary.changed))
+    return summary
+
+
+def saved_element_sets(connection, satnums):
+    """
+    :param connection: a connection inside the saving transaction
+    :param satnums: a collection of satnums
+    :return: a dictionary of satnum to the saved (epoch, line1, line2, name) of each satellite that is saved
+    """
+    rows = connection.execute(select(Satellite.OBJECT_ID, Satellite.EPOCH_DATETIME, Satellite.line1, Satellite.line2,
+                                     Satellite.OBJECT_NAME).where(Satellite.OBJECT_ID.in_(list(satnums))))
+    return {int(satnum): (epoch, line1, line2, name) for satnum, epoch, line1, line2, name in rows}
+
+
+def upsert_statement():
+    """
+    builds an insert statement for the Satellite table that updates the existing row when the OBJECT_ID is already saved,
+    unless the saved element set has a later epoch
+    :return: a sqlalchemy Insert
+    """
+    statement = insert(Satellite)
+    return statement.on_conflict_do_update(
+        index_elements=[Satellite.OBJECT_ID],
+        set_={column.name: statement.excluded[column.name]
+              for column in Satellite.__table__.columns if not column.primary_key},
+        where=Satellite.EPOCH_DATETIME.is_(None) | (statement.excluded.EPOCH_DATETIME >= Satellite.EPOCH_DATETIME),
+    )
+
+
+def add_save_listener(listener):
+    """
+    Registers a function to be called whenever satellites are saved, so that caches built from older element sets can
+    be cleared. Listeners only run in the process that did the save.
+    :param listener: a function that takes a list of the satnums that were saved
+    """
+    if listener not in save_listeners:
+        save_listeners.append(listener)
 
 
-def get_satellite_list():
+def notify_save_listeners(satnums):
     """
-    loads all the records from the database, converting them in to EarthSatellite objects. Also generates a lookup with
-    all satellite objects indexed by their satnum
-    :return: satellites: a list of EarthSatellite objects
+    calls every registered save listener, logging rather than raising any errors so a failing cache can't stop a save
+    :param satnums: a list of the satnums that were saved
     """
-    global satellite_lookup
-    logger.info("retrieving satellite list")
-    session = sessionmaker(bind=engine)
-    satellites = []
+    for listener in save_listeners:
+        try:
+            listener(satnums)
+        except Exception as e:
+            logger.error(e)
+
+
+def sync_catalog():
+    """
+    Syncs the in-memory satellite catalog with the database and returns it. The first call loads every record into a
+    columnar SatelliteCatalog. Later calls compare the database's change counter with the one from the last sync, and
+    only fetch the rows saved or deleted since then, patching them into a new catalog without touching the rest. The
+    catalog version is only incremented when something changed.
+    :return: catalog: a SatelliteCatalog
+    """
+    global catalog, catalog_version, synced_change
+    logger.info("syncing satellite catalog")
+    session = sessionmaker(bind=get_engine())
     with session.begin() as session:
-        for sat in session.query(Satellite).all():
-            sat_object = EarthSatellite(sat.line1, sat.line2, sat.OBJECT_NAME, ts)
-            satellites.append(sat_object)
+        change_counter = get_change_counter(session)
+        if synced_change is None or change_counter < synced_change:
+            # a counter lower than the last sync means the database file was replaced, so nothing can be reused
+            rows = session.query(Satellite.OBJECT_NAME, Satellite.line1, Satellite.line2).all()
+            catalog = SatelliteCatalog.from_tles(*zip(*rows)) if rows else SatelliteCatalog.empty()
+            logger.info(f"loaded {len(catalog)} satellites")
+        elif change_counter > synced_change:
+            # deletions are applied first, so a satellite deleted and then saved again ends up in the catalog
+            deleted = session.query(DeletedSatellite.OBJECT_ID).filter(DeletedSatellite.CHANGE_ID > synced_change)
+            changed = (session.query(Satellite.OBJECT_NAME, Satellite.line1, Satellite.line2)
+                       .filter(Satellite.CHANGE_ID > synced_change).all())
+            changed_catalog = SatelliteCatalog.from_tles(*zip(*changed)) if changed else SatelliteCatalog.empty()
+            catalog = catalog.patched([int(satnum) for (satnum,) in deleted], changed_catalog)
+            logger.info(f"synced {len(changed)} changed satellites")
+        else:
+            return catalog
+
+        synced_change = change_counter
+        catalog_version += 1
+        return catalog
 
-        # print('Loaded', len(satellites), 'satellites')
-        # print(satellites)
-        satellite_lookup = {sat.model.satnum: sat for sat in satellites}
-        # print("Lookup keys (first 10):", list(satellite_lookup.keys())[:10])
-        return satellites
 
-def get_satellite_lookup():
+def restore_catalog(restored, change_counter):
     """
-    returns the satellite lookup dictionary
-    :return:
+    replaces the catalog with one loaded from somewhere other than the database, such as the warm start cache. The next
+    call to sync_catalog fetches anything that changed after change_counter.
+    :param restored: a SatelliteCatalog
+    :param change_counter: the database change counter that the catalog is up to date with, or None to force a full
+    load on the next sync
     """
-    return satellite_lookup
+    global catalog, catalog_version, synced_change
+    catalog = restored
+    synced_change = change_counter
+    catalog_version += 1
+
+
+def get_database_state():
+    """
+    :return: change_counter: the database's change counter
+    :return: count: the number of satellites in the database
+    """
+    with get_engine().connect() as connection:
+        return get_change_counter(connection), connection.execute(select(func.count()).select_from(Satellite)).scalar()
+
+
+def next_change_id(connection):
+    """
+    increments the database's change counter as part of a save or deletion
+    :param connection: a connection or session inside the transaction making the change
+    :return: the new value of the change counter
+    """
+    connection.execute(insert(CatalogState).values(name="change_counter", value=1).on_conflict_do_update(
+        index_elements=[CatalogState.name], set_={"value": CatalogState.value + 1}))
+    return get_change_counter(connection)
+
+
+def get_change_counter(connection):
+    """
+    :param connection: a connection or session
+    :return: the database's change counter, which is 0 until the first save
+    """
+    counter = connection.execute(select(CatalogState.value).where(CatalogState.name == "change_counter")).scalar()
+    return counter or 0
+
+
+def get_catalog():
+    """
+    returns the satellite catalog. It can be indexed by satnum like a dict to get an EarthSatellite
+    :return: catalog: a SatelliteCatalog
+    """
+    return catalog
+
+def get_catalog_version():
+    """
+    returns a counter that is incremented every time the catalog changes, so that anything derived from the catalog can
+    tell when it is out of date
+    :return: catalog_version: an int
+    """
+    return catalog_version
 
 
 def parse_tle_file_modified(lines, skip_names=False):
@@ -161,36 +503,459 @@ def parse_tle_file_modified(lines, skip_names=False):
             b0 = b1
             b1 = b2
 
-def get_satellite_data(id_list=None):
+def decode_tle(line1, line2):
+    """
+    Decodes a single TLE from its fixed columns, without building an EarthSatellite
+    :param line1: the first line of the TLE
+    :param line2: the second line of the TLE
+    :return: a dictionary of the fields described in decode_tle_batch, holding single values rather than arrays
+    """
+    return {key: value[0] for key, value in decode_tle_batch([line1], [line2]).items()}
+
+
+def decode_tle_batch(lines1, lines2, metadata=False):
+    """
+    Decodes many TLEs at once from their fixed columns. The lines are packed into a single byte buffer and each field is
+    read as a column slice of it with NumPy, so the cost per satellite is a few bytes of copying rather than building a
+    SGP4 model.
+
+    The elements are returned in the units written in the TLE: angles in degrees, mean motion in revolutions per day,
+    and the first and second derivatives of mean motion in revolutions per day squared and cubed.
+    :param lines1: a sequence of TLE line 1 strings
+    :param lines2: a sequence of TLE line 2 strings, in the same order
+    :param metadata: whether to also read the fields that aren't needed to propagate, as used by encode_tle_batch
+    :return: a dictionary of numpy arrays with the keys satnum, epoch (numpy datetime64 in UTC), epoch_year, epoch_day,
+    ndot, nddot, bstar, inclination, raan, eccentricity, arg_perigee, mean_anomaly, mean_motion and checksum_valid, and
+    with metadata, classification, intldesg (as written in the TLE), ephtype, elnum and revnum
+    """
+    line1 = tle_byte_array(lines1)
+    line2 = tle_byte_array(lines2)
+
+    satnum = decode_satnums(line1[:, 2:7])
+    if not np.array_equal(satnum, decode_satnums(line2[:, 2:7])):
+        raise ValueError("Object numbers in lines 1 and 2 do not match")
+
+    two_digit_year = tle_column(line1, 18, 20).astype(np.int64)
+    epoch_year = np.where(two_digit_year < 57, two_digit_year + 2000, two_digit_year + 1900)
+    epoch_day = tle_column(line1, 20, 32).astype(float)
+    year_start = (epoch_year - 1970).astype("datetime64[Y]").astype("datetime64[us]")
+    epoch = year_start + np.round((epoch_day - 1) * 86400e6).astype("timedelta64[us]")
+
+    eccentricity = line2[:, 26:33].copy()
+    eccentricity[eccentricity == ord(" ")] = ord("0")
+
+    fields = {
+        "satnum": satnum,
+        "epoch": epoch,
+        "epoch_year": epoch_year,
+        "epoch_day": epoch_day,
+        "ndot": tle_column(line1, 33, 43).astype(float),
+        "nddot": implied_decimal(line1, 44),
+        "bstar": implied_decimal(line1, 53),
+        "inclination": tle_column(line2, 8, 16).astype(float),
+        "raan": tle_column(line2, 17, 25).astype(float),
+        "eccentricity": eccentricity.view("S7").ravel().astype(float) * 1e-7,
+        "arg_perigee": tle_column(line2, 34, 42).astype(float),
+        "mean_anomaly": tle_column(line2, 43, 51).astype(float),
+        "mean_motion": tle_column(line2, 52, 63).astype(float),
+        "checksum_valid": checksum_valid(line1) & checksum_valid(line2),
+    }
+    if metadata:
+        fields.update({
+            "classification": tle_column(line1, 7, 8).astype("U1"),
+            "intldesg": np.char.strip(tle_column(line1, 9, 17).astype("U8")),
+            "ephtype": tle_integer(line1, 62, 63),
+            "elnum": tle_integer(line1, 64, 68),
+            "revnum": tle_integer(line2, 63, 68),
+        })
+    return fields
+
+
+def tle_byte_array(lines):
+    """
+    packs TLE lines into a two dimensional array of bytes, one row per line, padded or cut to TLE_LINE_LENGTH
+    :param lines: a sequence of TLE line strings
+    :return: a numpy uint8 array shaped (number of lines, TLE_LINE_LENGTH)
+    """
+    buffer = "".join(line.rstrip("\r\n")[:TLE_LINE_LENGTH].ljust(TLE_LINE_LENGTH) for line in lines).encode("ascii")
+    return np.frombuffer(buffer, dtype=np.uint8).reshape(-1, TLE_LINE_LENGTH)
+
+
+def tle_column(lines, start, end):
+    """
+    :param lines: a byte array from tle_byte_array
+    :param start: the first column of the field
+    :param end: the column after the field
+    :return: a numpy bytes array holding the field of each line
+    """
+    return lines[:, start:end].copy().view(f"S{end - start}").ravel()
+
+
+def tle_integer(lines, start, end):
+    """
+    :param lines: a byte array from tle_byte_array
+    :param start: the first column of the field
+    :param end: the column after the field
+    :return: a numpy int64 array holding the field of each line, with blank fields read as 0
+    """
+    columns = lines[:, start:end].copy()
+    columns[columns == ord(" ")] = ord("0")
+    return columns.view(f"S{end - start}").ravel().astype(np.int64)
+
+
+def implied_decimal(lines, start):
+    """
+    reads an 8 column field written with an implied decimal point and exponent, such as " 28098-4" for 0.28098e-4
+    :param lines: a byte array from tle_byte_array
+    :param start: the column of the field's sign
+    :return: a numpy float array
+    """
+    sign = np.where(lines[:, start] == ord("-"), -1.0, 1.0)
+    mantissa = tle_column(lines, start + 1, start + 6).astype(float) * 1e-5
+    exponent = tle_column(lines, start + 6, start + 8).astype(np.int64)
+    return sign * mantissa * 10.0 ** exponent
+
+
+def decode_satnums(columns):
+    """
+    reads catalog numbers, including alpha-5 numbers where a leading letter stands for the ten thousands
+    :param columns: a byte array holding the five satnum columns of each line
+    :return: a numpy int64 array
+    """
+    first = columns[:, 0]
+    satnums = np.zeros(len(columns), dtype=np.int64)
+    letters = (first >= ord("A")) & (first <= ord("Z"))
+    if np.any(~letters):
+        satnums[~letters] = columns[~letters].copy().view("S5").ravel().astype(np.int64)
+    if np.any(letters):
+        tail = columns[letters, 1:].copy().view("S4").ravel().astype(np.int64)
+        leading = np.array([ALPHA5_LETTERS.index(chr(c)) + 10 for c in first[letters]], dtype=np.int64)
+        satnums[letters] = leading * 10000 + tail
+    return satnums
+
+
+def checksum_valid(lines):
+    """
+    checks the modulo 10 checksum in the last column of each line, where digits count as their value, minus signs count
+    as one and everything else counts as zero
+    :param lines: a byte array from tle_byte_array
+    :return: a numpy bool array
+    """
+    body = lines[:, :TLE_LINE_LENGTH - 1]
+    digits = (body >= ord("0")) & (body <= ord("9"))
+    values = np.where(digits, body - ord("0"), 0) + (body == ord("-"))
+    return values.sum(axis=1) % 10 == lines[:, TLE_LINE_LENGTH - 1].astype(np.int64) - ord("0")
+
+
+def encode_tle_batch(fields):
+    """
+    Writes TLE lines from decoded fields, the reverse of decode_tle_batch. The fields are formatted the same way as
+    sgp4's export_tle, and the checksums are calculated for the new lines.
+    :param fields: a dictionary of arrays with the keys returned by decode_tle_batch. The optional keys classification,
+    intldesg (as written in the TLE, such as "98067A"), ephtype, elnum and revnum default to U, blank and 0
+    :return: lines1: a list of TLE line 1 strings
+    :return: lines2: a list of TLE line 2 strings
+    """
+    count = len(fields["satnum"])
+    satnums = encode_satnums(fields["satnum"])
+    classification = fields.get("classification", ["U"] * count)
+    intldesg = fields.get("intldesg", [""] * count)
+    ephtype = fields.get("ephtype", [0] * count)
+    elnum = fields.get("elnum", [0] * count)
+    revnum = fields.get("revnum", [0] * count)
+    ndot = [f"{value: .8f}".replace("0", "", 1) for value in np.asarray(fields["ndot"]).tolist()]
+    nddot = implied_decimal_strings(fields["nddot"], "-0")
+    bstar = implied_decimal_strings(fields["bstar"], "+0")
+    eccentricity = [f"{value:.7f}"[2:] for value in np.asarray(fields["eccentricity"]).tolist()]
+
+    lines1 = [f"1 {satnum}{(c or 'U').strip() or 'U'} {d:8} {year % 100:02d}{day:012.8f} {n} {nn}{b}{e} {el:4}"
+              for satnum, c, d, year, day, n, nn, b, e, el in
+              zip(satnums, classification, intldesg, np.asarray(fields["epoch_year"]).tolist(),
+                  np.asarray(fields["epoch_day"]).tolist(), ndot, nddot, bstar, ephtype, elnum)]
+    lines2 = [f"2 {satnum} {i:8.4f} {r:8.4f} {e} {a:8.4f} {m:8.4f} {n:11.8f}{rev % 100000:5d}"
+              for satnum, i, r, e, a, m, n, rev in
+              zip(satnums, np.asarray(fields["inclination"]).tolist(), np.asarray(fields["raan"]).tolist(),
+                  eccentricity, np.asarray(fields["arg_perigee"]).tolist(),
+                  np.asarray(fields["mean_anomaly"]).tolist(), np.asarray(fields["mean_motion"]).tolist(), revnum)]
+    return with_checksums(lines1), with_checksums(lines2)
+
+
+def encode_satnums(satnums):
+    """
+    writes catalog numbers in the five TLE columns, using alpha-5 for numbers from 100000
+    :param satnums: an array of ints below 340000, the largest number alpha-5 can hold
+    :return: a list of five character strings
+    """
+    satnums = np.asarray(satnums, dtype=np.int64)
+    if np.any((satnums < 0) | (satnums >= (len(ALPHA5_LETTERS) + 10) * 10000)):
+        raise ValueError("catalog numbers from 340000 can't be written in a TLE")
+    return [f"{satnum:05d}" if satnum < 100000 else f"{ALPHA5_LETTERS[satnum // 10000 - 10]}{satnum % 10000:04d}"
+            for satnum in satnums.tolist()]
+
+
+def implied_decimal_strings(values, zero_exponent):
+    """
+    writes values as 8 column fields with an implied decimal point and exponent, the reverse of implied_decimal
+    :param values: an array of floats
+    :param zero_exponent: the exponent written for values that don't need one, "-0" or "+0"
+    :return: a list of strings
+    """
+    return [f"{value * 10: 4.4e} ".replace(".", "").replace("e+00", zero_exponent).replace("e-0", "-")
+            .replace("e+0", "+") for value in np.asarray(values, dtype=float).tolist()]
+
+
+def with_checksums(lines):
+    """
+    :param lines: a list of TLE lines without their last column
+    :return: the lines with their modulo 10 checksums added
+    """
+    if not lines:
+        return []
+    body = tle_byte_array([line.ljust(TLE_LINE_LENGTH - 1) + "0" for line in lines])[:, :TLE_LINE_LENGTH - 1]
+    digits = (body >= ord("0")) & (body <= ord("9"))
+    checksums = (np.where(digits, body - ord("0"), 0) + (body == ord("-"))).sum(axis=1) % 10
+    return [f"{line}{checksum}" for line, checksum in zip(lines, checksums.tolist())]
+
+
+def epoch_strings(epochs):
+    """
+    formats epochs the same way as EarthSatellite.epoch.utc_strftime("%Y-%m-%dT%H:%M:%SZ"), rounded to the nearest second
+    :param epochs: a numpy datetime64 array
+    :return: a list of strings
+    """
+    seconds = (epochs + np.timedelta64(500000, "us")).astype("datetime64[s]")
+    return [f"{epoch}Z" for epoch in np.datetime_as_string(seconds, unit="s")]
+
+
+def orbit_columns(fields):
+    """
+    works out the values of the orbital element columns from decoded TLE fields
+    :param fields: a dictionary returned by decode_tle_batch
+    :return: a list with a dictionary of column values for each satellite
+    """
+    mean_motion = fields["mean_motion"]
+    eccentricity = fields["eccentricity"]
+    with np.errstate(divide="ignore", invalid="ignore"):
+        period = 1440.0 / mean_motion
+        semi_major_axis = np.cbrt(MU_EARTH * (period * 60 / (2 * np.pi)) ** 2)
+    apogee = semi_major_axis * (1 + eccentricity) - EARTH_RADIUS_KM
+    perigee = semi_major_axis * (1 - eccentricity) - EARTH_RADIUS_KM
+
+    columns = zip(fields["epoch"].astype("datetime64[us]").tolist(), fields["inclination"].tolist(),
+                  eccentricity.tolist(), mean_motion.tolist(), period.tolist(), apogee.tolist(), perigee.tolist(),
+                  fields["bstar"].tolist())
+    return [{name: (None if isinstance(value, float) and not np.isfinite(value) else value)
+             for name, value in zip(ORBIT_COLUMNS, values)} for values in columns]
+
+
+def satellite_filters(orbit=None, min_inclination=None, max_inclination=None, max_age_days=None):
+    """
+    builds SQL conditions that select satellites by their orbital elements. Arguments left as None aren't filtered on.
+    :param orbit: one of the keys of ORBIT_CLASSES, such as "LEO"
+    :param min_inclination: the lowest inclination in degrees
+    :param max_inclination: the highest inclination in degrees
+    :param max_age_days: the oldest epoch allowed, in days before now
+    :return: a list of sqlalchemy conditions
+    """
+    conditions = []
+    if orbit:
+        if orbit not in ORBIT_CLASSES:
+            raise ValueError(f"unknown orbit class {orbit}")
+        conditions.append(ORBIT_CLASSES[orbit]())
+    if min_inclination is not None:
+        conditions.append(Satellite.INCLINATION >= min_inclination)
+    if max_inclination is not None:
+        conditions.append(Satellite.INCLINATION <= max_inclination)
+    if max_age_days is not None:
+        oldest = datetime.now(timezone.utc).replace(tzinfo=None) - timedelta(days=max_age_days)
+        conditions.append(Satellite.EPOCH_DATETIME >= oldest)
+    return conditions
+
+
+def get_filtered_satnums(**filters):
+    """
+    finds the satellites matching an orbit filter inside SQLite
+    :param filters: keyword arguments passed on to satellite_filters
+    :return: a list of satnums
+    """
+    logger.info(f"filtering satellites by {filters}")
+    with get_engine().connect() as connection:
+        return [int(satnum) for satnum in
+                connection.execute(select(Satellite.OBJECT_ID).where(*satellite_filters(**filters))).scalars()]
+
+
+def get_satellite_data(id_list=None, filters=None):
     """
     Retrieves the raw TLE data from the database for export into a file
 
     :param id_list: a list of satellite satnums. If this list is supplied, ony the data of satellites in this list is
     retrieved, otherwise all satellites are retrieved.
+    :param filters: an optional dictionary of keyword arguments for satellite_filters, applied in the query
     :return: satellite_data: a list of tuples containing the satellites name, TLE line 1 and TLE line 2
     """
     satellite_data = []
     logger.info("retrieving tle data")
+    conditions = satellite_filters(**filters) if filters else []
     if id_list is None:
-        session = sessionmaker(bind=engine)
+        session = sessionmaker(bind=get_engine())
         with session.begin() as session:
-            for sat in session.query(Satellite).all():
+            for sat in session.query(Satellite).filter(*conditions).all():
                 satellite_data.append((sat.OBJECT_NAME, sat.line1, sat.line2))
     else:
-        session = sessionmaker(bind=engine)
+        session = sessionmaker(bind=get_engine())
         with session.begin() as session:
-            for sat in session.query(Satellite).filter(Satellite.OBJECT_ID.in_(id_list)).all():
+            for sat in session.query(Satellite).filter(Satellite.OBJECT_ID.in_(id_list), *conditions).all():
                 satellite_data.append((sat.OBJECT_NAME, sat.line1, sat.line2))
 
     return satellite_data
 
 
+def export_tle_file(path, id_list=None, filters=None, set_progress=None, chunk_size=None):
+    """
+    Writes the TLE data of satellites from the database straight into a file. The rows are streamed from a cursor a
+    chunk at a time and written as they arrive, so only one chunk of the export is ever held in memory. The file is
+    written next to the destination and moved over it once complete.
+
+    :param path: the path of the file to write
+    :param id_list: a list of satellite satnums. If this list is supplied, only these satellites are exported, otherwise
+    all satellites are exported.
+    :param filters: an optional dictionary of keyword arguments for satellite_filters, applied in the query
+    :param set_progress: Tracks the progress made writing the file, updated after each chunk with the number of
+    satellites written
+    :param chunk_size: the number of rows fetched and written together. defaults to save_chunk_size
+    :return: count: an int enumerating the number of satellites written
+    """
+    chunk_size = chunk_size or save_chunk_size
+    conditions = satellite_filters(**filters) if filters else []
+    if id_list is None:
+        queries = [conditions]
+    else:
+        # the satnums are sent a chunk at a time, keeping under sqlite's limit on the number of bound parameters
+        id_list = list(id_list)
+        queries = [[Satellite.OBJECT_ID.in_(id_list[start:start + chunk_size]), *conditions]
+                   for start in range(0, len(id_list), chunk_size)]
+
+    logger.info(f"exporting tle data to {path}")
+    temp_path = f"{path}.tmp"
+    count = 0
+    try:
+        with get_engine().connect() as connection, open(temp_path, "w", encoding="utf-8", newline="\n") as f:
+            total = sum(connection.execute(select(func.count()).select_from(Satellite).where(*query)).scalar()
+                        for query in queries)
+            for query in queries:
+                result = connection.execution_options(yield_per=chunk_size).execute(
+                    select(Satellite.OBJECT_NAME, Satellite.line1, Satellite.line2).where(*query))
+                for rows in result.partitions():
+                    f.write("".join(f"{name}\n{line1}\n{line2}\n" for name, line1, line2 in rows))
+                    count += len(rows)
+                    if set_progress:
+                        set_progress((count, max(total, 1)))
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    os.replace(temp_path, path)
+    logger.info(f"exported {count} satellites")
+    return count
+
+
+def get_element_history(satnum, start=None, end=None):
+    """
+    Retrieves the saved element sets of a satellite in epoch order
+    :param satnum: the satellite's satnum
+    :param start: an optional datetime, the earliest epoch returned
+    :param end: an optional datetime, the latest epoch returned
+    :return: a list of (epoch, line1, line2) tuples, with the epochs as naive UTC datetimes
+    """
+    conditions = [ElementHistory.OBJECT_ID == int(satnum)]
+    if start is not None:
+        conditions.append(ElementHistory.EPOCH_DATETIME >= utc_naive(start))
+    if end is not None:
+        conditions.append(ElementHistory.EPOCH_DATETIME <= utc_naive(end))
+    with get_engine().connect() as connection:
+        return [tuple(row) for row in connection.execute(
+            select(ElementHistory.EPOCH_DATETIME, ElementHistory.line1, ElementHistory.line2)
+            .where(*conditions).order_by(ElementHistory.EPOCH_DATETIME))]
+
+
+def get_nearest_element_sets(satnums, when):
+    """
+    Finds the saved element set of each satellite with the epoch nearest to a time, which is the most accurate one to
+    propagate it to that time with. Each satellite takes two seeks of the history's primary key, one for the last epoch
+    at or before the time and one for the first after it, however many sets are stored.
+    :param satnums: an iterable of satnums
+    :param when: a datetime, naive datetimes are taken as UTC
+    :return: a dictionary of satnum to an (epoch, line1, line2) tuple, leaving out satellites with no history
+    """
+    when = utc_naive(when)
+    columns = (ElementHistory.EPOCH_DATETIME, ElementHistory.line1, ElementHistory.line2)
+    before = (select(*columns).where(ElementHistory.OBJECT_ID == bindparam("satnum"),
+                                     ElementHistory.EPOCH_DATETIME <= when)
+              .order_by(ElementHistory.EPOCH_DATETIME.desc()).limit(1))
+    after = (select(*columns).where(ElementHistory.OBJECT_ID == bindparam("satnum"),
+                                    ElementHistory.EPOCH_DATETIME > when)
+             .order_by(ElementHistory.EPOCH_DATETIME).limit(1))
+    element_sets = {}
+    with get_engine().connect() as connection:
+        for satnum in satnums:
+            candidates = [row for statement in (before, after)
+                          for row in connection.execute(statement, {"satnum": int(satnum)})]
+            if candidates:
+                element_sets[satnum] = tuple(min(candidates, key=lambda row: abs(row[0] - when)))
+    return element_sets
+
+
+def get_satellite_at(satnum, when):
+    """
+    :param satnum: the satellite's satnum
+    :param when: a datetime, naive datetimes are taken as UTC
+    :return: an EarthSatellite built from the element set with the epoch nearest to when, or None if it has no history
+    """
+    element_set = get_nearest_element_sets([satnum], when).get(satnum)
+    if element_set is None:
+        return None
+    current = catalog.get(satnum)
+    return EarthSatellite(element_set[1], element_set[2], current.name if current else None, ts)
+
+
+def prune_element_history(before):
+    """
+    Deletes the element sets with epochs before a time, keeping the history from growing without limit
+    :param before: a datetime, naive datetimes are taken as UTC
+    :return: the number of element sets deleted
+    """
+    with write_lock, get_engine().begin() as connection:
+        count = connection.execute(delete(ElementHistory)
+                                   .where(ElementHistory.EPOCH_DATETIME < utc_naive(before))).rowcount
+    logger.info(f"deleted {count} element sets from before {before}")
+    return count
+
+
+def utc_naive(when):
+    """
+    :param when: a datetime
+    :return: the datetime as a naive UTC datetime, like the epochs stored in the database
+    """
+    if when.tzinfo is not None:
+        return when.astimezone(timezone.utc).replace(tzinfo=None)
+    return when
+
+
 def delete_all_satellites():
     """
     Deletes all records from the database
     """
     logger.info("deleting all satellites")
-    session = sessionmaker(bind=engine)
-    with session.begin() as session:
+    session = sessionmaker(bind=get_engine())
+    with write_lock, session.begin() as session:
+        change_id = next_change_id(session)
+        # the deleted satnums are recorded so that in-memory catalogs can drop them without a full reload. Older
+        # records are kept, since a catalog restored from the warm start cache may be several changes behind
+        satnums = session.execute(select(Satellite.OBJECT_ID)).scalars().all()
+        if satnums:
+            statement = insert(DeletedSatellite)
+            session.execute(statement.on_conflict_do_update(index_elements=[DeletedSatellite.OBJECT_ID],
+                                                            set_={"CHANGE_ID": statement.excluded.CHANGE_ID}),
+                            [{"OBJECT_ID": satnum, "CHANGE_ID": change_id} for satnum in satnums])
         session.query(Satellite).delete()
         session.commit()
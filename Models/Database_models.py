@@ -1,4 +1,5 @@
 from datetime import datetime
+from typing import Optional
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
 
 class Base(DeclarativeBase):
@@ -13,6 +14,14 @@ class Satellite(Base):
 
     I chose to store the raw TLE rather than extracting all the data into separate columns to make it easier to build
     EarthSatellite objects for use in Skyfields's calculations, and so the data can later be exported to a file.
+
+    The orbital element columns are decoded from the TLE when it is saved and are indexed, so that satellites can be
+    filtered by their orbit inside SQLite rather than by loading every row. They are nullable because databases made
+    before they were added are filled in by a migration when the app starts. PERIOD is in minutes, APOGEE and PERIGEE
+    are altitudes in km, and EPOCH_DATETIME is the epoch in UTC.
+
+    CHANGE_ID is the value of the catalog change counter from the save that last wrote the row, which lets the
+    in-memory catalog fetch only the rows that changed since it was last synced.
     """
     __tablename__ = 'Satellite'
 
@@ -21,4 +30,53 @@ class Satellite(Base):
     EPOCH:Mapped[str]
     line1:Mapped[str]
     line2:Mapped[str]
-    updated:Mapped[datetime]
\ No newline at end of file
+    updated:Mapped[datetime]
+    EPOCH_DATETIME:Mapped[Optional[datetime]] = mapped_column(index=True)
+    INCLINATION:Mapped[Optional[float]] = mapped_column(index=True)
+    ECCENTRICITY:Mapped[Optional[float]] = mapped_column(index=True)
+    MEAN_MOTION:Mapped[Optional[float]] = mapped_column(index=True)
+    PERIOD:Mapped[Optional[float]] = mapped_column(index=True)
+    APOGEE:Mapped[Optional[float]] = mapped_column(index=True)
+    PERIGEE:Mapped[Optional[float]] = mapped_column(index=True)
+    BSTAR:Mapped[Optional[float]] = mapped_column(index=True)
+    CHANGE_ID:Mapped[Optional[int]] = mapped_column(index=True)
+
+
+class DeletedSatellite(Base):
+    """
+    A record of each satellite deleted from the Satellite table and the change counter value of the deletion, so that
+    in-memory catalogs can remove it when they next sync.
+    """
+    __tablename__ = 'Deleted_satellite'
+
+    OBJECT_ID:Mapped[str] = mapped_column(primary_key=True)
+    CHANGE_ID:Mapped[int] = mapped_column(index=True)
+
+
+class ElementHistory(Base):
+    """
+    Every element set that has been saved for each satellite, kept when the Satellite row is overwritten by a newer one
+    so that past dates can be propagated with the TLE that was current at the time.
+
+    The table is append only and keyed by satnum and epoch, so saving the same element set again adds nothing. It is a
+    WITHOUT ROWID table, which stores the rows in primary key order. Looking up a satellite's element sets around a
+    time is then a single search of the table itself rather than of an index followed by the table, and the key isn't
+    stored twice.
+    """
+    __tablename__ = 'Element_history'
+    __table_args__ = {"sqlite_with_rowid": False}
+
+    OBJECT_ID:Mapped[int] = mapped_column(primary_key=True)
+    EPOCH_DATETIME:Mapped[datetime] = mapped_column(primary_key=True)
+    line1:Mapped[str]
+    line2:Mapped[str]
+
+
+class CatalogState(Base):
+    """
+    Named counters describing the state of the database. change_counter is incremented by every save and deletion.
+    """
+    __tablename__ = 'Catalog_state'
+
+    name:Mapped[str] = mapped_column(primary_key=True)
+    value:Mapped[int]
@@ -0,0 +1,300 @@
+import os
+import bz2
+import csv
+import gzip
+import json
+import zipfile
+import threading
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO, TextIOWrapper
+from itertools import islice
+from Models import Database
+from Models.Database import SaveSummary, save_batches, tle_batches, parse_tle_file_modified, encode_tle_batch
+import logging
+
+# the leading bytes that identify each supported compression format
+COMPRESSION_MAGIC = {
+    b"\x1f\x8b": "gzip",
+    b"BZh": "bz2",
+    b"PK\x03\x04": "zip",
+}
+# wraps a compressed binary file in a file that decompresses it as it's read
+DECOMPRESSORS = {
+    "gzip": lambda f: gzip.GzipFile(fileobj=f, mode="rb"),
+    "bz2": lambda f: bz2.BZ2File(f, mode="rb"),
+}
+archive_workers = None  # zip members imported at the same time. None uses one per cpu
+# the OMM keys read into each decoded field, with the value used when a record leaves it out
+OMM_FIELDS = {
+    "inclination": ("INCLINATION", 0.0),
+    "raan": ("RA_OF_ASC_NODE", 0.0),
+    "eccentricity": ("ECCENTRICITY", 0.0),
+    "arg_perigee": ("ARG_OF_PERICENTER", 0.0),
+    "mean_anomaly": ("MEAN_ANOMALY", 0.0),
+    "mean_motion": ("MEAN_MOTION", 0.0),
+    "ndot": ("MEAN_MOTION_DOT", 0.0),
+    "nddot": ("MEAN_MOTION_DDOT", 0.0),
+    "bstar": ("BSTAR", 0.0),
+}
+MAX_TLE_SATNUM = 339999  # the largest catalog number that alpha-5 can write in a TLE
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(filename="log.txt", format='%(asctime)s - %(levelname)s:%(message)s', level=logging.INFO)
+
+
+def import_tle_file(path, set_progress=None, chunk_size=None):
+    """
+    Streams a file of element sets from a local path into the database. The file can be TLE or OMM, in any of the
+    FORMATS, and plain text, gzip, bz2 and zip files are all accepted. Compressed files are decompressed as they are
+    read rather than to a temporary file. The records are saved in chunks, so only one chunk is held in memory however
+    large the file is, apart from OMM JSON which has to be parsed whole.
+    :param path: the path of the TLE file
+    :param set_progress: Tracks the progress made saving the file, updated after each chunk
+    :param chunk_size: the number of rows written and committed together. defaults to Database.save_chunk_size
+    :return: summary: a Database.SaveSummary of the records saved
+    """
+    logger.info(f"importing tle file {path}")
+    with open(path, "rb") as f:
+        return import_tle_stream(f, os.path.getsize(path), set_progress, chunk_size)
+
+
+def import_tle_data(data, set_progress=None, chunk_size=None):
+    """
+    Saves element sets that are already in memory, such as an uploaded file or a download, in any of the FORMATS and
+    possibly compressed
+    :param data: the bytes of the file
+    :param set_progress: Tracks the progress made saving the data, updated after each chunk
+    :param chunk_size: the number of rows written and committed together. defaults to Database.save_chunk_size
+    :return: summary: a Database.SaveSummary of the records saved
+    """
+    return import_tle_stream(BytesIO(data), len(data), set_progress, chunk_size)
+
+
+def import_tle_stream(f, size, set_progress=None, chunk_size=None):
+    """
+    Works out whether a file is compressed from its first bytes and saves the element sets in it. Progress is reported
+    against the compressed size, using the position in the underlying file.
+    :param f: a seekable binary file
+    :param size: the size of the file in bytes
+    :param set_progress: Tracks the progress made saving the file, updated after each chunk
+    :param chunk_size: the number of rows written and committed together
+    :return: summary: a Database.SaveSummary of the records saved
+    """
+    compression = detect_compression(f)
+    logger.info(f"importing {compression or 'uncompressed'} tle data")
+    if compression == "zip":
+        return import_zip(f, set_progress, chunk_size)
+
+    on_chunk = (lambda saved: set_progress((f.tell(), size))) if set_progress else None
+    if compression is None:
+        summary = save_stream(f, on_chunk, chunk_size)
+    else:
+        with DECOMPRESSORS[compression](f) as stream:
+            summary = save_stream(stream, on_chunk, chunk_size)
+    if set_progress:
+        set_progress((size, size) if size else (0, 1))
+    return summary
+
+
+def detect_compression(f):
+    """
+    :param f: a seekable binary file, which is left at the position it started at
+    :return: the name of the compression format, or None for plain text
+    """
+    start = f.tell()
+    magic = f.read(4)
+    f.seek(start)
+    for prefix, compression in COMPRESSION_MAGIC.items():
+        if magic.startswith(prefix):
+            return compression
+    return None
+
+
+def import_zip(f, set_progress=None, chunk_size=None):
+    """
+    Saves the element sets in every member of a zip archive. Members are imported in parallel by a thread pool, each one
+    decompressed and parsed as it is read. Decompression runs outside the GIL and the writes to the database take turns
+    through Database.write_lock, so the members overlap their reading with each other's writes. Members that are
+    themselves gzip or bz2 compressed are decompressed as well.
+    :param f: a seekable binary file holding the archive
+    :param set_progress: Tracks the progress made saving the archive, updated after each chunk of any member
+    :param chunk_size: the number of rows written and committed together
+    :return: summary: a Database.SaveSummary of the records saved
+    """
+    with zipfile.ZipFile(f) as archive:
+        members = [info for info in archive.infolist() if not info.is_dir()]
+        total = sum(info.file_size for info in members) or 1
+        read = {}
+        lock = threading.Lock()
+
+        def report(name, position):
+            with lock:
+                read[name] = position
+                if set_progress:
+                    set_progress((sum(read.values()), total))
+
+        def import_member(info):
+            with archive.open(info) as member:
+                compression = detect_compression(member) if member.seekable() else None
+                on_chunk = lambda saved: report(info.filename, member.tell())
+                if compression in DECOMPRESSORS:
+                    with DECOMPRESSORS[compression](member) as stream:
+                        summary = save_stream(stream, on_chunk, chunk_size)
+                else:
+                    summary = save_stream(member, on_chunk, chunk_size)
+            report(info.filename, info.file_size)
+            logger.info(f"imported {summary.total} satellites from {info.filename}: {summary}")
+            return summary
+
+        workers = max(1, min(len(members), archive_workers or os.cpu_count() or 1))
+        logger.info(f"importing {len(members)} zip members with {workers} workers")
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            return sum(executor.map(import_member, members), SaveSummary())
+
+
+def save_stream(f, on_chunk=None, chunk_size=None):
+    """
+    Works out the format of a decompressed stream and saves it with that format's parser
+    :param f: a binary file
+    :param on_chunk: an optional function called after each chunk is committed, with the number of records processed
+    so far
+    :param chunk_size: the number of rows written and committed together
+    :return: summary: a Database.SaveSummary of the records saved
+    """
+    data_format = detect_format(f)
+    logger.info(f"reading {data_format} element sets")
+    return save_batches(FORMATS[data_format](f, chunk_size or Database.save_chunk_size), on_chunk)
+
+
+def detect_format(f):
+    """
+    Works out the format of element set data from its first non blank characters: a JSON array or object, a CSV header
+    naming OMM fields, or otherwise TLE
+    :param f: a binary file, which is left at the position it started at
+    :return: a key of FORMATS
+    """
+    head = peek(f, 1024).lstrip(b"\xef\xbb\xbf \t\r\n")
+    if head[:1] in (b"[", b"{"):
+        return "json"
+    if b"," in head.split(b"\n", 1)[0] and b"NORAD_CAT_ID" in head:
+        return "csv"
+    return "tle"
+
+
+def peek(f, size):
+    """
+    :param f: a binary file
+    :param size: the number of bytes wanted
+    :return: up to size bytes from the current position, without moving it
+    """
+    if hasattr(f, "peek"):
+        return f.peek(size)[:size]
+    start = f.tell()
+    data = f.read(size)
+    f.seek(start)
+    return data
+
+
+def tle_parser(f, chunk_size):
+    """
+    :param f: a binary file of two or three line element sets
+    :param chunk_size: the number of records in each batch
+    :return: a generator of batches for Database.save_batches
+    """
+    return tle_batches(parse_tle_file_modified(f), chunk_size)
+
+
+def omm_json_parser(f, chunk_size):
+    """
+    Reads OMM records in the JSON layout served by CelesTrak, a list of objects keyed by OMM field names. The whole
+    document is parsed at once, then decoded in batches.
+    :param f: a binary file
+    :param chunk_size: the number of records in each batch
+    :return: a generator of batches for Database.save_batches
+    """
+    records = json.load(f)
+    if isinstance(records, dict):
+        records = [records]
+    for start in range(0, len(records), chunk_size):
+        chunk = records[start:start + chunk_size]
+        keys = {key for record in chunk for key in record}
+        yield decode_omm_batch({key: [record.get(key) for record in chunk] for key in keys})
+
+
+def omm_csv_parser(f, chunk_size):
+    """
+    Reads OMM records in the CSV layout served by CelesTrak, with a header row of OMM field names. Rows are read a
+    batch at a time, so the file is never held in memory.
+    :param f: a binary file
+    :param chunk_size: the number of records in each batch
+    :return: a generator of batches for Database.save_batches
+    """
+    text = TextIOWrapper(f, encoding="utf-8-sig", newline="")
+    try:
+        reader = csv.reader(text)
+        header = [key.strip() for key in next(reader, [])]
+        while True:
+            rows = [row for row in islice(reader, chunk_size) if row]
+            if not rows:
+                return
+            yield decode_omm_batch(dict(zip(header, zip(*rows))))
+    finally:
+        text.detach()
+
+
+def decode_omm_batch(columns):
+    """
+    Decodes a batch of OMM records into the fields used by Database.save_batches, converting each column to a NumPy
+    array at once. TLE lines are written for every record with Database.encode_tle_batch, since the catalog and TLE
+    export are built from them. Records with catalog numbers too large to write in a TLE are skipped.
+    :param columns: a dictionary of OMM field name to a sequence of values, as strings or numbers
+    :return: names, lines1, lines2, fields: a batch for Database.save_batches
+    """
+    count = len(columns["NORAD_CAT_ID"])
+    satnum = np.asarray(columns["NORAD_CAT_ID"], dtype=float).astype(np.int64)
+    keep = satnum <= MAX_TLE_SATNUM
+    if not np.all(keep):
+        logger.warning(f"skipped {np.count_nonzero(~keep)} satellites with catalog numbers that can't be written in a TLE")
+
+    def column(key, default, dtype=float):
+        values = columns.get(key) or [default] * count
+        return np.asarray([default if value in (None, "") else value for value in values], dtype=dtype)[keep]
+
+    epoch = np.asarray([value.rstrip("Z") for value in columns["EPOCH"]], dtype="datetime64[us]")[keep]
+    year = epoch.astype("datetime64[Y]")
+    fields = {key: column(name, default) for key, (name, default) in OMM_FIELDS.items()}
+    fields.update({
+        "satnum": satnum[keep],
+        "epoch": epoch,
+        "epoch_year": year.astype(np.int64) + 1970,
+        "epoch_day": 1 + (epoch - year.astype("datetime64[us]")).astype(np.int64) / 86400e6,
+        "classification": column("CLASSIFICATION_TYPE", "U", str).tolist(),
+        "intldesg": [designator_to_tle(value) for value in column("OBJECT_ID", "", str).tolist()],
+        "ephtype": column("EPHEMERIS_TYPE", 0, float).astype(np.int64).tolist(),
+        "elnum": column("ELEMENT_SET_NO", 0, float).astype(np.int64).tolist(),
+        "revnum": column("REV_AT_EPOCH", 0, float).astype(np.int64).tolist(),
+    })
+    fields["checksum_valid"] = np.ones(len(fields["satnum"]), dtype=bool)
+    names = [name or None for name in column("OBJECT_NAME", "", str).tolist()]
+    lines1, lines2 = encode_tle_batch(fields)
+    return names, lines1, lines2, fields
+
+
+def designator_to_tle(designator):
+    """
+    :param designator: an international designator as written in OMM, such as "1998-067A"
+    :return: the designator as written in a TLE, such as "98067A"
+    """
+    if len(designator) > 5 and designator[4] == "-":
+        return designator[2:4] + designator[5:]
+    return designator
+
+
+# the parser for each element set format, taking a binary file and the batch size and returning a generator of batches
+# for Database.save_batches. detect_format picks between them, and more can be added here
+FORMATS = {
+    "tle": tle_parser,
+    "json": omm_json_parser,
+    "csv": omm_csv_parser,
+}
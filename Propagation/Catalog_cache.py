@@ -0,0 +1,111 @@
+import os
+import time
+import numpy as np
+from Models import Database
+from Models.Catalog import SatelliteCatalog, METADATA_FIELDS
+import logging
+
+CACHE_FORMAT = 2  # incremented whenever the layout of the cache file changes, so old files are ignored
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(filename="log.txt", format='%(asctime)s - %(levelname)s:%(message)s', level=logging.INFO)
+
+
+def get_cache_path():
+    """
+    :return: the path of the warm start cache, which sits next to the database file
+    """
+    return f"{Database.db_filename}_catalog.npz"
+
+
+def cache_enabled():
+    """
+    :return: True unless the app is using an in-memory database, which the cache file would never match
+    """
+    return not Database.in_memory
+
+
+def load_catalog():
+    """
+    Loads the satellite catalog on startup. When the warm start cache is present and no newer than the database, the
+    catalog's columns are read straight from it rather than by parsing every TLE, then anything saved or deleted since
+    the cache was written is synced from the database. Otherwise every row is parsed as before. The cache is rewritten
+    whenever it didn't match the database, and the time taken is logged either way.
+
+    :return: catalog: a SatelliteCatalog
+    """
+    start = time.perf_counter()
+    if not cache_enabled():
+        catalog = Database.sync_catalog()
+        logger.info(f"loaded {len(catalog)} satellites in {time.perf_counter() - start:.3f}s")
+        return catalog
+
+    change_counter, count = Database.get_database_state()
+    cached = read_catalog_cache()
+    warm = cached is not None and cached[1] <= change_counter
+    if warm:
+        catalog, cache_counter = cached
+        Database.restore_catalog(catalog, cache_counter)
+        catalog = Database.sync_catalog()
+        if len(catalog) != count:
+            # the change history doesn't explain the difference, so the database must have been replaced
+            logger.warning("the catalog cache doesn't match the database, reloading")
+            warm = False
+    if not warm:
+        Database.restore_catalog(SatelliteCatalog.empty(), None)
+        catalog = Database.sync_catalog()
+
+    elapsed = time.perf_counter() - start
+    logger.info(f"{'warm' if warm else 'cold'} start: loaded {len(catalog)} satellites in {elapsed:.3f}s")
+    if not warm or cached[1] != change_counter:
+        write_catalog_cache(catalog, change_counter)
+    return catalog
+
+
+def write_catalog_cache(catalog, change_counter):
+    """
+    Writes the catalog's columns to the warm start cache. The file is written to a temporary path first and then moved
+    over the old cache, so a crash part way through can't leave a broken cache behind.
+
+    :param catalog: a SatelliteCatalog
+    :param change_counter: the database change counter the catalog is up to date with
+    """
+    path = get_cache_path()
+    arrays = {
+        "format": np.array(CACHE_FORMAT),
+        "change_counter": np.array(change_counter),
+        "satnums": catalog.satnums,
+        "names": catalog.names,
+        "elements": catalog.elements,
+        **{f"metadata_{field}": values for field, values in catalog.metadata.items()},
+    }
+    try:
+        with open(f"{path}.tmp", "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(f"{path}.tmp", path)
+        logger.info(f"wrote {len(catalog)} satellites to the catalog cache")
+    except OSError as e:
+        logger.error(f"couldn't write the catalog cache: {e}")
+
+
+def read_catalog_cache():
+    """
+    Reads the warm start cache in a single pass. The arrays in it are used as the catalog's columns as they are, so no
+    TLEs are parsed and no SGP4 models are built.
+
+    :return: catalog: a SatelliteCatalog, or None if there's no usable cache
+    :return: change_counter: the database change counter the cache was written at
+    """
+    path = get_cache_path()
+    if not os.path.exists(path):
+        return None
+    try:
+        with np.load(path, allow_pickle=False) as cache:
+            if int(cache["format"]) != CACHE_FORMAT:
+                return None
+            catalog = SatelliteCatalog(cache["satnums"], cache["names"], cache["elements"],
+                                       {field: cache[f"metadata_{field}"] for field in METADATA_FIELDS})
+            return catalog, int(cache["change_counter"])
+    except (OSError, ValueError, KeyError) as e:
+        logger.error(f"couldn't read the catalog cache: {e}")
+        return None
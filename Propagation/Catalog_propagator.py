@@ -0,0 +1,178 @@
+import numpy as np
+from sgp4.api import SatrecArray
+from skyfield.api import load
+from skyfield.constants import DAY_S
+from skyfield.sgp4lib import theta_GMST1982
+from Models.Database import get_catalog, get_catalog_version
+from Models.Catalog import build_satrecs
+import logging
+
+ts = load.timescale()
+WGS84_A_KM = 6378.137
+WGS84_F = 1 / 298.257223563
+WGS84_E2 = WGS84_F * (2 - WGS84_F)
+
+propagator = None
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(filename="log.txt", format='%(asctime)s - %(levelname)s:%(message)s', level=logging.INFO)
+
+
+class CatalogPropagator:
+    """
+    Holds the SGP4 models of every satellite in the catalog in a single sgp4 SatrecArray so the whole catalog can be
+    propagated in one vectorised call, rather than calling EarthSatellite.at() once per satellite in a python loop.
+
+    Rows of every array returned by this class line up with the satnums attribute, and the index dict can be used to
+    find the row of a given satnum.
+    """
+    def __init__(self, catalog, version=None, previous=None):
+        """
+        :param catalog: a SatelliteCatalog
+        :param version: the catalog version the satellites were loaded from, used to detect when a rebuild is needed
+        :param previous: an optional propagator for an earlier version of the catalog, whose SGP4 models are reused for
+        the satellites that haven't changed
+        """
+        logger.info(f"building catalog propagator for {len(catalog)} satellites")
+        self.version = version
+        self.catalog = catalog
+        self.satnums = catalog.satnums
+        self.index = catalog.index
+        self.epoch_jd = catalog.epoch_jd
+        self.elements = catalog.elements
+        self.satrec_list = build_satrecs(self.elements, previous and (previous.elements, previous.satrec_list))
+        self.satrecs = SatrecArray(self.satrec_list) if len(catalog) else None
+        self._epochs = None
+
+    @property
+    def epochs(self):
+        """
+        The epoch of each satellite's element set as a list of UTC datetimes. These are only converted the first time
+        they are needed, since they don't change until the catalog is rebuilt.
+        """
+        if self._epochs is None:
+            if len(self.epoch_jd) == 0:
+                self._epochs = []
+            else:
+                self._epochs = list(ts.utc(1949, 12, 31 + (self.epoch_jd - 2433281.5)).utc_datetime())
+        return self._epochs
+
+    def __len__(self):
+        return len(self.satnums)
+
+    def rows_for(self, satnums):
+        """
+        Converts a list of satnums into row numbers, skipping any satnum that isn't in the catalog
+
+        :param satnums: an iterable of satellite satnums
+        :return: a numpy array of row numbers
+        """
+        return np.array([self.index[s] for s in satnums if s in self.index], dtype=np.intp)
+
+    def propagate(self, t, rows=None):
+        """
+        Calculates the position of every satellite in the catalog (or in rows) at one or more times.
+
+        :param t: a skyfield Time object. It can hold a single time or an array of times
+        :param rows: an optional array of row numbers to propagate. All rows are propagated by default.
+        :return: lat, lon: geodetic latitude and longitude in degrees, shaped (N,) for a single time or (N, T) for an
+        array of times
+        :return: alt: altitude above the WGS84 ellipsoid in km, with the same shape as lat
+        :return: ecef: earth fixed (ITRS) cartesian coordinates in km, shaped (N, 3) or (N, T, 3)
+        """
+        scalar = not getattr(t.whole, "shape", None)
+        jd = np.atleast_1d(t.whole)
+        fraction = np.atleast_1d(t.tai_fraction - t._leap_seconds() / DAY_S)
+
+        if self.satrecs is None or (rows is not None and len(rows) == 0):
+            empty = np.empty((0,) if scalar else (0, len(jd)))
+            return empty, empty, empty, np.empty(empty.shape + (3,))
+
+        ecef = sgp4_ecef(self.satrecs, jd, fraction, np.atleast_1d(t.ut1_fraction))
+        if rows is not None:
+            ecef = ecef[rows]
+        lat, lon, alt = ecef_to_geodetic(ecef)
+
+        if scalar:
+            return lat[:, 0], lon[:, 0], alt[:, 0], ecef[:, 0]
+        return lat, lon, alt, ecef
+
+
+def sgp4_ecef(satrecs, jd, fraction_utc, fraction_ut1):
+    """
+    Runs SGP4 and rotates the results into the earth fixed frame. sgp4 fills the positions of satellites that fail to
+    propagate (e.g. decayed orbits) with nan.
+
+    :param satrecs: a SatrecArray, or a single Satrec
+    :param jd: whole part of the julian dates, shaped (T,)
+    :param fraction_utc: fractional part of the UTC julian dates, shaped (T,)
+    :param fraction_ut1: fractional part of the UT1 julian dates, shaped (T,)
+    :return: earth fixed positions in km, shaped (N, T, 3) for a SatrecArray or (T, 3) for a Satrec
+    """
+    if isinstance(satrecs, SatrecArray):
+        e, r, v = satrecs.sgp4(jd, fraction_utc)
+    else:
+        e, r, v = satrecs.sgp4_array(jd, fraction_utc)
+    return teme_to_ecef(r, jd, fraction_ut1)
+
+
+def teme_to_ecef(r, jd_ut1, fraction_ut1):
+    """
+    Rotates TEME position vectors from SGP4 into the earth fixed frame using the Greenwich mean sidereal time. Polar
+    motion is ignored, which moves positions by a few metres at most.
+
+    :param r: TEME positions in km, shaped (N, T, 3) or (T, 3)
+    :param jd_ut1: whole part of the UT1 julian dates, shaped (T,)
+    :param fraction_ut1: fractional part of the UT1 julian dates, shaped (T,)
+    :return: earth fixed positions in km, with the same shape as r
+    """
+    theta, _ = theta_GMST1982(jd_ut1, fraction_ut1)
+    cos_t = np.cos(theta)
+    sin_t = np.sin(theta)
+    x = r[..., 0]
+    y = r[..., 1]
+    ecef = np.empty_like(r)
+    ecef[..., 0] = cos_t * x + sin_t * y
+    ecef[..., 1] = cos_t * y - sin_t * x
+    ecef[..., 2] = r[..., 2]
+    return ecef
+
+
+def ecef_to_geodetic(ecef):
+    """
+    Converts earth fixed cartesian coordinates into WGS84 geodetic coordinates for arrays of any shape.
+
+    :param ecef: earth fixed positions in km, with xyz in the last axis
+    :return: lat, lon in degrees and alt in km
+    """
+    x = ecef[..., 0]
+    y = ecef[..., 1]
+    z = ecef[..., 2]
+    p = np.hypot(x, y)
+    lon = np.arctan2(y, x)
+    lat = np.arctan2(z, p * (1 - WGS84_E2))
+
+    # a few fixed point iterations are enough to converge to well under a metre for anything above the ground
+    for _ in range(3):
+        sin_lat = np.sin(lat)
+        n = WGS84_A_KM / np.sqrt(1 - WGS84_E2 * sin_lat * sin_lat)
+        lat = np.arctan2(z + n * WGS84_E2 * sin_lat, p)
+
+    sin_lat = np.sin(lat)
+    n = WGS84_A_KM / np.sqrt(1 - WGS84_E2 * sin_lat * sin_lat)
+    alt = p * np.cos(lat) + z * sin_lat - n * (1 - WGS84_E2 * sin_lat * sin_lat)
+    return np.degrees(lat), np.degrees(lon), alt
+
+
+def get_catalog_propagator():
+    """
+    Returns the propagator for the satellites currently loaded from the database, rebuilding it if the catalog has been
+    reloaded since it was last built. A rebuild reuses the SGP4 models of the satellites the sync didn't change.
+
+    :return: a CatalogPropagator object
+    """
+    global propagator
+    version = get_catalog_version()
+    if propagator is None or propagator.version != version:
+        propagator = CatalogPropagator(get_catalog(), version, propagator)
+    return propagator
@@ -0,0 +1,101 @@
+import threading
+import numpy as np
+from skyfield.api import load
+from skyfield.constants import DAY_S, ERAD
+from skyfield.framelib import itrs
+from Propagation.Catalog_propagator import get_catalog_propagator, sgp4_ecef
+from Models.Catalog import build_satrec
+import logging
+
+ts = load.timescale()
+ephemeris_path = "assets/de421.bsp"
+EARTH_RADIUS_KM = ERAD / 1000.0
+
+ephemeris = None
+ephemeris_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(filename="log.txt", format='%(asctime)s - %(levelname)s:%(message)s', level=logging.INFO)
+
+
+def get_ephemeris():
+    """
+    Loads the planetary ephemeris the first time it is needed in a process and keeps it open afterwards. Skyfield
+    memory-maps the BSP file, so sharing one loaded ephemeris avoids re-opening the file for every calculation. Each
+    background callback worker loads its own copy the first time it calls this.
+
+    :return: a skyfield SpiceKernel
+    """
+    global ephemeris
+    with ephemeris_lock:
+        if ephemeris is None:
+            logger.info(f"loading ephemeris from {ephemeris_path}")
+            ephemeris = load(ephemeris_path)
+    return ephemeris
+
+
+def sun_ecef(t):
+    """
+    Calculates the position of the sun relative to the centre of the earth, in the same earth fixed frame as the
+    catalog propagator's positions.
+
+    :param t: a skyfield Time object holding one or more times
+    :return: positions in km, shaped (3,) for a single time or (T, 3) for an array of times
+    """
+    eph = get_ephemeris()
+    return np.asarray((eph["sun"] - eph["earth"]).at(t).frame_xyz(itrs).km).T
+
+
+def is_sunlit_ecef(ecef, sun):
+    """
+    Tests whether satellites are in sunlight or in the earth's shadow, using the same line and sphere test as skyfield's
+    is_sunlit. Works on any number of positions at once.
+
+    :param ecef: earth fixed satellite positions in km, with xyz in the last axis
+    :param sun: earth fixed sun positions in km, which must broadcast against ecef
+    :return: a boolean array, True for satellites in sunlight. Satellites without a position are never sunlit.
+    """
+    to_sun = sun - ecef
+    direction = to_sun / np.linalg.norm(to_sun, axis=-1, keepdims=True)
+    to_earth = -ecef
+    # distance along the line towards the sun where it enters and leaves the earth. The satellite is in shadow when the
+    # far intersection is in front of it, i.e. the earth sits between it and the sun
+    minus_b = 2.0 * np.sum(direction * to_earth, axis=-1)
+    c = np.sum(to_earth * to_earth, axis=-1) - EARTH_RADIUS_KM * EARTH_RADIUS_KM
+    with np.errstate(invalid="ignore"):
+        far = (minus_b + np.sqrt(minus_b * minus_b - 4 * c)) / 2.0
+        return (np.nan_to_num(far) <= 0) & ~np.isnan(ecef).any(axis=-1)
+
+
+def sunlit_pairs(satnums, t):
+    """
+    Calculates the sun position and sunlit state for many (satellite, time) pairs at once. The sun is evaluated for all
+    the times in a single ephemeris call, each satellite is propagated once for all of its times, and the shadow test
+    runs over every pair together.
+
+    :param satnums: an array with the satnum of each pair
+    :param t: a skyfield Time object holding the time of each pair, the same length as satnums
+    :return: sunlit: a boolean array, True for each pair where the satellite is in sunlight
+    :return: sun: earth fixed sun positions in km for each pair, shaped (M, 3)
+    """
+    satnums = np.asarray(satnums)
+    if len(satnums) == 0:
+        return np.zeros(0, dtype=bool), np.empty((0, 3))
+
+    propagator = get_catalog_propagator()
+    jd = np.broadcast_to(t.whole, satnums.shape)
+    fraction_utc = np.broadcast_to(t.tai_fraction - t._leap_seconds() / DAY_S, satnums.shape)
+    fraction_ut1 = np.broadcast_to(t.ut1_fraction, satnums.shape)
+
+    ecef = np.full((len(satnums), 3), np.nan)
+    order = np.argsort(satnums, kind="stable")
+    unique, starts = np.unique(satnums[order], return_index=True)
+    for satnum, pairs in zip(unique.tolist(), np.split(order, starts[1:])):
+        row = propagator.index.get(satnum)
+        if row is None:
+            continue
+        satrec = build_satrec(propagator.elements[row])
+        ecef[pairs] = sgp4_ecef(satrec, jd[pairs], fraction_utc[pairs], fraction_ut1[pairs])
+
+    sun = sun_ecef(t).reshape(-1, 3)
+    return is_sunlit_ecef(ecef, sun), np.broadcast_to(sun, ecef.shape)
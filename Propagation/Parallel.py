@@ -0,0 +1,261 @@
+import os, atexit, threading
+import multiprocessing
+import numpy as np
+from sgp4.api import SatrecArray
+from skyfield.constants import DAY_S
+from Propagation.Catalog_propagator import sgp4_ecef, ecef_to_geodetic
+from Models.Catalog import build_satrecs
+import logging
+
+worker_count = None  # number of worker processes, None uses one per cpu
+min_parallel_satellites = 5000  # smaller catalogs are propagated in this process, since the workers would cost more
+
+pool = None
+pool_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(filename="log.txt", format='%(asctime)s - %(levelname)s:%(message)s', level=logging.INFO)
+
+
+class Shard:
+    """
+    The part of the catalog held by one worker process. The SGP4 models are built once when the shard is loaded and
+    kept for every later request. When the catalog changes, the models of satellites that didn't change are carried
+    over from the worker's previous shard.
+    """
+    def __init__(self, elements, offset, previous=None):
+        """
+        :param elements: an array of satrec parameters, one row per satellite
+        :param offset: the catalog row of the shard's first satellite
+        :param previous: the shard the worker held before, if any
+        """
+        self.elements = elements
+        self.offset = offset
+        self.satrecs = build_satrecs(elements, previous and (previous.elements, previous.satrecs))
+        self.satrec_array = SatrecArray(self.satrecs) if self.satrecs else None
+
+    def __len__(self):
+        return len(self.elements)
+
+    def local_rows(self, rows):
+        """
+        :param rows: catalog rows, or None for every row
+        :return: the positions within this shard of the rows that belong to it
+        """
+        if rows is None:
+            return np.arange(len(self))
+        rows = np.asarray(rows) - self.offset
+        return rows[(rows >= 0) & (rows < len(self))]
+
+
+def worker_main(connection):
+    """
+    The loop run by each worker process. It holds a shard of the catalog and runs functions against it until it is told
+    to stop. Functions are sent by reference, so they must be defined at the top level of a module.
+
+    :param connection: the worker's end of a multiprocessing pipe
+    """
+    shard = None
+    while True:
+        message = connection.recv()
+        command = message[0]
+        if command == "stop":
+            break
+        try:
+            if command == "load":
+                shard = Shard(message[1], message[2], shard)
+                result = len(shard)
+            else:
+                function, args = message[1], message[2]
+                result = function(shard, *args)
+            connection.send(("ok", result))
+        except Exception as e:
+            connection.send(("error", repr(e)))
+    connection.close()
+
+
+class PropagationPool:
+    """
+    A set of long running worker processes that each hold a shard of the catalog. Work is sent to every shard at once
+    and the results come back in shard order, so they can be joined back into catalog order.
+    """
+    def __init__(self, workers):
+        """
+        :param workers: the number of worker processes to start
+        """
+        logger.info(f"starting {workers} propagation workers")
+        context = multiprocessing.get_context("spawn")
+        self.connections = []
+        self.processes = []
+        for _ in range(workers):
+            parent, child = context.Pipe()
+            process = context.Process(target=worker_main, args=(child,), daemon=True)
+            process.start()
+            self.connections.append(parent)
+            self.processes.append(process)
+        self.version = None
+        self.propagator_id = None
+        self.pid = os.getpid()  # only the process that started the workers can talk to them
+        self.lock = threading.RLock()  # held while the workers are loaded or running, so replies can't interleave
+
+    def __len__(self):
+        return len(self.processes)
+
+    def load(self, propagator):
+        """
+        Sends each worker its shard of the catalog, unless they already hold the propagator's catalog
+
+        :param propagator: a CatalogPropagator
+        """
+        with self.lock:
+            if self.version == propagator.version and self.propagator_id == id(propagator):
+                return
+            logger.info(f"loading catalog version {propagator.version} into the propagation workers")
+            bounds = np.linspace(0, len(propagator), len(self) + 1).astype(int)
+            for connection, start, end in zip(self.connections, bounds[:-1], bounds[1:]):
+                connection.send(("load", propagator.elements[start:end], int(start)))
+            self.collect()
+            self.version = propagator.version
+            self.propagator_id = id(propagator)
+
+    def run(self, propagator, function, *args):
+        """
+        Runs a function against every shard of the propagator's catalog. The catalog is loaded first if the workers hold
+        a different one, and both happen under the pool's lock, so another thread can't swap the shards between the
+        load and the run.
+
+        :param propagator: the CatalogPropagator whose rows the function's arguments refer to
+        :param function: a top level function taking a Shard followed by args
+        :param args: arguments passed to the function in every worker
+        :return: a list of the results, in shard order
+        """
+        with self.lock:
+            self.load(propagator)
+            return self.map(function, *args)
+
+    def map(self, function, *args):
+        """
+        Runs a function against every shard. The caller must hold the pool's lock, which run takes for you
+
+        :param function: a top level function taking a Shard followed by args
+        :param args: arguments passed to the function in every worker
+        :return: a list of the results, in shard order
+        """
+        for connection in self.connections:
+            connection.send(("run", function, args))
+        return self.collect()
+
+    def collect(self):
+        """
+        :return: a result from every worker, raising an error if any of them failed
+        """
+        results = [connection.recv() for connection in self.connections]
+        errors = [result for status, result in results if status == "error"]
+        if errors:
+            raise RuntimeError(f"propagation worker failed: {errors[0]}")
+        return [result for _, result in results]
+
+    def close(self):
+        """
+        Stops every worker process, once any work already running has finished
+        """
+        with self.lock:
+            for connection, process in zip(self.connections, self.processes):
+                try:
+                    connection.send(("stop",))
+                    connection.close()
+                except (OSError, EOFError):
+                    pass
+                process.join(timeout=5)
+
+
+def get_workers():
+    """
+    :return: the configured number of worker processes
+    """
+    return worker_count or os.cpu_count() or 1
+
+
+def get_pool(propagator):
+    """
+    Returns the worker pool, or None when the work should stay in this process, either because there is only one worker
+    or because the catalog is too small to be worth splitting. The pool may hold another catalog by the time it is used,
+    so work is sent with PropagationPool.run, which loads the propagator's catalog first.
+
+    :param propagator: a CatalogPropagator
+    :return: a PropagationPool or None
+    """
+    global pool
+    workers = get_workers()
+    if workers <= 1 or len(propagator) < max(min_parallel_satellites, workers):
+        return None
+    with pool_lock:
+        if pool is not None and pool.pid != os.getpid():
+            # a forked process inherits the parent's pool, whose pipes still lead to the parent's workers
+            pool = None
+        if pool is None or len(pool) != workers:
+            if pool is not None:
+                pool.close()
+            pool = PropagationPool(workers)
+        return pool
+
+
+def set_worker_count(workers):
+    """
+    Changes the number of worker processes. The current pool is stopped and a new one is started when it is next needed.
+
+    :param workers: the number of worker processes, or None to use one per cpu
+    """
+    global worker_count
+    worker_count = workers
+    close_pool()
+
+
+def close_pool():
+    """
+    Stops the worker pool, if one is running. A pool inherited from a parent process is dropped without stopping it, so
+    the parent's workers keep running.
+    """
+    global pool
+    with pool_lock:
+        if pool is not None and pool.pid == os.getpid():
+            pool.close()
+        pool = None
+
+
+def shard_ecef(shard, jd, fraction_utc, fraction_ut1):
+    """
+    Worker function that propagates every satellite in a shard
+
+    :return: earth fixed positions in km, shaped (N, T, 3)
+    """
+    if shard.satrec_array is None:
+        return np.empty((0, len(jd), 3))
+    return sgp4_ecef(shard.satrec_array, jd, fraction_utc, fraction_ut1)
+
+
+def propagate_catalog(propagator, t):
+    """
+    Propagates the whole catalog, splitting it across the worker pool when the catalog is large enough and falling back
+    to CatalogPropagator.propagate otherwise. Returns the same values as CatalogPropagator.propagate.
+
+    :param propagator: a CatalogPropagator
+    :param t: a skyfield Time object holding one or more times
+    :return: lat, lon, alt, ecef
+    """
+    worker_pool = get_pool(propagator)
+    if worker_pool is None:
+        return propagator.propagate(t)
+
+    scalar = not getattr(t.whole, "shape", None)
+    jd = np.atleast_1d(t.whole)
+    fraction_utc = np.atleast_1d(t.tai_fraction - t._leap_seconds() / DAY_S)
+    fraction_ut1 = np.atleast_1d(t.ut1_fraction)
+    ecef = np.concatenate(worker_pool.run(propagator, shard_ecef, jd, fraction_utc, fraction_ut1))
+    lat, lon, alt = ecef_to_geodetic(ecef)
+    if scalar:
+        return lat[:, 0], lon[:, 0], alt[:, 0], ecef[:, 0]
+    return lat, lon, alt, ecef
+
+
+atexit.register(close_pool)
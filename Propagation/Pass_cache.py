@@ -0,0 +1,156 @@
+import threading
+import numpy as np
+import diskcache
+from skyfield.api import load, wgs84
+from Models.Database import add_save_listener
+import logging
+
+ts = load.timescale()
+cache_directory = "./pass_cache"
+observer_grid = 0.01  # degrees that observer coordinates are rounded to, so nearby locations share cached passes
+overlap_minutes = 30.0  # how far each extension reaches back into the already cached window
+
+pass_cache = None
+pass_cache_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(filename="log.txt", format='%(asctime)s - %(levelname)s:%(message)s', level=logging.INFO)
+
+
+def get_pass_cache():
+    """
+    Opens the on disk pass cache the first time it is needed. It is kept next to the background callback cache so that
+    predicted passes survive restarts.
+
+    :return: a diskcache Cache object
+    """
+    global pass_cache
+    with pass_cache_lock:
+        if pass_cache is None:
+            logger.info(f"opening pass cache in {cache_directory}")
+            pass_cache = diskcache.Cache(cache_directory)
+            pass_cache.create_tag_index()
+    return pass_cache
+
+
+def round_observer(lat, lon, grid=None):
+    """
+    :param lat: latitude in degrees
+    :param lon: longitude in degrees
+    :param grid: the grid size in degrees. Defaults to observer_grid
+    :return: the latitude and longitude rounded to the grid
+    """
+    grid = grid or observer_grid
+    return round(round(lat / grid) * grid, 6), round(round(lon / grid) * grid, 6)
+
+
+def get_events(sat, lat, lon, t0, t1, altitude_degrees=10.0):
+    """
+    A cached version of EarthSatellite.find_events. Results are stored per element set, rounded observer location and
+    altitude, along with the time window they cover. When a request reaches outside the cached window, only the missing
+    part is calculated and merged into the cached events.
+
+    :param sat: an EarthSatellite object
+    :param lat: the observer's latitude in degrees
+    :param lon: the observer's longitude in degrees
+    :param t0: a skyfield Time object for the start of the window
+    :param t1: a skyfield Time object for the end of the window
+    :param altitude_degrees: the altitude in degrees the satellite has to rise above
+    :return: times: a skyfield Time object holding the time of each event
+    :return: events: a numpy array of event codes (0 = rise, 1 = culminate, 2 = set)
+    """
+    cache = get_pass_cache()
+    lat, lon = round_observer(lat, lon)
+    observer = wgs84.latlon(lat, lon)
+    satnum = sat.model.satnum
+    epoch = sat.model.jdsatepoch + sat.model.jdsatepochF
+    check_epoch(cache, satnum, epoch)
+
+    key = ("passes", satnum, epoch, lat, lon, float(altitude_degrees))
+    start, end = t0.tt, t1.tt
+    entry = cache.get(key)
+    overlap = overlap_minutes / 1440.0
+
+    if entry is None or end < entry["start"] or start > entry["end"]:
+        logger.info(f"calculating passes for {satnum}")
+        times, events = sat.find_events(observer, t0, t1, altitude_degrees=altitude_degrees)
+        entry = {"start": start, "end": end, "times": times.tt, "events": events}
+    else:
+        overlap = min(overlap, entry["end"] - entry["start"])
+        if start < entry["start"]:
+            logger.info(f"extending cached passes for {satnum} backwards")
+            entry = merge_events(sat, observer, altitude_degrees, entry, start, entry["start"] + overlap,
+                                 entry["start"] + overlap / 2, before=True)
+        if end > entry["end"]:
+            logger.info(f"extending cached passes for {satnum} forwards")
+            entry = merge_events(sat, observer, altitude_degrees, entry, entry["end"] - overlap, end,
+                                 entry["end"] - overlap / 2, before=False)
+
+    cache.set(key, entry, tag=str(satnum))
+
+    inside = (entry["times"] >= start) & (entry["times"] <= end)
+    return ts.tt_jd(entry["times"][inside]), entry["events"][inside]
+
+
+def merge_events(sat, observer, altitude_degrees, entry, start, end, cut, before):
+    """
+    Calculates the events for a window that overlaps one end of a cached entry and joins them together. Events from
+    each side are only kept up to the middle of the overlap, away from the edges where find_events can miss a peak.
+
+    :param sat: an EarthSatellite object
+    :param observer: the observer's wgs84 position
+    :param altitude_degrees: the altitude in degrees the satellite has to rise above
+    :param entry: the cached entry
+    :param start: TT julian date of the start of the new window
+    :param end: TT julian date of the end of the new window
+    :param cut: TT julian date in the overlap where the new events take over from the cached ones
+    :param before: True if the new window is before the cached one
+    :return: the merged entry
+    """
+    times, events = sat.find_events(observer, ts.tt_jd(start), ts.tt_jd(end), altitude_degrees=altitude_degrees)
+    times = times.tt
+    if before:
+        keep_new, keep_old = times < cut, entry["times"] >= cut
+        parts = [(times[keep_new], events[keep_new]), (entry["times"][keep_old], entry["events"][keep_old])]
+    else:
+        keep_old, keep_new = entry["times"] < cut, times >= cut
+        parts = [(entry["times"][keep_old], entry["events"][keep_old]), (times[keep_new], events[keep_new])]
+
+    return {
+        "start": min(start, entry["start"]),
+        "end": max(end, entry["end"]),
+        "times": np.concatenate([p[0] for p in parts]),
+        "events": np.concatenate([p[1] for p in parts]).astype(np.int64),
+    }
+
+
+def check_epoch(cache, satnum, epoch):
+    """
+    Clears a satellite's cached passes if they were calculated from a different element set. This catches element sets
+    saved by other processes, which the save listener can't see.
+
+    :param cache: the pass cache
+    :param satnum: the satellite's satnum
+    :param epoch: the epoch of the satellite's current element set as a julian date
+    """
+    key = ("epoch", satnum)
+    if cache.get(key) != epoch:
+        cache.evict(str(satnum))
+        cache.set(key, epoch, tag=str(satnum))
+
+
+def invalidate(satnums):
+    """
+    Save listener that drops the cached passes of every satellite whose element set was just saved
+
+    :param satnums: a list of satnums
+    """
+    cache = get_pass_cache()
+    if len(cache) == 0:
+        return
+    for satnum in satnums:
+        cache.evict(str(satnum))
+    logger.info(f"cleared cached passes for {len(satnums)} satellites")
+
+
+add_save_listener(invalidate)
@@ -0,0 +1,235 @@
+import numpy as np
+from sgp4.api import SatrecArray
+from skyfield.api import load
+from skyfield.constants import DAY_S
+from Propagation.Catalog_propagator import get_catalog_propagator, sgp4_ecef
+from Models.Catalog import build_satrec
+from Propagation.Visibility import observer_ecef, enu_rotation_matrix
+from Propagation.Parallel import get_pool
+import logging
+
+ts = load.timescale()
+EVENT_NAMES = ("rise", "culminate", "set")
+RISE, CULMINATE, SET = 0, 1, 2
+step_minutes = 1.0  # spacing of the coarse elevation samples
+chunk_size = 500  # satellites sampled together, which bounds the size of the elevation arrays
+refine_iterations = 3
+refine_step_seconds = 1.0
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(filename="log.txt", format='%(asctime)s - %(levelname)s:%(message)s', level=logging.INFO)
+
+
+def find_passes(lat, lon, t0, t1, altitude_degrees=10.0, satnums=None):
+    """
+    Finds every time a satellite in the catalog rises above, culminates, and sets below a given altitude for an observer
+    between two times. The results match the events returned by EarthSatellite.find_events, merged across satellites.
+
+    The elevation of each satellite is sampled every step_minutes in vectorised chunks, and the exact event times are
+    only searched for between the samples where a satellite crosses the altitude or reaches a peak. Large catalogs are
+    searched by the shared worker pool in Propagation.Parallel, each worker covering its own shard.
+
+    Passes that start and end between two samples are missed, so step_minutes should stay well under the length of the
+    shortest pass of interest.
+
+    :param lat: the observer's latitude in degrees
+    :param lon: the observer's longitude in degrees
+    :param t0: a skyfield Time object for the start of the search
+    :param t1: a skyfield Time object for the end of the search
+    :param altitude_degrees: the altitude in degrees that a satellite has to rise above. default is 10
+    :param satnums: an optional list of satnums to search. The whole catalog is searched by default.
+    :return: times: a skyfield Time object holding the time of each event
+    :return: event_satnums: a numpy array with the satnum of the satellite for each event
+    :return: events: a numpy array of event codes (0 = rise, 1 = culminate, 2 = set), as used by find_events
+    """
+    propagator = get_catalog_propagator()
+    rows = np.arange(len(propagator)) if satnums is None else propagator.rows_for(satnums)
+    logger.info(f"searching for passes of {len(rows)} satellites")
+
+    # the offsets between TT and the UTC/UT1 scales used by SGP4 barely change over a few days, so they are worked out
+    # once here, letting the search run on plain julian dates
+    window = (t0.whole, t0.tt_fraction, (t1.whole - t0.whole) + (t1.tt_fraction - t0.tt_fraction),
+              t0.tt_fraction - (t0.tai_fraction - t0._leap_seconds() / DAY_S), t0.tt_fraction - t0.ut1_fraction)
+
+    pool = get_pool(propagator) if len(rows) else None
+    if pool is not None:
+        results = [r for shard in pool.run(propagator, shard_passes, rows, lat, lon, window, altitude_degrees)
+                   for r in shard]
+    else:
+        elements = propagator.elements[rows]
+        results = [find_chunk_passes(elements[i:i + chunk_size], lat, lon, window, altitude_degrees)
+                   for i in range(0, len(elements), chunk_size)]
+
+    return merge_passes(results, t0.whole)
+
+
+def shard_passes(shard, rows, lat, lon, window, altitude_degrees):
+    """
+    Worker function that searches the rows of one shard in chunks, reusing the SGP4 models the worker already holds
+
+    :param shard: the worker's Shard
+    :param rows: the catalog rows being searched
+    :return: a list of find_chunk_passes results
+    """
+    local = shard.local_rows(rows)
+    return [find_chunk_passes(shard.elements[chunk], lat, lon, window, altitude_degrees,
+                              [shard.satrecs[i] for i in chunk])
+            for chunk in (local[i:i + chunk_size] for i in range(0, len(local), chunk_size))]
+
+
+def merge_passes(results, jd):
+    """
+    Merges the events found in separate chunks into a single time sorted list
+
+    :param results: a list of (fractions, satnums, events) tuples returned by find_chunk_passes
+    :param jd: the whole julian date the fractions are relative to
+    :return: times, satnums, events: as returned by find_passes
+    """
+    fractions = np.concatenate([r[0] for r in results] or [np.empty(0)])
+    satnums = np.concatenate([r[1] for r in results] or [np.empty(0, dtype=np.int64)])
+    events = np.concatenate([r[2] for r in results] or [np.empty(0, dtype=np.int64)])
+    order = np.lexsort((events, satnums, fractions))
+    return ts.tt_jd(jd, fractions[order]), satnums[order], events[order]
+
+
+def find_chunk_passes(elements, lat, lon, window, altitude_degrees, satrecs=None):
+    """
+    Finds the events of one chunk of satellites. It only takes plain values so it can run inside worker processes,
+    rebuilding the SGP4 models from their elements unless they are passed in.
+
+    :param elements: an array of satrec parameters, one row per satellite
+    :param lat: the observer's latitude in degrees
+    :param lon: the observer's longitude in degrees
+    :param window: a tuple of (whole julian date, start TT fraction, length in days, TT-UTC in days, TT-UT1 in days)
+    :param altitude_degrees: the altitude in degrees that a satellite has to rise above
+    :param satrecs: an optional list of the Satrec for each row of elements
+    :return: fractions: TT day fractions of each event, relative to the whole julian date of the window
+    :return: satnums: the satnum of the satellite for each event
+    :return: events: the event codes
+    """
+    jd, start, length, utc_offset, ut1_offset = window
+    observer = Observer(lat, lon, jd, utc_offset, ut1_offset)
+    if satrecs is None:
+        satrecs = [build_satrec(e) for e in elements]
+    if not satrecs:
+        return np.empty(0), np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+
+    # the samples run one step past each end of the window, so peaks right at the start or end can still be found
+    step = step_minutes / 1440.0
+    samples = start + np.arange(-1, int(np.ceil(length / step)) + 2) * step
+    elevation = observer.elevation(SatrecArray(satrecs), samples)
+
+    above = elevation >= altitude_degrees
+    change = np.diff(above.astype(np.int8), axis=1)
+    # a culmination is a peak in the samples while above the altitude, the real peak is somewhere either side of it
+    peak = np.zeros_like(above)
+    peak[:, 1:-1] = (elevation[:, 1:-1] >= elevation[:, :-2]) & (elevation[:, 1:-1] > elevation[:, 2:]) & above[:, 1:-1]
+
+    # first estimates: crossings are linearly interpolated between the samples either side, and peaks are taken from a
+    # parabola through the samples around them
+    sat_rows, crossing_idx = np.nonzero(change)
+    f0 = elevation[sat_rows, crossing_idx] - altitude_degrees
+    f1 = elevation[sat_rows, crossing_idx + 1] - altitude_degrees
+    crossings = samples[crossing_idx] + step * f0 / (f0 - f1)
+    rising = change[sat_rows, crossing_idx] == 1
+
+    peak_rows, peak_idx = np.nonzero(peak)
+    e0, e1, e2 = elevation[peak_rows, peak_idx - 1], elevation[peak_rows, peak_idx], elevation[peak_rows, peak_idx + 1]
+    peaks = samples[peak_idx] + step * parabola_vertex(e0, e1, e2)
+
+    # then each estimate is polished against the real SGP4 elevations. Every event of a satellite is refined in the same
+    # call, so the number of SGP4 calls depends on the number of satellites with passes rather than on the number of
+    # passes
+    order_c = np.argsort(sat_rows, kind="stable")
+    order_p = np.argsort(peak_rows, kind="stable")
+    bounds_c = np.searchsorted(sat_rows[order_c], np.arange(len(satrecs) + 1))
+    bounds_p = np.searchsorted(peak_rows[order_p], np.arange(len(satrecs) + 1))
+    for row in np.unique(np.concatenate([sat_rows, peak_rows])):
+        c = order_c[bounds_c[row]:bounds_c[row + 1]]
+        p = order_p[bounds_p[row]:bounds_p[row + 1]]
+        crossings[c], peaks[p] = observer.refine(satrecs[row], crossings[c], samples[crossing_idx[c]], step,
+                                                 altitude_degrees, peaks[p], samples[peak_idx[p]])
+
+    satnums = elements[:, 0].astype(np.int64)
+    fractions = np.concatenate([crossings, peaks])
+    inside = (fractions >= start) & (fractions <= start + length)
+    return (fractions[inside],
+            np.concatenate([satnums[sat_rows], satnums[peak_rows]])[inside],
+            np.concatenate([np.where(rising, RISE, SET), np.full(len(peaks), CULMINATE)]).astype(np.int64)[inside])
+
+
+def parabola_vertex(e0, e1, e2, limit=1.0):
+    """
+    :param e0: values at -1
+    :param e1: values at 0
+    :param e2: values at +1
+    :param limit: the furthest the vertex is allowed to be from 0
+    :return: the offset of the vertex of the parabola through the three points
+    """
+    with np.errstate(divide="ignore", invalid="ignore"):
+        offset = 0.5 * (e0 - e2) / (e0 - 2 * e1 + e2)
+    return np.clip(np.nan_to_num(offset), -limit, limit)
+
+
+class Observer:
+    """
+    Calculates satellite elevations for a fixed observer directly from julian date fractions, which avoids building
+    skyfield Time objects inside the search loops.
+    """
+    def __init__(self, lat, lon, jd, utc_offset, ut1_offset):
+        """
+        :param lat: the observer's latitude in degrees
+        :param lon: the observer's longitude in degrees
+        :param jd: the whole julian date that all fractions are relative to
+        :param utc_offset: TT-UTC in days
+        :param ut1_offset: TT-UT1 in days
+        """
+        self.position = observer_ecef(lat, lon)
+        self.up = enu_rotation_matrix(lat, lon)[2]
+        self.jd = jd
+        self.utc_offset = utc_offset
+        self.ut1_offset = ut1_offset
+
+    def elevation(self, satrecs, fractions):
+        """
+        :param satrecs: a SatrecArray or a single Satrec
+        :param fractions: TT day fractions relative to self.jd
+        :return: elevations in degrees, shaped (N, T) for a SatrecArray or (T,) for a Satrec
+        """
+        jd = np.full(len(fractions), self.jd)
+        ecef = sgp4_ecef(satrecs, jd, fractions - self.utc_offset, fractions - self.ut1_offset)
+        line_of_sight = ecef - self.position
+        distance = np.sqrt(np.sum(line_of_sight * line_of_sight, axis=-1))
+        with np.errstate(invalid="ignore"):
+            return np.degrees(np.arcsin((line_of_sight @ self.up) / distance))
+
+    def refine(self, satrec, crossings, crossing_start, step, altitude_degrees, peaks, peak_sample):
+        """
+        Polishes the estimated crossing and peak times of a single satellite. Crossings take secant steps using the
+        elevation a moment after each estimate, and peaks are moved to the vertex of a parabola through the elevations
+        a moment either side. Each round needs one SGP4 call.
+
+        :param satrec: an sgp4 Satrec
+        :param crossings: estimated TT fractions where the satellite crosses the altitude
+        :param crossing_start: the sample before each crossing, which the crossing is kept after
+        :param step: the spacing between samples in days
+        :param altitude_degrees: the altitude being crossed
+        :param peaks: estimated TT fractions of the satellite's peaks
+        :param peak_sample: the sample nearest each peak, which the peak is kept within a step of
+        :return: the refined crossings and peaks
+        """
+        h = refine_step_seconds / DAY_S
+        n = len(crossings)
+        for _ in range(refine_iterations):
+            elevation = self.elevation(satrec, np.concatenate([crossings, crossings + h, peaks - h, peaks, peaks + h]))
+            f0 = elevation[:n] - altitude_degrees
+            f1 = elevation[n:2 * n] - altitude_degrees
+            with np.errstate(divide="ignore", invalid="ignore"):
+                crossings = np.nan_to_num(crossings - f0 * h / (f1 - f0), nan=crossings)
+            crossings = np.clip(crossings, crossing_start, crossing_start + step)
+
+            # the sine of the elevation is used for the peaks, since the elevation itself has a sharp point at the top
+            # of passes that go close to overhead, which a parabola can't fit
+            e0, e1, e2 = np.sin(np.radians(elevation[2 * n:])).reshape(3, -1)
+            peaks = np.clip(peaks + h * parabola_vertex(e0, e1, e2, step / h), peak_sample - step, peak_sample + step)
+        return crossings, peaks
@@ -0,0 +1,114 @@
+import threading
+import numpy as np
+from skyfield.api import load
+from skyfield.constants import DAY_S
+from Propagation.Catalog_propagator import get_catalog_propagator
+from Propagation.Spatial_index import SubpointIndex
+from Propagation.Parallel import propagate_catalog
+import logging
+
+ts = load.timescale()
+J2000 = 2451545.0
+snapshot_tolerance = 1.0  # seconds that a snapshot can be reused for before the catalog is propagated again
+
+snapshot = None
+snapshot_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(filename="log.txt", format='%(asctime)s - %(levelname)s:%(message)s', level=logging.INFO)
+
+
+class PositionSnapshot:
+    """
+    The position of every satellite in the catalog at a single point in time. The table, globe, map and visibility
+    filter all read from the same snapshot, so the catalog only needs to be propagated once per time bucket no matter
+    how many of them are refreshed.
+
+    Arrays are indexed by the row numbers of the propagator the snapshot was built from.
+    """
+    def __init__(self, propagator, bucket, tolerance, t):
+        """
+        :param propagator: the CatalogPropagator used to calculate the positions
+        :param bucket: the time bucket this snapshot belongs to
+        :param tolerance: the length of the time bucket in seconds
+        :param t: a skyfield Time object for the start of the bucket
+        """
+        self.propagator = propagator
+        self.version = propagator.version
+        self.bucket = bucket
+        self.tolerance = tolerance
+        self.t = t
+        self.lat, self.lon, self.alt, self.ecef = propagate_catalog(propagator, t)
+        self._spatial_index = None
+
+    @property
+    def key(self):
+        return self.version, self.bucket, self.tolerance
+
+    @property
+    def spatial_index(self):
+        """
+        A SubpointIndex over this snapshot's sub-satellite points. It is only built the first time a query needs it.
+        """
+        if self._spatial_index is None:
+            self._spatial_index = SubpointIndex(self.lat, self.lon, self.alt)
+        return self._spatial_index
+
+    def rows_for(self, satnums):
+        """
+        :param satnums: an iterable of satellite satnums
+        :return: a numpy array with the snapshot row of each satnum found in the catalog
+        """
+        return self.propagator.rows_for(satnums)
+
+
+def get_time_bucket(t, tolerance):
+    """
+    Works out which time bucket a time falls into.
+
+    :param t: a skyfield Time object
+    :param tolerance: the length of a bucket in seconds
+    :return: an int identifying the bucket
+    """
+    seconds = ((t.whole - J2000) + t.tt_fraction) * DAY_S
+    return int(np.floor(seconds / tolerance))
+
+
+def get_position_snapshot(t=None, tolerance=None):
+    """
+    Returns the snapshot of satellite positions for the current catalog version and time bucket, propagating the
+    catalog if no matching snapshot exists. Building a new snapshot drops the previous one.
+
+    :param t: a skyfield Time object. Defaults to the current time
+    :param tolerance: the length of a time bucket in seconds. Defaults to snapshot_tolerance
+    :return: a PositionSnapshot object
+    """
+    global snapshot
+    if t is None:
+        t = ts.now()
+    if tolerance is None:
+        tolerance = snapshot_tolerance
+
+    propagator = get_catalog_propagator()
+    bucket = get_time_bucket(t, tolerance)
+
+    with snapshot_lock:
+        if snapshot is None or snapshot.key != (propagator.version, bucket, tolerance) or snapshot.propagator is not propagator:
+            logger.info(f"building position snapshot for catalog version {propagator.version}")
+            bucket_start = ts.tt_jd(J2000, bucket * tolerance / DAY_S)
+            snapshot = PositionSnapshot(propagator, bucket, tolerance, bucket_start)
+        return snapshot
+
+
+def set_snapshot_tolerance(seconds):
+    """
+    Changes how long snapshots are reused for, and drops the current snapshot
+
+    :param seconds: the new tolerance in seconds. Must be greater than 0
+    """
+    global snapshot_tolerance, snapshot
+    if seconds <= 0:
+        raise ValueError("snapshot tolerance must be greater than 0")
+    with snapshot_lock:
+        snapshot_tolerance = seconds
+        snapshot = None
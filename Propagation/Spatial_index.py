@@ -0,0 +1,178 @@
+import numpy as np
+import logging
+
+EARTH_POLAR_RADIUS_KM = 6356.752
+ALTITUDE_BANDS_KM = (2000.0, 10000.0, 30000.0)
+cell_size = 5.0  # degrees
+# extra angle added to every cap to cover the difference between the spherical cap and the WGS84 ellipsoid
+CAP_MARGIN = 1.0
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(filename="log.txt", format='%(asctime)s - %(levelname)s:%(message)s', level=logging.INFO)
+
+
+class SubpointIndex:
+    """
+    A latitude/longitude grid over the sub-satellite points of a position snapshot, used to cheaply narrow down which
+    satellites could possibly be within a region or above an observer's horizon before running exact calculations.
+
+    Satellites are split into altitude bands so that the wide horizon caps of high orbits don't force every low orbit
+    satellite to be checked too. Within each band the rows are sorted by grid cell, with an offsets array marking where
+    each cell starts, so the rows of any set of cells can be read without scanning the whole catalog.
+    """
+    def __init__(self, lat, lon, alt, cell=None):
+        """
+        :param lat: sub-satellite latitudes in degrees
+        :param lon: sub-satellite longitudes in degrees
+        :param alt: satellite altitudes in km
+        :param cell: the size of a grid cell in degrees. Defaults to cell_size
+        """
+        self.cell = cell or cell_size
+        self.n_lat = int(np.ceil(180.0 / self.cell))
+        self.n_lon = int(np.ceil(360.0 / self.cell))
+
+        valid = ~(np.isnan(lat) | np.isnan(lon) | np.isnan(alt))
+        self.cell_of_row = np.full(len(lat), -1, dtype=np.int64)
+        self.cell_of_row[valid] = self.cell_id(lat[valid], lon[valid])
+        self.band_of_row = np.full(len(lat), -1, dtype=np.int64)
+        self.band_of_row[valid] = np.searchsorted(ALTITUDE_BANDS_KM, alt[valid])
+
+        centre_lat = -90.0 + (np.arange(self.n_lat) + 0.5) * self.cell
+        centre_lon = -180.0 + (np.arange(self.n_lon) + 0.5) * self.cell
+        lon_grid, lat_grid = np.meshgrid(centre_lon, centre_lat)
+        self.cell_centres = unit_vectors(lat_grid.ravel(), lon_grid.ravel())
+        # the furthest any point in a cell can be from the cell's centre is half the diagonal of an equatorial cell
+        self.cell_radius = np.degrees(np.arccos(np.cos(np.radians(self.cell / 2)) ** 2))
+
+        self.bands = []
+        for band in range(len(ALTITUDE_BANDS_KM) + 1):
+            rows = np.flatnonzero(self.band_of_row == band)
+            if len(rows) == 0:
+                continue
+            cells = self.cell_of_row[rows]
+            order = np.argsort(cells, kind="stable")
+            rows = rows[order]
+            offsets = np.searchsorted(cells[order], np.arange(self.n_lat * self.n_lon + 1))
+            self.bands.append((band, rows, offsets, float(np.max(alt[rows]))))
+
+        logger.info(f"built sub-satellite index over {int(valid.sum())} satellites in {len(self.bands)} altitude bands")
+
+    def cell_id(self, lat, lon):
+        """
+        :param lat: latitudes in degrees
+        :param lon: longitudes in degrees
+        :return: the grid cell of each point
+        """
+        lat_idx = np.clip(((np.asarray(lat) + 90.0) // self.cell).astype(np.int64), 0, self.n_lat - 1)
+        lon_idx = ((np.asarray(lon) + 180.0) // self.cell).astype(np.int64) % self.n_lon
+        return lat_idx * self.n_lon + lon_idx
+
+    def cells_in_cap(self, lat, lon, radius):
+        """
+        :param lat: latitude of the cap's centre in degrees
+        :param lon: longitude of the cap's centre in degrees
+        :param radius: angular radius of the cap in degrees
+        :return: a boolean array flagging each grid cell that overlaps the cap
+        """
+        centre = unit_vectors(np.array([lat]), np.array([lon]))[0]
+        limit = np.cos(np.radians(min(radius + self.cell_radius, 180.0)))
+        return self.cell_centres @ centre >= limit
+
+    def rows_in_cap(self, lat, lon, radius, band=None):
+        """
+        Region query returning the satellites whose sub-satellite point could be within a spherical cap. The result is
+        a superset of the satellites inside the cap, since whole grid cells are returned.
+
+        :param lat: latitude of the cap's centre in degrees
+        :param lon: longitude of the cap's centre in degrees
+        :param radius: angular radius of the cap in degrees
+        :param band: optionally limit the query to a single altitude band
+        :return: a numpy array of snapshot rows
+        """
+        selected = np.flatnonzero(self.cells_in_cap(lat, lon, radius))
+        found = [gather_cells(rows, offsets, selected) for b, rows, offsets, _ in self.bands if band in (None, b)]
+        return np.concatenate(found) if found else np.empty(0, dtype=np.intp)
+
+    def visibility_candidates(self, lat, lon, min_elevation=0.0):
+        """
+        Returns the satellites that could be above the minimum elevation for an observer. Each altitude band is
+        queried with the horizon cap of the highest satellite in that band, so exact elevation calculations only need
+        to be run on the returned rows.
+
+        :param lat: the observer's latitude in degrees
+        :param lon: the observer's longitude in degrees
+        :param min_elevation: the minimum elevation in degrees
+        :return: a numpy array of snapshot rows
+        """
+        candidates = []
+        for band, _, _, max_alt in self.bands:
+            radius = horizon_cap_radius(max_alt, min_elevation) + CAP_MARGIN
+            candidates.append(self.rows_in_cap(lat, lon, radius, band))
+        if not candidates:
+            return np.empty(0, dtype=np.intp)
+        return np.concatenate(candidates)
+
+    def filter_candidates(self, rows, lat, lon, min_elevation=0.0):
+        """
+        Narrows a given set of rows down to those that could be above the minimum elevation for an observer, using only
+        the grid cell each row falls in.
+
+        :param rows: an array of snapshot rows
+        :param lat: the observer's latitude in degrees
+        :param lon: the observer's longitude in degrees
+        :param min_elevation: the minimum elevation in degrees
+        :return: a numpy array containing the rows that are candidates
+        """
+        rows = np.asarray(rows, dtype=np.intp)
+        keep = np.zeros(len(rows), dtype=bool)
+        for band, _, _, max_alt in self.bands:
+            in_band = self.band_of_row[rows] == band
+            if not in_band.any():
+                continue
+            cells = self.cells_in_cap(lat, lon, horizon_cap_radius(max_alt, min_elevation) + CAP_MARGIN)
+            keep |= in_band & cells[self.cell_of_row[rows]]
+        return rows[keep]
+
+
+def horizon_cap_radius(alt, min_elevation=0.0):
+    """
+    Calculates the angular radius of the region on the ground from which a satellite at a given altitude appears above
+    the minimum elevation. The earth's polar radius is used so that the cap is never too small.
+
+    :param alt: the satellite's altitude in km
+    :param min_elevation: the minimum elevation in degrees
+    :return: the cap radius in degrees
+    """
+    elevation = np.radians(min_elevation)
+    ratio = EARTH_POLAR_RADIUS_KM * np.cos(elevation) / (EARTH_POLAR_RADIUS_KM + max(alt, 0.0))
+    return float(np.degrees(np.arccos(ratio) - elevation))
+
+
+def unit_vectors(lat, lon):
+    """
+    :param lat: latitudes in degrees
+    :param lon: longitudes in degrees
+    :return: an (N, 3) array of unit vectors on a sphere
+    """
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    return np.stack([np.cos(lat) * np.cos(lon), np.cos(lat) * np.sin(lon), np.sin(lat)], axis=-1)
+
+
+def gather_cells(rows, offsets, cells):
+    """
+    Reads the rows belonging to a set of grid cells out of a band's cell-sorted rows without a python loop
+
+    :param rows: the band's rows, sorted by grid cell
+    :param offsets: where each cell's rows start in rows
+    :param cells: the cells to read
+    :return: a numpy array of rows
+    """
+    starts = offsets[cells]
+    counts = offsets[cells + 1] - starts
+    total = int(counts.sum())
+    if total == 0:
+        return np.empty(0, dtype=np.intp)
+    # turn each (start, count) pair into a run of consecutive positions in rows
+    run_starts = np.repeat(starts - np.cumsum(counts) + counts, counts)
+    return rows[run_starts + np.arange(total)]
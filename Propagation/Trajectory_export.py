@@ -0,0 +1,195 @@
+import os, time, zipfile
+import numpy as np
+from numpy.lib.format import write_array_header_2_0, dtype_to_descr
+from sgp4.api import SatrecArray
+from skyfield.api import load
+from skyfield.constants import DAY_S
+from Models import Database
+from Propagation.Catalog_propagator import get_catalog_propagator, sgp4_ecef
+from Propagation.Trajectory_store import time_grid
+import logging
+
+# pyarrow is optional. Without it trajectories can only be exported as NPZ
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+ts = load.timescale()
+time_block = 60  # time steps propagated and written together, each block is one parquet row group or arrow batch
+FORMAT_EXTENSIONS = {".parquet": "parquet", ".arrow": "arrow", ".feather": "arrow", ".npz": "npz"}
+UNIX_EPOCH_JD = 2440587.5
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(filename="log.txt", format='%(asctime)s - %(levelname)s:%(message)s', level=logging.INFO)
+
+
+def default_format():
+    """
+    :return: parquet when pyarrow is installed, npz otherwise
+    """
+    return "parquet" if pa is not None else "npz"
+
+
+def export_trajectories(path, satnums=None, t0=None, hours=24.0, step_seconds=60.0, set_progress=None):
+    """
+    Propagates satellites over a time window and streams their earth fixed positions into a columnar file. The format
+    is taken from the file extension:
+
+    - .parquet: a table with one row per satellite per time step, with time (UTC), satnum, x, y and z columns
+    - .arrow or .feather: the same table as an Arrow IPC file
+    - .npz: a positions array shaped (time step, satellite, xyz), with satnums and times arrays
+
+    Parquet and Arrow need pyarrow. Without it the file is written as NPZ instead, with its extension changed to match.
+    The catalog is synced from the database first, so this also works from a background callback process, which never
+    loads it otherwise. The whole catalog is propagated a block of time_block steps at a time and each block is written
+    before the next is propagated, so memory stays bounded by one block however long the window is. Positions are
+    float32 km.
+
+    :param path: the path of the file to write
+    :param satnums: an optional list of satnums to export. The whole catalog is exported by default.
+    :param t0: a skyfield Time object for the start of the window. defaults to now
+    :param hours: the length of the window in hours
+    :param step_seconds: the number of seconds between time steps
+    :param set_progress: an optional function that takes a (done, total) tuple of time steps
+    :return: a dictionary with the path written, the format, the number of satellites, time steps and rows, the seconds
+    taken, and the rows and megabytes written per second
+    """
+    data_format = FORMAT_EXTENSIONS.get(os.path.splitext(path)[1].lower(), default_format())
+    if data_format != "npz" and pa is None:
+        logger.warning(f"pyarrow isn't installed, writing {data_format} export as npz")
+        data_format = "npz"
+        path = os.path.splitext(path)[0] + ".npz"
+
+    # only fetches the rows changed since the last sync when this process has already loaded the catalog
+    Database.sync_catalog()
+    propagator = get_catalog_propagator()
+    rows = np.arange(len(propagator)) if satnums is None else propagator.rows_for(satnums)
+    satnum_array = propagator.satnums[rows].astype(np.int32)
+    if satnums is None:
+        satrecs = propagator.satrecs
+    else:
+        satrecs = SatrecArray([propagator.satrec_list[row] for row in rows]) if len(rows) else None
+
+    t0 = ts.now() if t0 is None else t0
+    n_steps = max(1, int(round(hours * 3600 / step_seconds)))
+    grid = time_grid(t0.whole, t0.tt_fraction, n_steps, step_seconds / DAY_S)
+    logger.info(f"exporting {len(rows)} trajectories over {n_steps} steps to {path} as {data_format}")
+
+    start = time.perf_counter()
+    temp_path = f"{path}.tmp"
+    writer = WRITERS[data_format]
+    try:
+        writer(temp_path, position_blocks(satrecs, len(rows), grid, set_progress), satnum_array, n_steps)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    os.replace(temp_path, path)
+
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    count = len(rows) * n_steps
+    stats = {"path": path, "format": data_format, "satellites": len(rows), "steps": n_steps, "rows": count,
+             "seconds": elapsed, "rows_per_second": count / elapsed,
+             "mb_per_second": os.path.getsize(path) / 1e6 / elapsed}
+    logger.info(f"exported {count} positions in {elapsed:.2f}s, {stats['rows_per_second']:,.0f} rows/s")
+    return stats
+
+
+def position_blocks(satrecs, n_satellites, grid, set_progress=None):
+    """
+    Propagates the satellites a block of time steps at a time
+
+    :param satrecs: a SatrecArray, or None when there are no satellites
+    :param n_satellites: the number of satellites in satrecs
+    :param grid: the time grid returned by Trajectory_store.time_grid
+    :param set_progress: an optional function that takes a (done, total) tuple
+    :return: a generator of (times, positions), where times is a datetime64[ms] array of UTC times shaped (T,) and
+    positions is a float32 array shaped (T, N, 3)
+    """
+    whole, fraction_utc, fraction_ut1 = grid
+    for first in range(0, len(whole), time_block):
+        block = slice(first, first + time_block)
+        utc = (whole[block] - UNIX_EPOCH_JD + fraction_utc[block]) * 86400e3
+        times = np.round(utc).astype(np.int64).astype("datetime64[ms]")
+        if satrecs is None:
+            positions = np.empty((len(times), 0, 3), dtype=np.float32)
+        else:
+            ecef = sgp4_ecef(satrecs, whole[block], fraction_utc[block], fraction_ut1[block])
+            positions = ecef.transpose(1, 0, 2).astype(np.float32)
+        yield times, positions
+        if set_progress:
+            set_progress((min(first + time_block, len(whole)), len(whole)))
+
+
+def arrow_table(times, positions, satnums):
+    """
+    :return: a pyarrow Table with a row for each satellite at each time, ordered by time then satellite
+    """
+    n_steps, n_satellites, _ = positions.shape
+    flat = positions.reshape(-1, 3)
+    return pa.table({
+        "time": pa.array(np.repeat(times, n_satellites), type=pa.timestamp("ms", tz="UTC")),
+        "satnum": pa.array(np.tile(satnums, n_steps)),
+        "x": pa.array(flat[:, 0]),
+        "y": pa.array(flat[:, 1]),
+        "z": pa.array(flat[:, 2]),
+    })
+
+
+def write_parquet(path, blocks, satnums, n_steps):
+    """
+    Writes each block as a row group of a parquet file
+    """
+    writer = None
+    try:
+        for times, positions in blocks:
+            table = arrow_table(times, positions, satnums)
+            if writer is None:
+                writer = pq.ParquetWriter(path, table.schema, compression="zstd")
+            writer.write_table(table, row_group_size=table.num_rows)
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+def write_arrow(path, blocks, satnums, n_steps):
+    """
+    Writes each block as a record batch of an Arrow IPC file
+    """
+    writer = None
+    with pa.OSFile(path, "wb") as sink:
+        try:
+            for times, positions in blocks:
+                table = arrow_table(times, positions, satnums)
+                if writer is None:
+                    writer = pa.ipc.new_file(sink, table.schema)
+                writer.write_table(table)
+        finally:
+            if writer is not None:
+                writer.close()
+
+
+def write_npz(path, blocks, satnums, n_steps):
+    """
+    Writes an NPZ file without holding the whole positions array. The npy header of the positions member is written
+    first with the final shape, then each block is appended to it as it is propagated, which works because the blocks
+    are consecutive time steps of a C ordered array.
+    """
+    times = np.empty(n_steps, dtype="datetime64[ms]")
+    with zipfile.ZipFile(path, "w", compression=zipfile.ZIP_STORED, allowZip64=True) as archive:
+        with archive.open("positions.npy", "w", force_zip64=True) as member:
+            write_array_header_2_0(member, {"descr": dtype_to_descr(np.dtype(np.float32)), "fortran_order": False,
+                                            "shape": (n_steps, len(satnums), 3)})
+            done = 0
+            for block_times, positions in blocks:
+                member.write(np.ascontiguousarray(positions).tobytes())
+                times[done:done + len(block_times)] = block_times
+                done += len(block_times)
+        for name, array in (("satnums", satnums), ("times", times)):
+            with archive.open(f"{name}.npy", "w") as member:
+                np.lib.format.write_array(member, np.asarray(array), allow_pickle=False)
+
+
+WRITERS = {"parquet": write_parquet, "arrow": write_arrow, "npz": write_npz}
@@ -0,0 +1,277 @@
+import os, json, threading
+import numpy as np
+from numpy.lib.format import open_memmap
+from sgp4.api import Satrec, SatrecArray
+from skyfield.api import load
+from skyfield.constants import DAY_S
+from Models import Database
+from Propagation.Catalog_propagator import sgp4_ecef, ecef_to_geodetic
+import logging
+
+ts = load.timescale()
+horizon_hours = 24.0
+step_seconds = 30.0
+time_block = 60  # time steps propagated together while building, which bounds the memory used
+spare_fraction = 0.25  # extra rows left free so new satellites can be added without rebuilding the whole store
+
+store = None
+store_lock = threading.Lock()
+build_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(filename="log.txt", format='%(asctime)s - %(levelname)s:%(message)s', level=logging.INFO)
+
+
+def store_paths():
+    """
+    :return: the paths of the position array and its index, kept next to the database file
+    """
+    base = f"{Database.db_filename}_trajectories"
+    return f"{base}.npy", f"{base}.json"
+
+
+class TrajectoryStore:
+    """
+    Read access to a precomputed, memory-mapped array of earth fixed positions for the whole catalog, shaped
+    (time step, satellite, xyz) in float32 km. Slices returned by this class are views into the mapped file, so reading
+    them never copies the array, and any number of processes can map the same file at once.
+
+    Positions for a single time are contiguous, which suits scrubbing through time. A single satellite's track is a
+    strided view.
+    """
+    def __init__(self):
+        data_path, index_path = store_paths()
+        with open(index_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        self.modified = os.path.getmtime(index_path)
+        self.jd = meta["jd"]
+        self.start = meta["start"]
+        self.step = meta["step_seconds"] / DAY_S
+        self.n_steps = meta["n_steps"]
+        self.satnums = meta["satnums"]
+        self.index = {satnum: row for row, satnum in enumerate(self.satnums)}
+        self.positions = np.load(data_path, mmap_mode="r")
+
+    @property
+    def times(self):
+        """
+        :return: a skyfield Time object holding the time of every step
+        """
+        return ts.tt_jd(self.jd, self.start + np.arange(self.n_steps) * self.step)
+
+    def step_for(self, t):
+        """
+        :param t: a skyfield Time object
+        :return: the nearest time step, or None if t is outside the store
+        """
+        step = int(np.rint(((t.whole - self.jd) + (t.tt_fraction - self.start)) / self.step))
+        return step if 0 <= step < self.n_steps else None
+
+    def positions_at(self, t):
+        """
+        :param t: a skyfield Time object
+        :return: a view of every satellite's position at the nearest time step, shaped (N, 3), or None if t is outside
+        the store
+        """
+        step = self.step_for(t)
+        return None if step is None else self.positions[step, :len(self.satnums)]
+
+    def geodetic_at(self, t):
+        """
+        :param t: a skyfield Time object
+        :return: lat, lon and alt arrays for every satellite at the nearest time step, or None if t is outside the store
+        """
+        positions = self.positions_at(t)
+        return None if positions is None else ecef_to_geodetic(positions.astype(np.float64))
+
+    def track(self, satnum, t0=None, t1=None):
+        """
+        :param satnum: the satellite's satnum
+        :param t0: an optional skyfield Time object for the start of the track
+        :param t1: an optional skyfield Time object for the end of the track
+        :return: a view of the satellite's positions between the nearest time steps to the two times, both included,
+        shaped (T, 3), or None if it isn't stored or either time is outside the store
+        """
+        row = self.index.get(satnum)
+        first = 0 if t0 is None else self.step_for(t0)
+        last = self.n_steps - 1 if t1 is None else self.step_for(t1)
+        if row is None or first is None or last is None:
+            return None
+        if last < first:
+            raise ValueError("the end of the track is before its start")
+        return self.positions[first:last + 1, row]
+
+
+def get_trajectory_store():
+    """
+    Opens the trajectory store in this process, reopening it if it has been rebuilt or updated since it was opened.
+
+    :return: a TrajectoryStore, or None if no store has been built
+    """
+    global store
+    data_path, index_path = store_paths()
+    if not os.path.exists(index_path):
+        return None
+    with store_lock:
+        if store is None or os.path.getmtime(index_path) != store.modified:
+            store = TrajectoryStore()
+    return store
+
+
+def load_satrecs(id_list=None):
+    """
+    Builds SGP4 models straight from the TLE lines in the database, so the store can be built or updated from any
+    process without the in memory catalog.
+
+    :param id_list: an optional list of satnums to load
+    :return: satnums: a list of satnums
+    :return: satrecs: a list of sgp4 Satrec objects
+    """
+    satrecs = [Satrec.twoline2rv(line1, line2) for _, line1, line2 in Database.get_satellite_data(id_list)]
+    return [satrec.satnum for satrec in satrecs], satrecs
+
+
+def time_grid(jd, start, n_steps, step):
+    """
+    :return: the whole julian date, UTC fractions and UT1 fractions of every time step, as SGP4 needs them
+    """
+    t = ts.tt_jd(jd, start + np.arange(n_steps) * step)
+    return np.broadcast_to(t.whole, (n_steps,)), t.tai_fraction - t._leap_seconds() / DAY_S, t.ut1_fraction
+
+
+def write_positions(positions, rows, satrecs, grid, set_progress=None):
+    """
+    Propagates satellites over the whole time grid, a block of time steps at a time, and writes them into the store
+
+    :param positions: the memory mapped position array
+    :param rows: the store rows to write, one per satrec
+    :param satrecs: a list of sgp4 Satrec objects
+    :param grid: the time grid returned by time_grid
+    :param set_progress: an optional function that takes a (done, total) tuple
+    """
+    whole, fraction_utc, fraction_ut1 = grid
+    satrec_array = SatrecArray(satrecs)
+    rows = np.asarray(rows)
+    contiguous = len(rows) > 0 and np.array_equal(rows, np.arange(rows[0], rows[0] + len(rows)))
+    for first in range(0, len(whole), time_block):
+        block = slice(first, first + time_block)
+        ecef = sgp4_ecef(satrec_array, whole[block], fraction_utc[block], fraction_ut1[block])
+        ecef = ecef.transpose(1, 0, 2).astype(np.float32)
+        if contiguous:
+            positions[block, rows[0]:rows[0] + len(rows)] = ecef
+        else:
+            positions[block, rows] = ecef
+        if set_progress:
+            set_progress((min(first + time_block, len(whole)), len(whole)))
+
+
+def write_index(meta):
+    """
+    Writes the store's index. The index is replaced in one step so readers never see half of it.
+
+    :param meta: a dict describing the store
+    """
+    _, index_path = store_paths()
+    temp_path = f"{index_path}.tmp"
+    with open(temp_path, "w", encoding="utf-8") as f:
+        json.dump(meta, f)
+    os.replace(temp_path, index_path)
+
+
+def build_trajectory_store(hours=None, step=None, set_progress=None):
+    """
+    Propagates every satellite in the database over the coming hours and writes the positions to a new store, which
+    replaces any existing one.
+
+    :param hours: how many hours the store covers. Defaults to horizon_hours
+    :param step: the number of seconds between time steps. Defaults to step_seconds
+    :param set_progress: an optional function that takes a (done, total) tuple
+    :return: the number of satellites stored
+    """
+    hours = hours or horizon_hours
+    step = step or step_seconds
+    with build_lock:
+        satnums, satrecs = load_satrecs()
+        logger.info(f"building trajectory store for {len(satnums)} satellites over {hours} hours")
+        now = ts.now()
+        n_steps = int(hours * 3600 / step) + 1
+        capacity = max(int(len(satnums) * (1 + spare_fraction)), len(satnums) + 1)
+
+        data_path, _ = store_paths()
+        temp_path = f"{data_path}.tmp.npy"
+        positions = open_memmap(temp_path, mode="w+", dtype=np.float32, shape=(n_steps, capacity, 3))
+        positions[:, len(satnums):] = np.nan
+        grid = time_grid(now.whole, now.tt_fraction, n_steps, step / DAY_S)
+        if satrecs:
+            write_positions(positions, np.arange(len(satrecs)), satrecs, grid, set_progress)
+        positions.flush()
+        del positions
+        os.replace(temp_path, data_path)
+
+        write_index({"jd": now.whole, "start": now.tt_fraction, "step_seconds": step, "n_steps": n_steps,
+                     "hours": hours, "satnums": satnums})
+    logger.info("trajectory store built")
+    return len(satnums)
+
+
+def update_trajectory_store(satnums):
+    """
+    Save listener that recalculates the stored positions of satellites whose element sets have changed. New satellites
+    are written into the spare rows, and the store is only rebuilt once those run out.
+
+    :param satnums: a list of the satnums that were saved
+    """
+    data_path, index_path = store_paths()
+    if not satnums or not os.path.exists(index_path):
+        return
+
+    with build_lock:
+        with open(index_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+        positions = open_memmap(data_path, mode="r+")
+        index = {satnum: row for row, satnum in enumerate(meta["satnums"])}
+        new = [satnum for satnum in dict.fromkeys(satnums) if satnum not in index]
+        if len(meta["satnums"]) + len(new) > positions.shape[1]:
+            del positions
+            rebuild = True
+        else:
+            rebuild = False
+            meta["satnums"].extend(new)
+            index.update({satnum: len(index) + i for i, satnum in enumerate(new)})
+            ids, satrecs = load_satrecs(list(dict.fromkeys(satnums)))
+            if satrecs:
+                grid = time_grid(meta["jd"], meta["start"], meta["n_steps"], meta["step_seconds"] / DAY_S)
+                write_positions(positions, [index[satnum] for satnum in ids], satrecs, grid)
+            positions.flush()
+            del positions
+            write_index(meta)
+
+    if rebuild:
+        logger.info("trajectory store is full, rebuilding")
+        # stores written before the hours were kept have n_steps - 1 steps between their first and last times
+        hours = meta.get("hours", (meta["n_steps"] - 1) * meta["step_seconds"] / 3600)
+        build_trajectory_store(hours, meta["step_seconds"])
+    else:
+        logger.info(f"updated {len(satnums)} satellites in the trajectory store")
+
+
+def start_trajectory_store_job(hours=None, step=None):
+    """
+    Builds the trajectory store in a background thread so it doesn't hold up the rest of the program
+
+    :param hours: how many hours the store covers. Defaults to horizon_hours
+    :param step: the number of seconds between time steps. Defaults to step_seconds
+    :return: the thread running the job
+    """
+    def job():
+        try:
+            build_trajectory_store(hours, step)
+        except Exception as e:
+            logger.error(e)
+
+    thread = threading.Thread(target=job, daemon=True)
+    thread.start()
+    return thread
+
+
+Database.add_save_listener(update_trajectory_store)
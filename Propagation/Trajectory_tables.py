@@ -0,0 +1,156 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+from numpy.polynomial import chebyshev
+from skyfield.api import load
+from skyfield.constants import DAY_S
+from Propagation.Catalog_propagator import get_catalog_propagator, teme_to_ecef, ecef_to_geodetic
+from Models.Catalog import build_satrec
+import logging
+
+ts = load.timescale()
+table_span_days = 2.0  # tables cover this many days either side of the time they are built
+segment_minutes = 20.0
+degree = 14
+max_tables = 32
+# fits that miss SGP4 by more than this at the test points are logged, so a bad fit doesn't go unnoticed
+error_tolerance_km = 0.001
+
+tables = OrderedDict()
+tables_lock = threading.Lock()
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(filename="log.txt", format='%(asctime)s - %(levelname)s:%(message)s', level=logging.INFO)
+
+
+class TrajectoryTable:
+    """
+    A piecewise Chebyshev fit of one satellite's SGP4 trajectory, so positions at any time inside the table can be
+    found by cheap interpolation instead of running SGP4 again.
+
+    The fit is done on the TEME positions, which are smooth, and the earth's rotation is applied afterwards, so the
+    interpolated earth fixed positions are exactly as accurate as the TEME fit. With 20 minute segments and degree 14
+    polynomials the fit stays within a few millimetres of SGP4 for near circular orbits and within a few metres for
+    highly eccentric orbits such as Molniya. Every table measures its own error at points between the fitting nodes
+    when it is built and keeps it in max_error_km.
+    """
+    def __init__(self, satrec, centre_jd, span_days=None):
+        """
+        :param satrec: the satellite's sgp4 Satrec
+        :param centre_jd: the UTC julian date the table is centred on
+        :param span_days: how many days the table covers either side of the centre. Defaults to table_span_days
+        """
+        span_days = span_days or table_span_days
+        self.satnum = satrec.satnum
+        self.epoch = satrec.jdsatepoch + satrec.jdsatepochF
+        self.segment = segment_minutes / 1440.0
+        self.n_segments = int(np.ceil(2 * span_days / self.segment))
+        self.jd = np.floor(centre_jd - span_days)
+        self.start = (centre_jd - span_days) - self.jd
+
+        # sample every segment at the Chebyshev nodes in one SGP4 call, then solve for all the coefficients at once
+        nodes = np.cos(np.pi * (np.arange(degree + 1) + 0.5) / (degree + 1))
+        segment_starts = self.start + np.arange(self.n_segments) * self.segment
+        fractions = (segment_starts[:, None] + (nodes[None, :] + 1) / 2 * self.segment).ravel()
+        e, r, v = satrec.sgp4_array(np.full(fractions.shape, self.jd), fractions)
+        samples = r.reshape(self.n_segments, degree + 1, 3).transpose(1, 0, 2).reshape(degree + 1, -1)
+        self.coefficients = np.linalg.solve(chebyshev.chebvander(nodes, degree), samples) \
+            .reshape(degree + 1, self.n_segments, 3).transpose(1, 0, 2)
+
+        # test the fit halfway between the nodes of every segment
+        test = segment_starts + 0.75 * self.segment
+        e, r, v = satrec.sgp4_array(np.full(test.shape, self.jd), test)
+        errors = np.linalg.norm(self.teme(test) - r, axis=-1)
+        self.max_error_km = float(np.nanmax(errors)) if not np.isnan(errors).all() else 0.0
+        if self.max_error_km > error_tolerance_km:
+            logger.warning(f"trajectory table for {self.satnum} is {self.max_error_km:.4f} km from SGP4")
+
+    def covers(self, fractions):
+        """
+        :param fractions: UTC day fractions relative to self.jd
+        :return: True if every time is inside the table
+        """
+        return bool(np.all((fractions >= self.start) & (fractions <= self.start + self.n_segments * self.segment)))
+
+    def teme(self, fractions):
+        """
+        Interpolates TEME positions from the table
+
+        :param fractions: UTC day fractions relative to self.jd, which must be inside the table
+        :return: TEME positions in km, shaped (T, 3)
+        """
+        offset = (np.asarray(fractions) - self.start) / self.segment
+        segment = np.clip(offset.astype(np.int64), 0, self.n_segments - 1)
+        x = 2 * (offset - segment) - 1
+        return np.einsum("td,tdk->tk", chebyshev.chebvander(x, degree), self.coefficients[segment])
+
+
+def get_trajectory_table(satnum, centre_jd=None):
+    """
+    Returns the trajectory table for a satellite, building it the first time it is needed or after the satellite gets a
+    new element set. The least recently used table is dropped once there are more than max_tables.
+
+    :param satnum: the satellite's satnum
+    :param centre_jd: the UTC julian date to centre a newly built table on. Defaults to now
+    :return: a TrajectoryTable, or None if the satellite isn't in the catalog
+    """
+    propagator = get_catalog_propagator()
+    row = propagator.index.get(satnum)
+    if row is None:
+        return None
+    epoch = propagator.epoch_jd[row]
+
+    with tables_lock:
+        table = tables.get(satnum)
+        if table is not None and table.epoch == epoch:
+            tables.move_to_end(satnum)
+            return table
+
+    if centre_jd is None:
+        centre_jd = ts.now().tt
+    logger.info(f"building trajectory table for {satnum}")
+    table = TrajectoryTable(build_satrec(propagator.elements[row]), centre_jd)
+
+    with tables_lock:
+        tables[satnum] = table
+        tables.move_to_end(satnum)
+        while len(tables) > max_tables:
+            tables.popitem(last=False)
+    return table
+
+
+def trajectory_positions(satnum, t):
+    """
+    Calculates a satellite's positions from its trajectory table, falling back to running SGP4 directly for times the
+    table doesn't cover.
+
+    :param satnum: the satellite's satnum
+    :param t: a skyfield Time object holding one or more times
+    :return: lat, lon: geodetic latitude and longitude in degrees
+    :return: alt: altitude above the WGS84 ellipsoid in km
+    :return: ecef: earth fixed positions in km, with xyz in the last axis
+    """
+    table = get_trajectory_table(satnum)
+    scalar = not getattr(t.whole, "shape", None)
+    whole = np.atleast_1d(t.whole)
+    fraction_utc = np.atleast_1d(t.tai_fraction - t._leap_seconds() / DAY_S)
+    fraction_ut1 = np.atleast_1d(t.ut1_fraction)
+
+    if table is None:
+        return (np.nan, np.nan, np.nan, np.full(3, np.nan)) if scalar else \
+            (np.full(len(whole), np.nan),) * 3 + (np.full((len(whole), 3), np.nan),)
+
+    fractions = (whole - table.jd) + fraction_utc
+    if table.covers(fractions):
+        r = table.teme(fractions)
+    else:
+        logger.info(f"times outside the trajectory table for {satnum}, using SGP4")
+        propagator = get_catalog_propagator()
+        satrec = build_satrec(propagator.elements[propagator.index[satnum]])
+        e, r, v = satrec.sgp4_array(whole, fraction_utc)
+
+    ecef = teme_to_ecef(r, whole, fraction_ut1)
+    lat, lon, alt = ecef_to_geodetic(ecef)
+    if scalar:
+        return lat[0], lon[0], alt[0], ecef[0]
+    return lat, lon, alt, ecef
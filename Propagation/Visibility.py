@@ -0,0 +1,90 @@
+import numpy as np
+from skyfield.api import wgs84
+import logging
+
+logger = logging.getLogger(__name__)
+logging.basicConfig(filename="log.txt", format='%(asctime)s - %(levelname)s:%(message)s', level=logging.INFO)
+
+
+def enu_rotation_matrix(lat, lon):
+    """
+    Builds the matrix that rotates earth fixed vectors into the observer's local east, north, up frame
+
+    :param lat: the observer's geodetic latitude in degrees
+    :param lon: the observer's longitude in degrees
+    :return: a 3x3 numpy array whose rows are the east, north and up unit vectors
+    """
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    sin_lat, cos_lat = np.sin(lat), np.cos(lat)
+    sin_lon, cos_lon = np.sin(lon), np.cos(lon)
+    return np.array([
+        [-sin_lon, cos_lon, 0.0],
+        [-sin_lat * cos_lon, -sin_lat * sin_lon, cos_lat],
+        [cos_lat * cos_lon, cos_lat * sin_lon, sin_lat],
+    ])
+
+
+def observer_ecef(lat, lon, elevation_m=0.0):
+    """
+    :param lat: the observer's geodetic latitude in degrees
+    :param lon: the observer's longitude in degrees
+    :param elevation_m: the observer's height above the WGS84 ellipsoid in metres
+    :return: the observer's earth fixed position in km
+    """
+    return wgs84.latlon(lat, lon, elevation_m).itrs_xyz.km
+
+
+def calculate_altaz(ecef, lat, lon, elevation_m=0.0):
+    """
+    Calculates the elevation, azimuth and distance of every satellite from an observer in one array operation.
+
+    :param ecef: earth fixed satellite positions in km, with xyz in the last axis
+    :param lat: the observer's geodetic latitude in degrees
+    :param lon: the observer's longitude in degrees
+    :param elevation_m: the observer's height above the WGS84 ellipsoid in metres
+    :return: elevation and azimuth in degrees, and distance in km, each with the shape of ecef minus its last axis
+    """
+    enu = (ecef - observer_ecef(lat, lon, elevation_m)) @ enu_rotation_matrix(lat, lon).T
+    east, north, up = enu[..., 0], enu[..., 1], enu[..., 2]
+    distance = np.sqrt(east * east + north * north + up * up)
+    elevation = np.degrees(np.arcsin(up / distance))
+    azimuth = np.degrees(np.arctan2(east, north)) % 360.0
+    return elevation, azimuth, distance
+
+
+def visible_rows(snapshot, lat, lon, min_elevation=0.0, rows=None, use_index=True):
+    """
+    Finds the satellites in a position snapshot that are above a minimum elevation for an observer.
+
+    :param snapshot: a PositionSnapshot object
+    :param lat: the observer's geodetic latitude in degrees
+    :param lon: the observer's longitude in degrees
+    :param min_elevation: the elevation in degrees a satellite has to be above to count as visible. default is 0,
+    i.e. above the horizon
+    :param rows: an optional array of snapshot rows to check. All rows are checked by default.
+    :param use_index: when True, the snapshot's spatial index is used to skip satellites that are too far away to be
+    above the horizon before the exact elevations are calculated
+    :return: a numpy array of the snapshot rows of the visible satellites
+    """
+    if use_index:
+        index = snapshot.spatial_index
+        if rows is None:
+            rows = index.visibility_candidates(lat, lon, min_elevation)
+        else:
+            rows = index.filter_candidates(rows, lat, lon, min_elevation)
+
+    ecef = snapshot.ecef if rows is None else snapshot.ecef[rows]
+    # only the up component of the line of sight is needed to test the elevation, which saves building the full
+    # east/north/up vectors: sin(elevation) = up / distance
+    line_of_sight = ecef - observer_ecef(lat, lon)
+    up = line_of_sight @ enu_rotation_matrix(lat, lon)[2]
+    distance = np.sqrt(np.einsum("ij,ij->i", line_of_sight, line_of_sight))
+    with np.errstate(invalid="ignore"):
+        visible = up > distance * np.sin(np.radians(min_elevation))
+
+    found = np.flatnonzero(visible)
+    if rows is not None:
+        found = np.sort(np.asarray(rows)[found])
+    logger.info(f"{len(found)} of {len(ecef)} candidate satellites above {min_elevation} degrees")
+    return found
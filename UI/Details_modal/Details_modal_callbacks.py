@@ -4,13 +4,17 @@ from dash import Input, Output, State, html, ctx, no_update, dcc
 import dash_bootstrap_components as dbc
 from dash.exceptions import PreventUpdate
 from skyfield.api import wgs84, load
+import numpy as np
 import pandas as pd
-from Models.Database import get_satellite_lookup
+from Models.Database import get_catalog
+from Propagation.Position_cache import get_position_snapshot
+from Propagation.Pass_cache import get_events
+from Propagation.Ephemeris import sunlit_pairs
+from Propagation.Visibility import visible_rows
 from Visualisations import Map_Component, Globe_Component
 
 
 ts = load.timescale()
-ephemeris_path = "assets/de421.bsp"
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(filename="log.txt", format='%(asctime)s - %(levelname)s:%(message)s', level=logging.ERROR)
@@ -69,8 +73,8 @@ def register_details_modal_callbacks(app):
 
         # print(f"index: {row_index}, satellite: {selected_sat}")
 
-        lookup = get_satellite_lookup()
-        sat_obj = lookup[selected_sat["OBJECT_ID"]]
+        catalog = get_catalog()
+        sat_obj = catalog[selected_sat["OBJECT_ID"]]
         logger.info(f"opening details for {sat_obj}")
         logger.info("building charts")
         map_chart = Map_Component.create_map_chart()
@@ -144,14 +148,21 @@ def register_details_modal_callbacks(app):
             return html.Span("No satellite selected", style={"color": "orange"})
 
         logger.info("calculating visibility")
-        lookup = get_satellite_lookup()
-        sat_obj = lookup[sat_id]
-        observer = wgs84.latlon(lat, lon)
-        t = ts.now()
-        topocentric = (sat_obj - observer).at(t)
-        alt, az, dist = topocentric.altaz()
-
-        if alt.degrees > 0:
+        snapshot = get_position_snapshot()
+        rows = snapshot.rows_for([sat_id])
+        if len(rows):
+            # the spatial index rules out satellites that are nowhere near the observer before the exact check
+            visible = len(visible_rows(snapshot, lat, lon, rows=rows)) > 0
+        else:
+            catalog = get_catalog()
+            sat_obj = catalog[sat_id]
+            observer = wgs84.latlon(lat, lon)
+            t = ts.now()
+            topocentric = (sat_obj - observer).at(t)
+            alt, az, dist = topocentric.altaz()
+            visible = alt.degrees > 0
+
+        if visible:
             return html.Span("Visible")
         else:
             return html.Span("Not Visible")
@@ -185,9 +196,8 @@ def register_details_modal_callbacks(app):
             return no_update
 
         logger.info("building event list")
-        lookup = get_satellite_lookup()
-        sat = lookup[sat_id]
-        eph = load(ephemeris_path)
+        catalog = get_catalog()
+        sat = catalog[sat_id]
 
         t0 = ts.now()
         t1 = ts.utc((t0.utc_datetime() + timedelta(days=days)))
@@ -195,12 +205,12 @@ def register_details_modal_callbacks(app):
         if lat is None or lon is None:
             return html.Span("Enter coordinates", style={"color": "#aaa"})
 
-        observer = wgs84.latlon(lat, lon)
-
         logger.info("calculating event times")
-        times, events = sat.find_events(observer, t0, t1, altitude_degrees=10)
+        # passes are cached on disk, so moving the slider only calculates the days that haven't been seen before
+        times, events = get_events(sat, lat, lon, t0, t1, altitude_degrees=10)
         event_names = 'rise above 10 degrees', 'culminate', 'set below 10 degrees'
-        sunlit = sat.at(times).is_sunlit(eph)
+        # the ephemeris is loaded once per process and the sunlit test runs over every event time at once
+        sunlit, _ = sunlit_pairs(np.full(len(times), sat_id), times)
 
         rows = []
         logger.info("populating table")
@@ -286,8 +296,8 @@ def register_details_modal_callbacks(app):
         t = ts.utc(dt)
 
         logger.info(f"calculating position of sat (id: {sat_id} at {dt}")
-        lookup = get_satellite_lookup()
-        sat = lookup.get(sat_id)
+        catalog = get_catalog()
+        sat = catalog.get(sat_id)
         if not sat:
             return html.Span("Satellite not found.", style={"color": "orange"}), globe_fig, map_fig
 
@@ -1,7 +1,22 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from datetime import datetime
 from dash import Input, Output, State, ctx, no_update
+from dash.exceptions import PreventUpdate
+from requests.adapters import HTTPAdapter
 import requests, logging
-from Models import Database
+from Models.Ingest import import_tle_data
+
+# the CelesTrak GP query endpoint. It can be pointed at a mirror or a local server with the CELESTRAK_URL variable
+celestrak_url = os.environ.get("CELESTRAK_URL", "https://celestrak.org/NORAD/elements/gp.php")
+download_workers = 4  # queries downloaded at the same time in a batch download
+download_timeout = 30  # seconds to wait for each response
+# the groups refreshed by the batch download unless others are entered
+standard_groups = ["stations", "visual", "weather", "noaa", "goes", "resource", "sarsat", "tdrss", "geo", "iridium-NEXT",
+                   "oneweb", "globalstar", "amateur", "gnss", "science"]
+session = None
+session_lock = threading.Lock()
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(filename="log.txt", format='%(asctime)s - %(levelname)s:%(message)s', level=logging.ERROR)
@@ -49,11 +64,15 @@ def register_download_modal_callbacks(app):
         Output("download-status-text", "is_open", allow_duplicate=True),
         Output("db-refresh-signal", "data"),
         Input("download-btn", "n_clicks"),
+        Input("download-batch-btn", "n_clicks"),
         State("search-field", "value"),
         State("search-term", "value"),
+        State("download-format", "value"),
+        State("download-queries", "value"),
         background=True,
         running=[
             (Output("download-btn", "disabled"), True, False),
+            (Output("download-batch-btn", "disabled"), True, False),
             (Output("cancel-btn", "disabled"), False, True),
             (
                 Output("progress_bar", "style"),
@@ -66,19 +85,26 @@ def register_download_modal_callbacks(app):
                   Output("progress_bar", "max")],
         prevent_initial_call=True
     )
-    def start_download(set_progress, n_clicks, field, term):
+    def start_download(set_progress, n_clicks, batch_clicks, field, term, data_format, queries):
         """
-        Manages the download and save to database process. Also responsible for updating the progres bar
+        Manages the download and save to database process. Also responsible for updating the progres bar, which follows
+        the bytes of the download saved to the database
         :param set_progress: a function that update the progress bar
         :param n_clicks: property that detects the download button clicks
+        :param batch_clicks: property that detects the batch download button clicks
         :param field: search field string
         :param term: search term string
+        :param data_format: the format to download the element sets in, TLE or one of the OMM formats
+        :param queries: the batch download queries, one FIELD=term pair per line
         :return:
         """
+        if ctx.triggered_id == "download-batch-btn":
+            return start_batch_download(set_progress, queries, data_format or "TLE")
+
         logger.info("starting download")
         try:
-            set_progress((1, 3))
-            response = download_data(field, term)
+            set_progress((0, 1))
+            response = download_data(field, term, data_format or "TLE")
         except ValueError as e:
             logger.error(e)
             return f"Invalid search term: {e}", True, no_update
@@ -93,19 +119,17 @@ def register_download_modal_callbacks(app):
             return f"Celestrak returned HTTP {response.status_code}.", True, no_update
 
         try:
-            set_progress((2, 3))
             logger.info("sending data to database")
-            count = Database.save(response.content)
+            summary = import_tle_data(response.content, set_progress)
         except Exception as e:
             logger.error(e)
             return f"Error saving to database: {e}", True, no_update
-        set_progress((3, 3))
 
-        logger.info(f"Download complete! Downloaded {count} satellites")
-        return f"Download complete! Downloaded {count} satellites", True, datetime.now()
+        logger.info(f"Download complete! Downloaded {summary.total} satellites: {summary}")
+        return f"Download complete! Downloaded {summary.total} satellites: {summary}", True, datetime.now()
 
 
-def download_data(field, term):
+def download_data(field, term, data_format="TLE"):
     """
     This function sends a request to the Celestrak API to download the data using the user provide search field and
     term.
@@ -113,17 +137,107 @@ def download_data(field, term):
     If the download is successful, the data is sent to be saved in the database
     :param field: the search field
     :param term:  the search term
+    :param data_format: the FORMAT requested from Celestrak, TLE, JSON or CSV
     :return: a bool represent the success of the download
     """
-    base = "https://celestrak.org/NORAD/elements/gp.php"
-    url = f"{base}?{field}={term}&FORMAT=tle"
+    url = f"{celestrak_url}?{field}={term}&FORMAT={data_format}"
     # print("dowloading using: ", field, term)
     logger.info(f"Requesting data from {url}")
 
     try:
-        response = requests.get(url, timeout=10)
+        response = get_session().get(url, timeout=download_timeout)
     except requests.exceptions.RequestException as e:
         logger.error(e)
         raise ConnectionError("Failed to reach Celestrak server.")
 
-    return response
\ No newline at end of file
+    return response
+
+
+def get_session():
+    """
+    Returns the HTTP session shared by every download. Its connections are kept alive and pooled, so repeated and
+    concurrent downloads don't each open a new connection to Celestrak.
+    :return: a requests Session
+    """
+    global session
+    with session_lock:
+        if session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=download_workers)
+            session.mount("https://", adapter)
+            session.mount("http://", adapter)
+    return session
+
+
+def parse_queries(text):
+    """
+    Reads batch download queries, one per line written as FIELD=term, such as GROUP=stations or CATNR=25544. Lines with
+    only a term are taken as group names, and blank lines are skipped.
+    :param text: the contents of the queries box
+    :return: a list of (field, term) tuples
+    """
+    queries = []
+    for line in (text or "").splitlines():
+        line = line.strip()
+        if not line:
+            continue
+        field, _, term = line.rpartition("=")
+        queries.append((field.strip().upper() or "GROUP", term.strip()))
+    return queries
+
+
+def download_groups(queries, data_format="TLE", set_progress=None):
+    """
+    Downloads several Celestrak queries at once and saves each one as soon as it arrives. The requests run on a thread
+    pool of download_workers threads sharing the pooled session, while the responses are saved one at a time on the
+    calling thread, so saving one query overlaps with downloading the others.
+    :param queries: a list of (field, term) tuples
+    :param data_format: the FORMAT requested from Celestrak, TLE, JSON or CSV
+    :param set_progress: an optional function called after each query is saved or fails, with a (done, total) tuple
+    :return: a list with a (field, term, summary, error) tuple for each query in the order they finished, where summary
+    is a SaveSummary, or None when error describes why the query failed
+    """
+    results = []
+    with ThreadPoolExecutor(max_workers=max(1, min(download_workers, len(queries)))) as executor:
+        futures = {executor.submit(download_data, field, term, data_format): (field, term) for field, term in queries}
+        for future in as_completed(futures):
+            field, term = futures[future]
+            summary, error = None, None
+            try:
+                response = future.result()
+                if response.status_code != 200:
+                    error = f"Celestrak returned HTTP {response.status_code}"
+                else:
+                    summary = import_tle_data(response.content)
+            except Exception as e:
+                logger.error(e)
+                error = str(e)
+            logger.info(f"downloaded {field}={term}: {error or summary}")
+            results.append((field, term, summary, error))
+            if set_progress:
+                set_progress((len(results), len(queries)))
+    return results
+
+
+def start_batch_download(set_progress, text, data_format):
+    """
+    Runs a batch download from the download modal
+    :param set_progress: a function that update the progress bar
+    :param text: the batch download queries, one per line
+    :param data_format: the format to download the element sets in
+    :return: the outcome of the download
+    """
+    queries = parse_queries(text)
+    if not queries:
+        raise PreventUpdate
+    logger.info(f"starting batch download of {len(queries)} queries")
+    set_progress((0, len(queries)))
+    results = download_groups(queries, data_format, set_progress)
+
+    failed = [f"{field}={term}: {error}" for field, term, summary, error in results if error]
+    count = sum(summary.total for _, _, summary, _ in results if summary)
+    changed = sum(len(summary.changed) for _, _, summary, _ in results if summary)
+    message = f"Downloaded {count} satellites from {len(results) - len(failed)} of {len(queries)} queries, {changed} changed"
+    if failed:
+        message += ". Failed: " + "; ".join(failed)
+    return message, True, datetime.now() if changed else no_update
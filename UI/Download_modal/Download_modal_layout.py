@@ -1,5 +1,6 @@
 import dash_bootstrap_components as dbc
 from dash import html
+from UI.Download_modal.Download_modal_callbacks import standard_groups
 import logging
 
 logger = logging.getLogger(__name__)
@@ -25,11 +26,26 @@ def create_download_modal():
                     ), width=6),
                     dbc.Col(dbc.Input(id="search-term", type="text", placeholder="Enter search term"), width=6),
                 ], class_name="mb-3"),
+                dbc.Row([
+                    dbc.Col(dbc.Label("Format"), width=6),
+                    dbc.Col(dbc.Select(
+                        id="download-format",
+                        options=[{"label": "TLE", "value": "TLE"},
+                                 {"label": "OMM JSON", "value": "JSON"},
+                                 {"label": "OMM CSV", "value": "CSV"}],
+                        value="TLE",
+                    ), width=6),
+                ], class_name="mb-3"),
 
                 html.Progress(id="progress_bar", value="0", style={"visibility": "hidden", "justify": "center"}),
                 dbc.Alert(id="download-status-text", color="info", is_open=False),
 
                 dbc.Button("Download", id="download-btn", color="primary", className="w-100 mb-3"),
+
+                html.P("Or download several queries at once, one FIELD=term per line:"),
+                dbc.Textarea(id="download-queries", value="\n".join(f"GROUP={group}" for group in standard_groups),
+                             rows=6, class_name="mb-2"),
+                dbc.Button("Download All", id="download-batch-btn", color="primary", className="w-100 mb-3"),
                 dbc.Button("Cancel", id="cancel-btn", className="w-100 mb-3"),
             ]),
         ]
@@ -1,6 +1,8 @@
 from dash import Input, Output, State
 from dash.exceptions import PreventUpdate
-from Models.Database import get_satellite_data
+from Models.Database import export_tle_file, get_filtered_satnums
+from Propagation.Trajectory_export import export_trajectories
+from UI.Satellite_list_callbacks import orbit_filter
 import logging
 
 logger = logging.getLogger(__name__)
@@ -31,58 +33,93 @@ def register_export_modal_callbacks(app):
             return not is_open
         return is_open
 
-    @app.callback(
-        Output("export-data", "data"),
+    '''
+    The clientside_callback is used to execute a javascript function in the user's browser. In this case, the browser is 
+    the PyWebview that the dash app is running in, and the function asks the choose_save_path api located in the main file
+    where the file should be saved. Only the path comes back, the file itself is written by export_tle.
+    '''
+    app.clientside_callback(
+        """
+        async function(n_clicks, export_type, trajectory_filename) {
+            if (!n_clicks) return window.dash_clientside.no_update;
+
+            let filename = export_type === "trajectories" ? trajectory_filename : "satellites.txt";
+            let path = await window.pywebview.api.choose_save_path(filename);
+            return path || window.dash_clientside.no_update;
+        }
+        """,
+        Output("export-path", "data"),
         Input("confirm-export", "n_clicks"),
+        State("export-type", "value"),
+        State("export-trajectory-filename", "data"),
+        prevent_initial_call=True
+    )
+
+    @app.callback(
+        Output("export-status-text", "children"),
+        Output("export-status-text", "is_open"),
+        Input("export-path", "data"),
+        State("export-type", "value"),
+        State("export-hours", "value"),
+        State("export-step", "value"),
         State("export-choice", "value"),
         State("satellite-table", "derived_virtual_data"),
+        State("orbit-class", "value"),
+        State("orbit-min-inclination", "value"),
+        State("orbit-max-inclination", "value"),
+        State("orbit-max-age", "value"),
+        background=True,
+        running=[
+            (Output("confirm-export", "disabled"), True, False),
+            (
+                    Output("export-progress-bar", "style"),
+                    {"visibility": "visible"},
+                    {"visibility": "hidden"},
+            ),
+        ],
+        progress=[Output("export-progress-bar", "value"),
+                  Output("export-progress-bar", "max")],
         prevent_initial_call=True
     )
-    def export_tle(n_clicks, choice, filtered_data):
+    def export_tle(set_progress, path, export_type, hours, step, choice, filtered_data, orbit, min_inclination,
+                   max_inclination, max_age):
         """
-        Gets the requested satellite data from the database and converts it into a TLE format string to be written to a
-        file
-        :param n_clicks: property used to track the clicks on confirm export
+        Streams the requested satellite data from the database into a TLE file at the path chosen in the save dialog,
+        or propagates the requested satellites and writes their trajectories to a columnar file
+        :param set_progress: function for filling the progress bar
+        :param path: the path of the file to write
+        :param export_type: "tle" to export TLE data or "trajectories" to export propagated positions
+        :param hours: the length of the trajectories in hours
+        :param step: the number of seconds between trajectory points
         :param choice: the input from a pair of radio buttons asking the user if they'd like to export the whole
-        database of just the current selection
+        database, the current selection, or the satellites matching the orbit filter
         :param filtered_data: the currently displayed data
-        :return: content: a string containing the TLE formatted data
+        :param orbit: the orbit class chosen in the orbit filter
+        :param min_inclination: the minimum inclination from the orbit filter
+        :param max_inclination: the maximum inclination from the orbit filter
+        :param max_age: the max epoch age from the orbit filter
+        :return: the outcome of the export
         """
         logger.info("exporting file")
-        if not n_clicks:
+        if not path:
             raise PreventUpdate
 
-        if choice == "all":
-            # print("export all")
-            satellite_data = get_satellite_data()
-        else:
-            # print("export selected")
-            id_list = [row["OBJECT_ID"] for row in filtered_data]
-            satellite_data = get_satellite_data(id_list)
-
-        # print(satellite_data)
-        lines = []
-        for name, line1, line2 in satellite_data:
-            lines.append(f"{name}\n{line1}\n{line2}\n")
+        try:
+            filters = orbit_filter(orbit, min_inclination, max_inclination, max_age) if choice == "orbit" else None
+            id_list = [row["OBJECT_ID"] for row in filtered_data or []] if choice == "filtered" else None
+            if export_type == "trajectories":
+                if filters is not None:
+                    id_list = get_filtered_satnums(**filters)
+                satnums = None if id_list is None else [int(satnum) for satnum in id_list]
+                stats = export_trajectories(path, satnums, hours=float(hours or 24), step_seconds=float(step or 60),
+                                            set_progress=set_progress)
+                return (f"Exported {stats['satellites']} trajectories ({stats['rows']:,} positions) to "
+                        f"{stats['path']} in {stats['seconds']:.1f}s, {stats['rows_per_second']:,.0f} rows/s"), True
 
-        content = "".join(lines)
-        return content
+            # the orbit filter is run in the query, rather than sending every satnum in the table back to the database
+            count = export_tle_file(path, id_list, filters, set_progress=set_progress)
+        except Exception as e:
+            logger.error(e)
+            return f"error exporting to {path}: {e}", True
 
-    '''
-    The clientside_callback is used to execute a javascript function in the user's browser. In this case, the browser is 
-    the PyWebview that the dash app is running in, and the function passes the contents of the file to be saved to the
-    save_file api located in the main file.  
-    '''
-    app.clientside_callback(
-        """
-        function(content) {
-            if (!content) return;
-            
-            let filename = "satellites.txt";
-            window.pywebview.api.save_file(content, filename);
-            return null;
-        }
-        """,
-        Output("export-data", "clear"),
-        Input("export-data", "data")
-    )
\ No newline at end of file
+        return f"Exported {count} satellites to {path}", True
@@ -1,5 +1,6 @@
 import dash_bootstrap_components as dbc
 from dash import html, dcc
+from Propagation.Trajectory_export import default_format
 import logging
 
 logger = logging.getLogger(__name__)
@@ -22,12 +23,41 @@ def create_export_modal():
                     options=[
                         {"label": "Entire Database", "value": "all"},
                         {"label": "Currently Filtered List", "value": "filtered"},
+                        {"label": "Satellites Matching the Orbit Filter", "value": "orbit"},
                     ],
                     value="filtered",
                     style={"marginBottom": "15px"}
                 ),
 
+                html.P("Choose what to export:", style={"marginBottom": "10px"}),
+
+                dcc.RadioItems(
+                    id="export-type",
+                    options=[
+                        {"label": "TLE Data", "value": "tle"},
+                        {"label": f"Trajectories ({'Parquet, Arrow or NPZ' if default_format() == 'parquet' else 'NPZ'})",
+                         "value": "trajectories"},
+                    ],
+                    value="tle",
+                    style={"marginBottom": "10px"}
+                ),
+                dbc.Row([
+                    dbc.Col(dbc.InputGroup([
+                        dbc.InputGroupText("Hours"),
+                        dbc.Input(id="export-hours", type="number", min=0, value=24),
+                    ]), width=6),
+                    dbc.Col(dbc.InputGroup([
+                        dbc.InputGroupText("Step (s)"),
+                        dbc.Input(id="export-step", type="number", min=1, value=60),
+                    ]), width=6),
+                ], class_name="mb-3"),
+
                 dcc.Download(id="export-download"),
+                dcc.Store(id="export-path"),
+                dcc.Store(id="export-trajectory-filename", data=f"trajectories.{default_format()}"),
+
+                html.Progress(id="export-progress-bar", value="0", style={"visibility": "hidden", "justify": "center"}),
+                dbc.Alert(id="export-status-text", color="info", is_open=False),
             ]),
 
             dbc.ModalFooter([
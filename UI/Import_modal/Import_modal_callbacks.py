@@ -1,8 +1,8 @@
 from datetime import datetime
-from dash import Input, Output, State, no_update
+from dash import Input, Output, State, no_update, ctx
 from dash.exceptions import PreventUpdate
-from Models.Database import save
-import base64, logging
+from Models.Ingest import import_tle_data, import_tle_file
+import base64, os, logging
 
 logger = logging.getLogger(__name__)
 logging.basicConfig(filename="log.txt", format='%(asctime)s - %(levelname)s:%(message)s', level=logging.INFO)
@@ -39,7 +39,9 @@ def register_import_modal_callbacks(app):
         Output("import-status-text", "is_open"),
         Output("db-refresh-signal", "data", allow_duplicate=True),
         Input("tle-upload", "contents"),
+        Input("import-path-btn", "n_clicks"),
         State("tle-upload", "filename"),
+        State("import-path", "value"),
         background=True,
         running=[
             (Output("cancel-import-btn", "disabled"), False, True),
@@ -54,17 +56,25 @@ def register_import_modal_callbacks(app):
                   Output("import-progress-bar", "max")],
         prevent_initial_call=True
     )
-    def import_tle(set_progress, contents, filename):
+    def import_tle(set_progress, contents, path_clicks, filename, path):
         """
-        Processes the contents of a file loaded into the upload component of the import modal, then pass it to the
-        database to be saved
+        Processes the contents of a file loaded into the upload component of the import modal, or a file path entered
+        in the path input, then passes it to the database to be saved.
+
+        Uploads are sent through the browser as base64 and have to be held in memory, so large files are better imported
+        by path, which are streamed from disk. Both are saved in chunks, with the progress bar following the bytes read.
+        Either can be a gzip, bz2 or zip file.
         :param set_progress: function for filling the progress bar
         :param contents: contents of the file
+        :param path_clicks: registers when the import path button is clicked
         :param filename: name of the file
+        :param path: the path of a local TLE file
         :return: HTML element containing the outcome of the import
         """
+        if ctx.triggered_id == "import-path-btn":
+            return import_tle_path(set_progress, path)
+
         logger.info("importing file: %s", filename)
-        set_progress((1, 3))
         if not contents:
             raise PreventUpdate
 
@@ -75,18 +85,41 @@ def register_import_modal_callbacks(app):
             # print("data", data)
             text = base64.b64decode(data)
             # print("text", text)
-            set_progress((2, 3))
+            set_progress((0, len(text) or 1))
         except Exception as e:
             logger.error(e)
             return f"error reading file {filename}: {e}", True, no_update
 
         try:
             logger.info("sending file data to database")
-            count = save(text)
-            set_progress((3, 3))
+            summary = import_tle_data(text, set_progress)
         except Exception as e:
             logger.error(e)
             return f"error importing file {filename}: {e}", True, no_update
 
         logger.info("file saved")
-        return  f"Imported {count} satellites from {filename}", True, datetime.now()
\ No newline at end of file
+        return  f"Imported {summary.total} satellites from {filename}: {summary}", True, datetime.now()
+
+
+def import_tle_path(set_progress, path):
+    """
+    Streams a TLE file from a local path into the database
+    :param set_progress: function for filling the progress bar
+    :param path: the path of the file
+    :return: HTML element containing the outcome of the import
+    """
+    if not path:
+        raise PreventUpdate
+    path = os.path.expanduser(path.strip().strip('"'))
+    logger.info("importing file from path: %s", path)
+    if not os.path.isfile(path):
+        return f"no file found at {path}", True, no_update
+
+    try:
+        summary = import_tle_file(path, set_progress)
+    except Exception as e:
+        logger.error(e)
+        return f"error importing file {path}: {e}", True, no_update
+
+    logger.info("file saved")
+    return f"Imported {summary.total} satellites from {os.path.basename(path)}: {summary}", True, datetime.now()
@@ -17,7 +17,7 @@ def create_import_modal():
         children=[
             dbc.ModalHeader(dbc.ModalTitle("Import TLE From File")),
             dbc.ModalBody([
-                html.P("Upload a TLE file (.txt or .tle):"),
+                html.P("Upload a TLE or OMM file (.txt, .tle, .json or .csv, or compressed as .gz, .bz2 or .zip):"),
 
                 dcc.Upload(
                     id="tle-upload",
@@ -30,10 +30,16 @@ def create_import_modal():
                         "borderWidth": "2px", "borderStyle": "dashed",
                         "borderRadius": "6px", "textAlign": "center"
                     },
-                    accept=".txt,.tle",
+                    accept=".txt,.tle,.json,.csv,.gz,.bz2,.zip",
                     multiple=False
                 ),
 
+                html.P("Or import a large file straight from disk:", className="mt-3"),
+                dbc.InputGroup([
+                    dbc.Input(id="import-path", type="text", placeholder="Path to a TLE or OMM file"),
+                    dbc.Button("Import", id="import-path-btn", color="primary"),
+                ], className="mb-3"),
+
                 html.Progress(id="import-progress-bar", value="0", style={"visibility": "hidden", "justify": "center"}),
                 dbc.Alert(id="import-status-text", color="info", is_open=False),
 
@@ -1,6 +1,9 @@
 from dash import Input, Output, State, no_update, ctx
 from skyfield.api import load, wgs84
-from Models.Database import get_satellite_list
+import numpy as np
+from Models.Database import sync_catalog, get_filtered_satnums
+from Propagation.Position_cache import get_position_snapshot
+from Propagation.Visibility import visible_rows
 from Visualisations import Map_Component, Globe_Component
 import logging
 
@@ -29,9 +32,8 @@ def register_home_screen_callbacks(app):
         :return: a list containing the data to be displayed within the table
         """
         logger.info("refreshing table")
-        satellites = get_satellite_list()
-        # print(satellites)
-        data = satellites_to_table_data(satellites)
+        sync_catalog()
+        data = satellites_to_table_data()
 
         return data, None
 
@@ -95,14 +97,15 @@ def register_home_screen_callbacks(app):
          Input("reset-filter-btn", "n_clicks")],
         State("observer-lat", "value"),
         State("observer-lon", "value"),
+        State("observer-min-elevation", "value"),
         prevent_initial_call=True
     )
-    def filter_visible_satellites(n_filter_clicks, n_reset_clicks, lat, lon):
+    def filter_visible_satellites(n_filter_clicks, n_reset_clicks, lat, lon, min_elevation):
         """
-        Takes the values of the latitude and longitude inputs and uses them to create a wsg84 object to simulate the
-        observer's position. It then calculates the altitude, azimuth and distance relative to the observer's position
-        for each satellite in the table. If the altitude angle for a satellite is greater than zero (i.e. is above the
-        horizon), this satellite iss added to the list of visible satellites which is used to filter the data table
+        Takes the values of the latitude and longitude inputs and uses them to find every satellite that is above the
+        minimum elevation for an observer at that position. The elevations of the whole catalog are calculated at once
+        from the earth fixed positions in the current position snapshot, and the visible satellites are used to filter
+        the data table
 
         Will also clear the visible satellite filter if it detects the clear filter button click
 
@@ -110,35 +113,56 @@ def register_home_screen_callbacks(app):
         :param n_reset_clicks: property used to detect the reset filter button has been clicked
         :param lat: the value from the latitude input. Should be an int or float
         :param lon: the value from the longitude input. Should be an int or float
+        :param min_elevation: the value from the minimum elevation input, in degrees. Treated as 0 if it is empty
         :return: data: a list containing the information of each visible satellite
         """
 
         logger.info("filtering visible satellites")
         # print("filtering visible satellites")
+        # the catalog already holds every satellite loaded from the database, so there's no need to read it again here
         if not ctx.triggered or ctx.triggered_id == "reset-filter-btn":
             # print("No filter")
-            satellites = get_satellite_list()
-            data = satellites_to_table_data(satellites)
+            data = satellites_to_table_data()
             return data
 
-        observer = wgs84.latlon(lat, lon)
-        satellites = get_satellite_list()
-        visible_sats = []
+        if lat is None or lon is None:
+            return no_update
 
-        t = ts.now()
-        for sat in satellites:
-            topocentric = (sat - observer).at(t)
-            alt, az, dist = topocentric.altaz()
-            if alt.degrees > 0:
-                visible_sats.append(sat)
-
-        data = satellites_to_table_data(visible_sats)
+        snapshot = get_position_snapshot()
+        rows = visible_rows(snapshot, lat, lon, min_elevation or 0.0)
+        data = satellites_to_table_data(snapshot.propagator.satnums[rows].tolist())
 
         logger.info("returning visible satellites")
         # print(f"[Filter] {len(visible_sats)} visible out of {len(satellites)}")
         return data
 
 
+    @app.callback(
+        Output("satellite-table", "derived_virtual_data", allow_duplicate=True),
+        Input("filter-orbit-btn", "n_clicks"),
+        State("orbit-class", "value"),
+        State("orbit-min-inclination", "value"),
+        State("orbit-max-inclination", "value"),
+        State("orbit-max-age", "value"),
+        prevent_initial_call=True
+    )
+    def filter_orbits(n_clicks, orbit, min_inclination, max_inclination, max_age):
+        """
+        Filters the data table by orbit. The filter is run as a query on the indexed orbital element columns, so only
+        the satnums of the matching satellites come back from the database
+
+        :param n_clicks: property used to detect the filter orbits button has been clicked
+        :param orbit: the orbit class chosen in the dropdown, or an empty string for any orbit
+        :param min_inclination: the value from the minimum inclination input, in degrees
+        :param max_inclination: the value from the maximum inclination input, in degrees
+        :param max_age: the value from the max epoch age input, in days
+        :return: data: a list containing the information of each matching satellite
+        """
+        logger.info("filtering satellites by orbit")
+        satnums = get_filtered_satnums(**orbit_filter(orbit, min_inclination, max_inclination, max_age))
+        return satellites_to_table_data(satnums)
+
+
     @app.callback(
         Output("satellite-table", "active_cell", allow_duplicate=True),
         Output("map-graph", "figure", allow_duplicate=True),
@@ -163,31 +187,48 @@ def register_home_screen_callbacks(app):
         return None, map_fig, globe_fig
 
 
-def satellites_to_table_data(satellites):
+def satellites_to_table_data(satnums=None):
     """
-    Takes a list of EarthSatellite objects and returns the data to populate the data table.
+    Returns the data to populate the data table, read straight from the columns of the satellite catalog without
+    building any EarthSatellite objects.
     Also flags data that is more than two weeks old, indicating that it should be updated to ensure accuracy
-    :param satellites: a list of EarthSatellite objects
+    :param satnums: an iterable of the satnums to include. Every satellite in the catalog is included by default
     :return: a list of dicts containing the satellite's id, name, latitude, longitude, and altitude
     """
-    logger.info("extracting table data from EarthSatellite objects")
-    rows = []
-    t = ts.now()
-
-    for sat in satellites:
-        lat, lon, alt = calculate_position(sat, t)
-        epoch = sat.epoch.utc_datetime()
-        stale = abs(sat.epoch - t) > 14
-        rows.append({
-            "OBJECT_ID": sat.model.satnum,
-            "OBJECT_NAME": sat.name,
-            "LAT": lat,
-            "LON": lon,
-            "ALT": alt,
-            "EPOCH": epoch,
-            "STALE": "true" if stale else "false"
-        })
-    return rows
+    logger.info("extracting table data from the satellite catalog")
+
+    # the whole catalog is propagated once per snapshot, then the rows of the requested satellites are picked out
+    snapshot = get_position_snapshot()
+    propagator = snapshot.propagator
+    catalog = propagator.catalog
+    rows = np.arange(len(catalog)) if satnums is None else catalog.rows_for(satnums)
+    t = snapshot.t
+    lats = np.round(snapshot.lat[rows], 3).tolist()
+    lons = np.round(snapshot.lon[rows], 3).tolist()
+    alts = np.round(snapshot.alt[rows], 2).tolist()
+    stale_flags = (np.abs(propagator.epoch_jd[rows] - t.tt) > 14).tolist()
+    epochs = propagator.epochs
+
+    return [{
+        "OBJECT_ID": satnum,
+        "OBJECT_NAME": catalog.name(row),
+        "LAT": lat,
+        "LON": lon,
+        "ALT": alt,
+        "EPOCH": epochs[row],
+        "STALE": "true" if stale else "false"
+    } for row, satnum, lat, lon, alt, stale in zip(rows.tolist(), catalog.satnums[rows].tolist(), lats, lons, alts,
+                                                    stale_flags)]
+
+
+def orbit_filter(orbit, min_inclination, max_inclination, max_age):
+    """
+    Collects the values of the orbit filter inputs into the keyword arguments used by Database.satellite_filters
+
+    :return: a dictionary of filters
+    """
+    return {"orbit": orbit or None, "min_inclination": min_inclination, "max_inclination": max_inclination,
+            "max_age_days": max_age}
 
 
 """
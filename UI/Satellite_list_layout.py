@@ -14,19 +14,19 @@ import logging
 logger = logging.getLogger(__name__)
 logging.basicConfig(filename="log.txt", format='%(asctime)s - %(levelname)s:%(message)s', level=logging.INFO)
 
-def create_home_screen(satellites):
+def create_home_screen():
     """
     creates home page of the app.
 
     main components are a dash_table for displaying satellites stored in the database, a globe component showing the
-    position of each satellite in 3d, and a map component showing the position of each satellite on a 2d map
+    position of each satellite in 3d, and a map component showing the position of each satellite on a 2d map. The table
+    is filled from the satellite catalog, which needs to be loaded first
 
-    :param satellites: a list of EarthSatellite objects loaded from the database
     :return: the html describing the appearance of the program's home screen
     """
 
     logging.info("populating table")
-    data = satellites_to_table_data(satellites)
+    data = satellites_to_table_data()
     logger.info("generating charts")
     globe = create_globe_chart()
     map = create_map_chart()
@@ -34,7 +34,6 @@ def create_home_screen(satellites):
     return html.Div([
         dcc.Store(id="db-refresh-signal", data=0),
         dcc.Store(id="selected-sat-id", data=None),
-        dcc.Store(id="export-data"),
         dcc.Store(id="last-clicked-row", data={"index": None, "timestamp": 0}),
         dcc.Store(id="open-details-trigger", data=0),
 
@@ -165,6 +164,19 @@ def create_home_screen(satellites):
                                 style={"width": "120px"},
                             ),
                         ]),
+                        html.Div([
+                            dbc.Label("Min Elevation (°):"),
+                            dbc.Input(
+                                id="observer-min-elevation",
+                                type="number",
+                                value=0,
+                                min=0,
+                                max=90,
+                                debounce=True,
+                                step=0.1,
+                                style={"width": "120px"},
+                            ),
+                        ]),
                         html.Button(
                             "Filter Visible Satellites",
                             id="filter-visible-btn",
@@ -177,6 +189,66 @@ def create_home_screen(satellites):
                             className="btn btn-secondary")
                     ]
                 ),
+                html.Div(
+                    className="d-flex gap-2 align-items-end mb-3",
+                    children=[
+                        html.Div([
+                            dbc.Label("Orbit:"),
+                            dcc.Dropdown(
+                                id="orbit-class",
+                                options=[{"label": "Any", "value": ""},
+                                         {"label": "LEO", "value": "LEO"},
+                                         {"label": "MEO", "value": "MEO"},
+                                         {"label": "GEO", "value": "GEO"},
+                                         {"label": "HEO", "value": "HEO"}],
+                                value="",
+                                clearable=False,
+                                style={"width": "120px", "color": "black"},
+                            ),
+                        ]),
+                        html.Div([
+                            dbc.Label("Min Inclination (°):"),
+                            dbc.Input(
+                                id="orbit-min-inclination",
+                                type="number",
+                                min=0,
+                                max=180,
+                                debounce=True,
+                                step=0.1,
+                                style={"width": "120px"},
+                            ),
+                        ]),
+                        html.Div([
+                            dbc.Label("Max Inclination (°):"),
+                            dbc.Input(
+                                id="orbit-max-inclination",
+                                type="number",
+                                min=0,
+                                max=180,
+                                debounce=True,
+                                step=0.1,
+                                style={"width": "120px"},
+                            ),
+                        ]),
+                        html.Div([
+                            dbc.Label("Max Epoch Age (days):"),
+                            dbc.Input(
+                                id="orbit-max-age",
+                                type="number",
+                                min=0,
+                                debounce=True,
+                                step=0.5,
+                                style={"width": "120px"},
+                            ),
+                        ]),
+                        html.Button(
+                            "Filter Orbits",
+                            id="filter-orbit-btn",
+                            n_clicks=0,
+                            className="btn btn-primary"
+                        ),
+                    ]
+                ),
                 html.Div([
                     dcc.Tabs(
                         id="chart-tabs",
@@ -3,7 +3,9 @@ from PIL import Image
 import plotly.graph_objects as go
 from functools import lru_cache
 from skyfield.api import load, wgs84
-from Models.Database import get_satellite_lookup
+from Models.Database import get_catalog
+from Propagation.Position_cache import get_position_snapshot
+from Propagation.Trajectory_tables import trajectory_positions
 import logging
 
 texture_path = "assets/Earth.jpg"
@@ -195,9 +197,6 @@ def load_earth_mesh(radius=EARTH_RADIUS_KM, lat_res=200, lon_res=None):
     logger.info("texture mapping complete")
     return x_flat, y_flat, z_flat, i, j, k, vertexcolour
 
-"""
-TODO: make a separate function for the position calculations
-"""
 def update_markers (fig, satellites):
     """
     Updates the satellite markers on the globe
@@ -206,26 +205,13 @@ def update_markers (fig, satellites):
     :return: a plotly graph object
     """
     logger.info("updating globe satellite markers")
-    t = ts.now()
-    xs, ys, zs, names = [], [], [], []
-    satellite_lookup = get_satellite_lookup()
-    # print(f"satellite_lookup type: {type(satellite_lookup)}")
-    # print("Lookup keys (first 10):", list(satellite_lookup.keys())[:10])
-    # print("Sample table IDs:", [sat["OBJECT_ID"] for sat in satellites[:10]])
-    for sat in satellites:
-        # print(f"getting data: {sat}")
-        sat_object = satellite_lookup.get(sat["OBJECT_ID"])
-        if not sat_object:
-            continue
-
-        x,y,z = calculate_coords(t, sat_object)
-        xs.append(x)
-        ys.append(y)
-        zs.append(z)
-        names.append(sat_object.name)
+    snapshot = get_position_snapshot()
+    rows = snapshot.rows_for(sat["OBJECT_ID"] for sat in satellites)
+    xs, ys, zs = geodetic_to_globe_coords(snapshot.lat[rows], snapshot.lon[rows], snapshot.alt[rows])
+    names = [snapshot.propagator.catalog.name(row) for row in rows]
 
     logger.info("adding satellite markers to globe")
-    fig["data"][1].update(x=xs, y=ys, z=zs, text=names)
+    fig["data"][1].update(x=xs.tolist(), y=ys.tolist(), z=zs.tolist(), text=names)
     # fig.update_traces(selector=dict(name="satellites"), x=xs, y=ys, z=zs, text=names)
     return fig
 
@@ -237,14 +223,20 @@ def update_selected_marker (fig, selected_sat):
     :return: a plotly graph object
     """
     logger.info("updating highlighted globe marker for selected satellite")
-    t = ts.now()
-    satellite_lookup = get_satellite_lookup()
-    sat_object = satellite_lookup.get(selected_sat["OBJECT_ID"])
+    catalog = get_catalog()
+    sat_object = catalog.get(selected_sat["OBJECT_ID"])
     # print(selected_sat)
     if not sat_object:
         return fig
 
-    x,y,z = calculate_coords(t, sat_object)
+    # use the same snapshot as the regular markers so the highlight sits exactly on top of the satellite's marker
+    snapshot = get_position_snapshot()
+    rows = snapshot.rows_for([selected_sat["OBJECT_ID"]])
+    if len(rows):
+        row = rows[0]
+        x, y, z = (float(c) for c in geodetic_to_globe_coords(snapshot.lat[row], snapshot.lon[row], snapshot.alt[row]))
+    else:
+        x, y, z = calculate_coords(ts.now(), sat_object)
 
     logger.info("adding highlighted marker to globe")
     fig["data"][2].update(x=[x], y=[y], z=[z], text=[sat_object.name])
@@ -273,12 +265,13 @@ def update_prediction_marker (fig, selected_sat, datetime):
     logger.info("updating predicted position globe marker")
     # print(selected_sat)
     t = ts.utc(datetime)
-    satellite_lookup = get_satellite_lookup()
-    sat_object = satellite_lookup[selected_sat]
+    catalog = get_catalog()
+    sat_object = catalog[selected_sat]
     if not sat_object:
         return fig
 
-    x,y,z = calculate_coords(t,sat_object)
+    lat, lon, alt, _ = trajectory_positions(selected_sat, t)
+    x, y, z = (float(c) for c in geodetic_to_globe_coords(lat, lon, alt))
     logger.info("adding prediction marker to globe")
     fig["data"][3].update(x=[x], y=[y], z=[z], text=[sat_object.name])
     return fig
@@ -296,9 +289,6 @@ def show_path (fig, selected_sat, minutes_diff):
     logger.info("generating globe satellite path")
     xs, ys, zs = [], [], []
     t = ts.now()
-    satellite_lookup = get_satellite_lookup()
-    sat_object = satellite_lookup[selected_sat]
-
 
     times = ts.utc(
         t.utc_datetime().year,
@@ -309,16 +299,9 @@ def show_path (fig, selected_sat, minutes_diff):
     )
     # print(times)
 
-    position = sat_object.at(times)
-    subpoint = wgs84.subpoint(position)
-    lat = subpoint.latitude.radians
-    lon = subpoint.longitude.radians
-    alt = subpoint.elevation.km
-
-    r = EARTH_RADIUS_KM + alt
-    x = r * np.cos(lat) * np.cos(lon)
-    y = r * np.cos(lat) * np.sin(lon)
-    z = r * np.sin(lat)
+    # the path is read from the satellite's trajectory table rather than running SGP4 for every minute again
+    lat, lon, alt, _ = trajectory_positions(selected_sat, times)
+    x, y, z = geodetic_to_globe_coords(lat, lon, alt)
 
     # print(xs)
     logger.info("adding path to globe")
@@ -348,10 +331,19 @@ def calculate_coords(t, sat_object):
     # the globe. getting the latitude and longitude then converting it into cartesian co-ordinates fixes the issue
     position = sat_object.at(t)
     subpoint = wgs84.subpoint(position)
-    lat = subpoint.latitude.radians
-    lon = subpoint.longitude.radians
-    alt = subpoint.elevation.km
+    return geodetic_to_globe_coords(subpoint.latitude.degrees, subpoint.longitude.degrees, subpoint.elevation.km)
 
+def geodetic_to_globe_coords(lat, lon, alt):
+    """
+    converts latitudes, longitudes and altitudes into cartesian coordinates on the globe's spherical earth. Works on
+    single values or numpy arrays.
+    :param: lat: latitude in degrees
+    :param: lon: longitude in degrees
+    :param: alt: altitude in km
+    :return: the x, y, z coordinates
+    """
+    lat = np.radians(lat)
+    lon = np.radians(lon)
     r = EARTH_RADIUS_KM + alt
     x = r * np.cos(lat) * np.cos(lon)
     y = r * np.cos(lat) * np.sin(lon)
@@ -1,8 +1,10 @@
 import numpy as np
 import plotly.graph_objects as go
 from functools import lru_cache
-from skyfield.api import load, wgs84
-from Models.Database import get_satellite_lookup
+from skyfield.api import load
+from Models.Database import get_catalog
+from Propagation.Position_cache import get_position_snapshot
+from Propagation.Trajectory_tables import trajectory_positions
 import logging
 
 ts = load.timescale()
@@ -101,17 +103,11 @@ def update_markers (fig, satellites):
     :return: a plotly graph object
     """
     logger.info("updating map satellite markers")
-    lats = []
-    lons = []
-    names = []
-    # print(f"satellite_lookup type: {type(satellite_lookup)}")
-    # print("Lookup keys (first 10):", list(satellite_lookup.keys())[:10])
-    # print("Sample table IDs:", [sat["OBJECT_ID"] for sat in satellites[:10]])
-    for sat in satellites:
-        # print(f"getting data: {sat}")
-        lats.append(sat["LAT"])
-        lons.append(sat["LON"])
-        names.append(sat["OBJECT_NAME"])
+    snapshot = get_position_snapshot()
+    rows = snapshot.rows_for(sat["OBJECT_ID"] for sat in satellites)
+    lats = snapshot.lat[rows].tolist()
+    lons = snapshot.lon[rows].tolist()
+    names = [snapshot.propagator.catalog.name(row) for row in rows]
 
     logger.info("adding satellite markers to map")
     fig["data"][0].update(lat=lats, lon=lons, text=names)
@@ -155,16 +151,14 @@ def update_prediction_marker (fig, selected_sat, datetime):
     logger.info("updating predicted position map marker")
     t=ts.utc(datetime)
     # print(selected_sat)
-    satellite_lookup = get_satellite_lookup()
-    sat_object = satellite_lookup[selected_sat]
+    catalog = get_catalog()
+    sat_object = catalog[selected_sat]
     if not sat_object:
         return fig
 
-    geocentric = sat_object.at(t)
-    subpoint = wgs84.subpoint(geocentric)
-
-    lat = subpoint.latitude.degrees
-    lon = subpoint.longitude.degrees
+    lat, lon, _, _ = trajectory_positions(selected_sat, t)
+    lat = float(lat)
+    lon = float(lon)
 
     logger.info("adding prediction marker to map")
     fig["data"][2].update(lat=[lat], lon=[lon], text=[sat_object.name])
@@ -183,9 +177,6 @@ def show_path (fig, selected_sat, minutes_diff):
     logger.info("generating map satellite path")
     t = ts.now()
     # print(selected_sat)
-    satellite_lookup = get_satellite_lookup()
-    sat_object = satellite_lookup[selected_sat]
-
     times = ts.utc(
         t.utc_datetime().year,
         t.utc_datetime().month,
@@ -194,11 +185,8 @@ def show_path (fig, selected_sat, minutes_diff):
         t.utc_datetime().minute + np.arange(minutes_diff)
     )
 
-    positions = sat_object.at(times)
-
-    subpoints = wgs84.subpoint(positions)
-    lats = subpoints.latitude.degrees
-    lons = subpoints.longitude.degrees
+    # the path is read from the satellite's trajectory table rather than running SGP4 for every minute again
+    lats, lons, _, _ = trajectory_positions(selected_sat, times)
 
     logger.info("adding path to map")
     fig["data"][3].update(lat=lats, lon=lons)
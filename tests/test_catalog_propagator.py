@@ -0,0 +1,49 @@
+"""
+Tests rebuilding the catalog propagator after an incremental sync
+"""
+import os
+import numpy as np
+import pytest
+from skyfield.api import load
+from Models import Database
+from Propagation.Catalog_propagator import CatalogPropagator, get_catalog_propagator
+
+LINE1 = "1 25544U 98067A   24001.50000000  .00016717  00000-0  10270-3 0  999"
+LINE2 = "2 25544  51.6416 247.4627 0006703 130.5360 325.0288 15.50377579 1234"
+ts = load.timescale()
+
+
+def records(satnums, day="001.50000000"):
+    """
+    :return: (name, line1, line2) records for the satnums, with their epochs on the given day of 2024
+    """
+    lines1 = Database.with_checksums([f"{LINE1[:2]}{satnum}{LINE1[7:20]}{day}{LINE1[32:]}" for satnum in satnums])
+    lines2 = Database.with_checksums([f"{LINE2[:2]}{satnum}{LINE2[7:]}" for satnum in satnums])
+    return [(f"SAT {satnum}", line1, line2) for satnum, line1, line2 in zip(satnums, lines1, lines2)]
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(Database, "db_filename", os.path.join(tmp_path, "Satellite_data"))
+    Database.create_database()
+    yield
+    Database.get_engine().dispose()
+
+
+def test_unchanged_satellites_keep_their_models(database):
+    Database.save_records(records(range(25544, 25564)))
+    Database.sync_catalog()
+    before = get_catalog_propagator()
+
+    Database.save_records(records([25544, 25545], "002.50000000") + records([25600]))
+    Database.sync_catalog()
+    after = get_catalog_propagator()
+
+    previous = dict(zip(before.satnums.tolist(), before.satrec_list))
+    reused = {satnum for satnum, satrec in zip(after.satnums.tolist(), after.satrec_list)
+              if previous.get(satnum) is satrec}
+    assert reused == set(range(25546, 25564))
+
+    t = ts.utc(2024, 1, 3)
+    rebuilt = CatalogPropagator(Database.get_catalog())
+    assert np.array_equal(after.propagate(t)[3], rebuilt.propagate(t)[3])
@@ -0,0 +1,54 @@
+"""
+Tests writers sharing the in-memory test database, which has a single connection
+"""
+import threading
+import pytest
+from sqlalchemy import select
+from Models import Database
+from Models.Database_models import Satellite, DeletedSatellite
+
+LINE1 = "1 25544U 98067A   24001.50000000  .00016717  00000-0  10270-3 0  999"
+LINE2 = "2 25544  51.6416 247.4627 0006703 130.5360 325.0288 15.50377579 1234"
+
+
+@pytest.fixture
+def database(monkeypatch):
+    monkeypatch.setattr(Database, "engine", None)
+    monkeypatch.setattr(Database, "in_memory", True)
+    Database.create_database(testing=True)
+    yield
+    Database.get_engine().dispose()
+
+
+def test_saves_and_deletes_take_turns(database):
+    satnums = range(20000, 22000)
+    lines1 = Database.with_checksums([f"{LINE1[:2]}{satnum}{LINE1[7:]}" for satnum in satnums])
+    lines2 = Database.with_checksums([f"{LINE2[:2]}{satnum}{LINE2[7:]}" for satnum in satnums])
+    records = [(f"SAT {satnum}", line1, line2) for satnum, line1, line2 in zip(satnums, lines1, lines2)]
+    errors = []
+
+    def run(function):
+        try:
+            function()
+        except Exception as e:
+            errors.append(e)
+
+    def save():
+        for start in range(0, len(records), 100):
+            Database.save_records(records[start:start + 100], chunk_size=50)
+
+    def delete():
+        for _ in range(10):
+            Database.delete_all_satellites()
+
+    threads = [threading.Thread(target=run, args=(function,)) for function in (save, delete)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert errors == []
+    with Database.get_engine().connect() as connection:
+        saved = set(connection.execute(select(Satellite.CHANGE_ID)).scalars())
+        deleted = set(connection.execute(select(DeletedSatellite.CHANGE_ID)).scalars())
+    assert not saved & deleted
@@ -0,0 +1,74 @@
+"""
+Tests the batch download against the local stand-in for the Celestrak GP endpoint from Benchmarks.Download_benchmark
+"""
+import os
+import threading
+import pytest
+from Models import Database
+from Benchmarks.Download_benchmark import StandInServer
+from UI.Download_modal import Download_modal_callbacks as Download
+
+LINE1 = "1 25544U 98067A   24001.50000000  .00016717  00000-0  10270-3 0  999"
+LINE2 = "2 25544  51.6416 247.4627 0006703 130.5360 325.0288 15.50377579 1234"
+GROUP_SIZE = 5
+
+
+def group_data(group):
+    """
+    :param group: the group's number
+    :return: TLE data for GROUP_SIZE satellites, with satnums starting at 10000 + group * GROUP_SIZE
+    """
+    satnums = range(10000 + group * GROUP_SIZE, 10000 + (group + 1) * GROUP_SIZE)
+    lines1 = Database.with_checksums([f"{LINE1[:2]}{satnum}{LINE1[7:]}" for satnum in satnums])
+    lines2 = Database.with_checksums([f"{LINE2[:2]}{satnum}{LINE2[7:]}" for satnum in satnums])
+    return "".join(f"SAT {satnum}\n{line1}\n{line2}\n" for satnum, line1, line2 in zip(satnums, lines1, lines2))
+
+
+@pytest.fixture
+def server(tmp_path, monkeypatch):
+    """
+    Starts a stand-in server with eight groups, pointed at by the download module, and an empty database
+    """
+    monkeypatch.setattr(Database, "db_filename", os.path.join(tmp_path, "Satellite_data"))
+    Database.create_database()
+    stand_in = StandInServer({f"g{i}": group_data(i).encode("ascii") for i in range(8)}, 0.05)
+    threading.Thread(target=stand_in.serve_forever, daemon=True).start()
+    monkeypatch.setattr(Download, "celestrak_url", f"http://127.0.0.1:{stand_in.server_address[1]}/gp.php")
+    monkeypatch.setattr(Download, "session", None)
+    yield stand_in
+    stand_in.shutdown()
+    stand_in.server_close()
+    Database.get_engine().dispose()
+
+
+def test_every_query_is_saved(server):
+    queries = [("GROUP", f"g{i}") for i in range(8)]
+    results = Download.download_groups(queries)
+
+    assert sorted((field, term) for field, term, _, _ in results) == sorted(queries)
+    assert all(error is None and summary.inserted == GROUP_SIZE for _, _, summary, error in results)
+    saved = {int(line1[2:7]) for _, line1, _ in Database.get_satellite_data()}
+    assert saved == set(range(10000, 10000 + 8 * GROUP_SIZE))
+
+
+def test_progress_is_reported_per_query(server):
+    progress = []
+    Download.download_groups([("GROUP", f"g{i}") for i in range(8)], set_progress=progress.append)
+
+    assert progress == [(done, 8) for done in range(1, 9)]
+
+
+def test_failed_query_does_not_stop_the_others(server):
+    queries = [("GROUP", "g0"), ("GROUP", "missing"), ("GROUP", "g1")]
+    results = {term: (summary, error) for _, term, summary, error in Download.download_groups(queries)}
+
+    summary, error = results["missing"]
+    assert summary is None and "404" in error
+    assert results["g0"][1] is None and results["g1"][1] is None
+    assert len(Database.get_satellite_data()) == 2 * GROUP_SIZE
+
+
+def test_connections_are_reused(server):
+    Download.download_groups([("GROUP", f"g{i}") for i in range(8)])
+
+    assert 0 < server.connections <= Download.download_workers
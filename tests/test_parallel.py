@@ -0,0 +1,63 @@
+"""
+Tests the propagation worker pool across a fork
+"""
+import os
+import multiprocessing
+import numpy as np
+import pytest
+from skyfield.api import load
+from Models import Database
+from Propagation import Parallel
+from Propagation.Catalog_propagator import get_catalog_propagator
+
+LINE1 = "1 25544U 98067A   24001.50000000  .00016717  00000-0  10270-3 0  999"
+LINE2 = "2 25544  51.6416 247.4627 0006703 130.5360 325.0288 15.50377579 1234"
+SATNUMS = list(range(25544, 25554))
+ts = load.timescale()
+
+
+@pytest.fixture
+def propagator(tmp_path, monkeypatch):
+    """
+    A propagator for a small database, with the pool set up to split even a catalog this size across two workers
+    """
+    monkeypatch.setattr(Database, "db_filename", os.path.join(tmp_path, "Satellite_data"))
+    Database.create_database()
+    lines1 = Database.with_checksums([f"{LINE1[:2]}{satnum}{LINE1[7:]}" for satnum in SATNUMS])
+    lines2 = Database.with_checksums([f"{LINE2[:2]}{satnum}{LINE2[7:]}" for satnum in SATNUMS])
+    Database.save_records([(f"SAT {satnum}", line1, line2) for satnum, line1, line2 in zip(SATNUMS, lines1, lines2)])
+    Database.sync_catalog()
+    monkeypatch.setattr(Parallel, "worker_count", 2)
+    monkeypatch.setattr(Parallel, "min_parallel_satellites", 1)
+    yield get_catalog_propagator()
+    Parallel.close_pool()
+    Database.get_engine().dispose()
+
+
+def propagate_in_child(propagator, t, queue):
+    """
+    Runs in the forked process, reporting whether it used a pool of its own and the positions it got
+    """
+    ecef = Parallel.propagate_catalog(propagator, t)[3]
+    queue.put((Parallel.pool.pid == os.getpid(), ecef))
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_forked_process_starts_its_own_pool(propagator):
+    t = ts.utc(2024, 1, 1, 12)
+    expected = propagator.propagate(t)[3]
+    assert np.allclose(Parallel.propagate_catalog(propagator, t)[3], expected)
+    parent_pool = Parallel.pool
+
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    child = context.Process(target=propagate_in_child, args=(propagator, t, queue))
+    child.start()
+    own_pool, ecef = queue.get(timeout=60)
+    child.join(timeout=60)
+
+    assert own_pool
+    assert np.allclose(ecef, expected)
+    assert Parallel.pool is parent_pool
+    assert all(process.is_alive() for process in parent_pool.processes)
+    assert np.allclose(Parallel.propagate_catalog(propagator, t)[3], expected)
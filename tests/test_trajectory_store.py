@@ -0,0 +1,54 @@
+"""
+Tests reading tracks from a trajectory store built from a small database
+"""
+import os
+import pytest
+from Models import Database
+from Propagation import Trajectory_store
+
+LINE1 = "1 25544U 98067A   24001.50000000  .00016717  00000-0  10270-3 0  999"
+LINE2 = "2 25544  51.6416 247.4627 0006703 130.5360 325.0288 15.50377579 1234"
+SATNUMS = [25544, 25545, 25546]
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """
+    Builds a store covering an hour in one minute steps, so it has 61 steps
+    """
+    monkeypatch.setattr(Database, "db_filename", os.path.join(tmp_path, "Satellite_data"))
+    Database.create_database()
+    lines1 = Database.with_checksums([f"{LINE1[:2]}{satnum}{LINE1[7:]}" for satnum in SATNUMS])
+    lines2 = Database.with_checksums([f"{LINE2[:2]}{satnum}{LINE2[7:]}" for satnum in SATNUMS])
+    Database.save_records([(f"SAT {satnum}", line1, line2) for satnum, line1, line2 in zip(SATNUMS, lines1, lines2)])
+    Trajectory_store.build_trajectory_store(1.0, 60.0)
+    monkeypatch.setattr(Trajectory_store, "store", None)
+    yield Trajectory_store.get_trajectory_store()
+    Database.get_engine().dispose()
+
+
+def test_whole_track(store):
+    assert store.track(25544).shape == (61, 3)
+
+
+def test_track_of_the_first_step(store):
+    t = store.times
+    assert store.track(25544, t[0], t[0]).shape == (1, 3)
+    assert store.track(25544, t[0], t[5]).shape == (6, 3)
+    assert store.track(25544, None, t[0]).shape == (1, 3)
+
+
+def test_track_with_reversed_bounds(store):
+    t = store.times
+    with pytest.raises(ValueError):
+        store.track(25544, t[5], t[0])
+
+
+def test_track_outside_the_store(store):
+    t = store.times
+    after = Trajectory_store.ts.tt_jd(t[-1].whole, t[-1].tt_fraction + 1)
+    before = Trajectory_store.ts.tt_jd(t[0].whole, t[0].tt_fraction - 1)
+    assert store.track(25544, after) is None
+    assert store.track(25544, t[0], after) is None
+    assert store.track(25544, before, t[5]) is None
+    assert store.track(99999) is None